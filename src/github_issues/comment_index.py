@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import threading
+
+if __name__ == '__main__':
+    SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+except Exception as e:
+    raise
+
+
+class CommentIndex:
+    """
+    Persistent index of the GitHub comments created from Redmine journals:
+
+        (redmine issue #, journal #) -> (github comment id, html_url)
+
+    The journal # is 1-based, as in the Redmine note references "#123-4"
+    and "#123#note-4".  Each journal is migrated as one comment, in order.
+
+    Stored as an append-only file, one JSON line per comment:
+        {"redmine_issue": 123, "journal": 4, "id": 5678, "html_url": "..."}
+
+    An issue indexed without comments has a line with no journal:
+        {"redmine_issue": 123, "journal": null}
+
+    An issue created with its comments, e.g. by the issue import API, has
+    a line with the journal #'s of each comment, used when its comments
+    are listed from the API:
+        {"redmine_issue": 123, "layout": [[1], [2, 3], [4]]}
+    """
+
+    def __init__(self, index_fname):
+        """
+        :param index_fname: str, the index file.  None = keep the index in
+            memory only
+        """
+        self.index_fname = index_fname
+        self.lookup = {}    # { (redmine issue #, journal #) : entry dict }
+        self.indexed_issues = set()     # redmine issue #'s
+        self.layouts = {}   # { redmine issue # : list of journal # lists }
+        self.lock = threading.Lock()
+        self.load_index()
+
+    def load_index(self):
+        if self.index_fname is None or not os.path.isfile(self.index_fname):
+            return
+
+        fh = open(self.index_fname, 'r')
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a line cut short by a crash
+                continue
+            if 'layout' in entry:
+                self.layouts[entry['redmine_issue']] = entry['layout']
+                continue
+            if entry['journal'] is not None:
+                self.lookup[(entry['redmine_issue'], entry['journal'])] = \
+                    entry
+            self.indexed_issues.add(entry['redmine_issue'])
+        fh.close()
+        msg('Comment index loaded with %s comments' % len(self.lookup))
+
+    def add_comment(self, redmine_issue_num, journal_num, comment_id,
+                    html_url):
+        """
+        Record a comment created for the journal # of a redmine issue
+        """
+        entry = dict(redmine_issue=int(redmine_issue_num),
+                     journal=int(journal_num), id=comment_id,
+                     html_url=html_url)
+        with self.lock:
+            self.lookup[(entry['redmine_issue'], entry['journal'])] = entry
+            self.indexed_issues.add(entry['redmine_issue'])
+            if self.index_fname is not None:
+                fh = open(self.index_fname, 'a')
+                fh.write(json.dumps(entry) + '\n')
+                fh.close()
+
+    def add_issue(self, redmine_issue_num):
+        """
+        Record an issue without comments, so it is taken as indexed
+        """
+        entry = dict(redmine_issue=int(redmine_issue_num), journal=None)
+        with self.lock:
+            self.indexed_issues.add(entry['redmine_issue'])
+            if self.index_fname is not None:
+                fh = open(self.index_fname, 'a')
+                fh.write(json.dumps(entry) + '\n')
+                fh.close()
+
+    def add_layout(self, redmine_issue_num, journal_groups):
+        """
+        Record the journal #'s each comment of an issue was made from, for
+        an issue whose comments are created without their ids being known
+
+        :param journal_groups: list of the journal # lists of the comments,
+            in order
+        """
+        entry = dict(redmine_issue=int(redmine_issue_num),
+                     layout=journal_groups)
+        with self.lock:
+            self.layouts[entry['redmine_issue']] = journal_groups
+            if self.index_fname is not None:
+                fh = open(self.index_fname, 'a')
+                fh.write(json.dumps(entry) + '\n')
+                fh.close()
+
+    def get_layout(self, redmine_issue_num):
+        """
+        :returns: the journal # lists recorded by add_layout, or None
+        """
+        return self.layouts.get(int(redmine_issue_num), None)
+
+    def add_comments(self, redmine_issue_num, comment_dicts,
+                     journal_groups=None):
+        """
+        Record the comments of an issue, in order.  An issue without
+        comments is recorded with add_issue
+
+        :param comment_dicts: list of GitHub API comment dicts, or None for
+            a comment that failed to be created
+        :param journal_groups: optional, list of the journal # lists of
+            the comments.  Default is one comment per journal.  Comments
+            past the end of the list, e.g. added after the migration, are
+            not recorded
+        """
+        if journal_groups is None:
+            journal_groups = [[x] for x in range(1, len(comment_dicts) + 1)]
+        elif len(comment_dicts) < len(journal_groups):
+            msg('Comment index: %s comment(s) of %s found for redmine issue '
+                '#%s, not indexed' % (len(comment_dicts),
+                                      len(journal_groups),
+                                      redmine_issue_num))
+            comment_dicts = []
+
+        if not any(x is not None for x in comment_dicts):
+            self.add_issue(redmine_issue_num)
+            return
+
+        for comment, journal_nums in zip(comment_dicts, journal_groups):
+            if comment is not None:
+                for journal_num in journal_nums:
+                    self.add_comment(redmine_issue_num, journal_num,
+                                     comment['id'], comment['html_url'])
+
+    def has_issue(self, redmine_issue_num):
+        return int(redmine_issue_num) in self.indexed_issues
+
+    def get_comment_url(self, redmine_issue_num, journal_num):
+        """
+        :returns: html_url of the comment, or None if it isn't indexed
+        """
+        entry = self.lookup.get((int(redmine_issue_num), int(journal_num)),
+                                None)
+        if entry is None:
+            return None
+        return entry['html_url']
@@ -0,0 +1,236 @@
+import os
+import sys
+import re
+import json
+import shlex
+
+if __name__ == '__main__':
+    SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+except Exception as e:
+    raise
+
+
+class CorpusIndex:
+    """
+    Index of a directory of redmine issues in JSON format, one entry per
+    file:
+
+        {"fname": "04160.json", "mtime": 1404312182.0, "size": 2048,
+         "id": 4160, "status": "New", "tracker": "Bug", "project": "Dataverse",
+         "created_on": "...", "updated_on": "...", "journals": 3,
+         "attachments": 1}
+
+    The index is built once, then refreshed from the size and modification
+    time of the files: only new or changed files are read again.
+
+    Issues are selected with filter expressions, e.g.
+
+        status=open tracker=Bug,Feature updated>2024-01-01 journals>0
+
+    The terms are ANDed.  Operators are =, !=, >, >=, <, <=.  With = and !=,
+    a comma separated value matches any of its items.  "status=open" and
+    "status=closed" use the closed_statuses.  Dates are compared to the
+    precision of the filter value: "updated=2024-01" is during January,
+    "updated>2024-01-01" after that day.  Quote values with spaces:
+    status="In Progress"
+    """
+    INDEX_FNAME = 'corpus_index.json'
+
+    FILTER_TERM_PATTERN = re.compile(r'^(\w+)(!=|>=|<=|=|>|<)(.*)$')
+
+    # { filter field : (index key, type) }
+    FILTER_FIELDS = {'id': ('id', int),
+                     'status': ('status', str),
+                     'tracker': ('tracker', str),
+                     'project': ('project', str),
+                     'created': ('created_on', 'date'),
+                     'updated': ('updated_on', 'date'),
+                     'journals': ('journals', int),
+                     'attachments': ('attachments', int)}
+
+    def __init__(self, redmine_json_directory, index_fname=None,
+                 closed_statuses=None):
+        """
+        :param redmine_json_directory: str, directory with the redmine
+            issues in JSON format
+        :param index_fname: optional, str.  Default is INDEX_FNAME in the
+            redmine_json_directory
+        :param closed_statuses: optional, list of the status names of
+            closed issues, for "status=open" and "status=closed"
+        """
+        self.redmine_json_directory = redmine_json_directory
+        self.index_fname = index_fname or \
+            os.path.join(redmine_json_directory, self.INDEX_FNAME)
+        self.closed_statuses = [x.lower() for x in closed_statuses or []]
+
+        self.entries = {}   # { file name : entry dict }
+        self.load_index()
+
+    def load_index(self):
+        if not os.path.isfile(self.index_fname):
+            return
+
+        fh = open(self.index_fname, 'r')
+        try:
+            self.entries = json.loads(fh.read())
+        except ValueError:
+            # rebuilt by refresh
+            self.entries = {}
+        fh.close()
+
+    def save_index(self):
+        tmp_fname = self.index_fname + '.tmp'
+        fh = open(tmp_fname, 'w')
+        fh.write(json.dumps(self.entries))
+        fh.close()
+        os.replace(tmp_fname, self.index_fname)
+
+    def get_entry_from_file(self, fname, stat):
+        """
+        :returns: the index entry of a redmine JSON file
+        """
+        fh = open(os.path.join(self.redmine_json_directory, fname), 'r')
+        rd = json.loads(fh.read())
+        fh.close()
+
+        def get_name(key):
+            return (rd.get(key, None) or {}).get('name', None)
+
+        return {'fname': fname,
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'id': rd.get('id', None) or int(fname.replace('.json', '')),
+                'status': get_name('status'),
+                'tracker': get_name('tracker'),
+                'project': get_name('project'),
+                'created_on': rd.get('created_on', None),
+                'updated_on': rd.get('updated_on', None),
+                'journals': len(rd.get('journals', None) or []),
+                'attachments': len(rd.get('attachments', None) or [])}
+
+    def refresh(self):
+        """
+        Read the new and changed files, drop the removed ones and save the
+        index if anything changed
+        """
+        pat = r'^\d{1,10}\.json$'
+        fnames = [x for x in os.listdir(self.redmine_json_directory) if
+                  re.match(pat, x)]
+
+        read_cnt = 0
+        entries = {}
+        for fname in fnames:
+            stat = os.stat(os.path.join(self.redmine_json_directory, fname))
+            entry = self.entries.get(fname, None)
+            if entry is None or not entry['mtime'] == stat.st_mtime or \
+                    not entry['size'] == stat.st_size:
+                entry = self.get_entry_from_file(fname, stat)
+                read_cnt += 1
+            entries[fname] = entry
+
+        removed_cnt = len(set(self.entries) - set(entries))
+        self.entries = entries
+        if read_cnt > 0 or removed_cnt > 0:
+            self.save_index()
+        msg('Corpus index: %s issue(s), %s read, %s removed' %
+            (len(entries), read_cnt, removed_cnt))
+
+    def get_fnames(self):
+        """
+        :returns: sorted list of the file names in the index
+        """
+        return sorted(self.entries.keys())
+
+    def parse_filter(self, expression):
+        """
+        :param expression: str, see the class docstring
+        :returns: list of (index key, type, operator, value) tuples.
+            Raises ValueError if the expression is invalid
+        """
+        terms = []
+        for term in shlex.split(expression or ''):
+            match = self.FILTER_TERM_PATTERN.match(term)
+            if match is None:
+                raise ValueError('Invalid filter term: %s' % term)
+
+            field, operator, value = match.groups()
+            if field not in self.FILTER_FIELDS:
+                raise ValueError('Unknown filter field "%s" in: %s.  Use: %s'
+                                 % (field, term,
+                                    ', '.join(sorted(self.FILTER_FIELDS))))
+            key, value_type = self.FILTER_FIELDS[field]
+
+            if operator in ['=', '!=']:
+                value = value.split(',')
+            elif value_type is str:
+                raise ValueError('Use = or != with "%s": %s' % (field, term))
+            else:
+                value = [value]
+
+            if value_type is int:
+                try:
+                    value = [int(x) for x in value]
+                except ValueError:
+                    raise ValueError('Not a number: %s' % term)
+            elif value_type is str:
+                value = [x.lower() for x in value]
+
+            terms.append((key, value_type, operator, value))
+        return terms
+
+    def is_match(self, entry, key, value_type, operator, value):
+        entry_value = entry.get(key, None)
+        if key == 'status' and entry_value is not None:
+            is_closed = entry_value.lower() in self.closed_statuses
+            entry_values = [entry_value.lower(),
+                            'closed' if is_closed else 'open']
+        elif value_type is str:
+            entry_values = [(entry_value or '').lower()]
+        elif value_type == 'date':
+            # e.g. "2024-01-01T12:00:00Z" is "2024-01-01" and "2024-01"
+            entry_values = [x for x in value if
+                            (entry_value or '').startswith(x)]
+        else:
+            entry_values = [entry_value]
+
+        if operator == '=':
+            return any(x in value for x in entry_values)
+        if operator == '!=':
+            return not any(x in value for x in entry_values)
+
+        if entry_value is None:
+            return False
+        if value_type == 'date':
+            entry_value = entry_value[:len(value[0])]
+
+        if operator == '>':
+            return entry_value > value[0]
+        if operator == '>=':
+            return entry_value >= value[0]
+        if operator == '<':
+            return entry_value < value[0]
+        return entry_value <= value[0]
+
+    def select(self, expression=None):
+        """
+        :param expression: str, see the class docstring.  None = all
+        :returns: sorted list of the file names of the matching issues.
+            No file is read
+        """
+        terms = self.parse_filter(expression)
+        return [fname for fname in self.get_fnames() if
+                all(self.is_match(self.entries[fname], *x) for x in terms)]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        msgx('Usage: corpus_index.py (redmine JSON directory) [filter]')
+
+    corpus_index = CorpusIndex(sys.argv[1])
+    corpus_index.refresh()
+    for fname in corpus_index.select(' '.join(sys.argv[2:])):
+        msg(fname)
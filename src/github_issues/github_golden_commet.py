@@ -1,4 +1,5 @@
-import requests
+import os
+import sys
 import json
 import time
 
@@ -10,6 +11,8 @@ if __name__ == '__main__':
 
 try:
     from utils.msg_util import *
+    from utils import http_transport
+    from utils.token_pool import TokenPool
     from github_issues.md_translate import translate_for_github
 except Exception as e:
     raise
@@ -35,6 +38,11 @@ class GitHubIssueHelper:
         self._token = config['password']
 
         self._auth = (self._user, self._token)
+        # Comments, closes and updates are spread over the tokens of
+        # GITHUB_TOKEN_POOL.  Issues are created with self._auth
+        self.token_pool = TokenPool(
+            [self._auth] + [tuple(x) for x in config.get('token_pool', None)
+                            or []])
         self.issue_url = 'https://api.github.com/repos/%s/%s/issues' % \
                          (self._user, self._repo)
         self.get_issue_url = 'https://github.com/%s/%s/issues' % \
@@ -47,25 +55,53 @@ class GitHubIssueHelper:
         self.imported = 0
         self.gim = gim
 
-    def create(self, issue_dict, journals, attachments):
+    def get_pool_auth(self):
+        return self.token_pool.get_auth()
+
+    def create(self, issue_dict, journals, attachments, labels=None):
         issue_data = {}
         issue_data['issue'] = issue_dict
+        if labels:
+            # created with the issue, no separate call
+            issue_data['issue']['labels'] = labels
         issue_data['comments'] = self.gim.process_journals(journals,
                                                            attachments)
         response = self.create_issue(issue_data)
 
         return response
 
+    # Longest wait between two checks of an issue import
+    MAX_CHECK_INTERVAL = 8
+
+    # Seconds an issue import may stay pending
+    IMPORT_DEADLINE = 600
+
     def check_import_loop(self, import_response, check_interval):
+        """
+        Wait for an issue import to finish.  The first check is made after
+        check_interval seconds, doubled at each check up to
+        MAX_CHECK_INTERVAL.
+
+        Returns None if the import failed, or is still pending after
+        IMPORT_DEADLINE seconds.
+        """
         check_data = json.loads(import_response)
         response = None
+        deadline = time.time() + self.IMPORT_DEADLINE
 
         while response is None:
+            if time.time() > deadline:
+                msgt('Import still pending after %s seconds: %s' %
+                     (self.IMPORT_DEADLINE, check_data['url']))
+                break
             try:
                 time.sleep(check_interval)
+                check_interval = min(check_interval * 2,
+                                     self.MAX_CHECK_INTERVAL)
                 msg('Checking issue import status')
-                req = requests.get(check_data['url'], auth=self._auth,
-                                   headers=self.headers)
+                req = http_transport.get(check_data['url'],
+                                         auth=self._auth,
+                                         headers=self.headers)
                 if req.status_code in [200, 201]:
                     resp_data = json.loads(req.text)
                     if 'status' in resp_data and \
@@ -77,6 +113,12 @@ class GitHubIssueHelper:
                         issue_url = json.loads(req.text)['issue_url']
                         issue_id = int(issue_url.split('/')[-1])
                         response = Issue(self.imported, issue_id, issue_url)
+                    elif 'status' in resp_data and \
+                            resp_data['status'] == 'failed':
+                        msgt('Import failed: %s' %
+                             json.dumps(resp_data.get('errors', None),
+                                        indent=4))
+                        break
                     else:
                         print(resp_data)
                 else:
@@ -92,9 +134,9 @@ class GitHubIssueHelper:
         This method is used to post the Rest API request to create the issue.
         """
         response = None
-        req = requests.post(self.issue_url,
-                            data=json.dumps(issue_data['issue']),
-                            auth=self._auth, headers=self.headers)
+        req = http_transport.post(self.issue_url,
+                                  data=json.dumps(issue_data['issue']),
+                                  auth=self._auth, headers=self.headers)
         if req.status_code in [200, 201]:
             self.imported += 1
             issue_url = json.loads(req.text)['url']
@@ -102,9 +144,10 @@ class GitHubIssueHelper:
             response = Issue(self.imported, issue_id, issue_url)
             # Add Comments using comments REST API
             self.add_comments(json.loads(req.text)['comments_url'],
-                              issue_data['comments'])
+                              issue_data['comments'],
+                              issue_data.get('redmine_issue_num', None))
         elif req.status_code in [202]:
-            response = self.check_import_loop(req.text, 1)
+            response = self.check_import_loop(req.text, 0.25)
         # In case of validation failed if specific user does not exist then
         # delete the assignee and try to recreate the issue.
         elif req.status_code in [422] and req.text.find('Validation Failed'):
@@ -118,26 +161,44 @@ class GitHubIssueHelper:
 
         return response
 
-    def add_comments(self, comments_url, issue_data_comments):
+    def add_comments(self, comments_url, issue_data_comments,
+                     redmine_issue_num=None):
         """
         This function is used to iterate through all the comments and add
-        the comments using comments REST API.
+        the comments using comments REST API.  If redmine_issue_num is
+        given, each comment is recorded in the comment index of self.gim
+        under the journal #'s it was made from.  Returns True if every
+        comment was added
         """
+        all_added = True
         for comment in issue_data_comments:
-            com_req = requests.post(comments_url,
-                                    data=json.dumps(comment),
-                                    auth=self._auth, headers=self.headers)
+            comment_data = dict((k, v) for k, v in comment.items()
+                                if not k == 'journals')
+            com_req = http_transport.post(comments_url,
+                                          data=json.dumps(comment_data),
+                                          auth=self.get_pool_auth(),
+                                          headers=self.headers)
 
             if com_req.status_code not in [200, 201]:
-                print(com_req.status_code)
-                print(com_req.text)
+                msgt('Failed to add a comment: %s' % com_req.status_code)
+                msg(com_req.text)
+                all_added = False
+            elif redmine_issue_num is not None and self.gim is not None:
+                comment_obj = com_req.json()
+                for journal_num in comment['journals']:
+                    self.gim.get_comment_index().add_comment(
+                        redmine_issue_num, journal_num, comment_obj['id'],
+                        comment_obj['html_url'])
+
+        return all_added
 
     def does_issue_exist(self, issue_number):
         """
         This function is used to check the specific issue is exists or not
         """
         get_url = self.get_issue_url + "/" + str(issue_number)
-        req = requests.get(get_url, auth=self._auth, headers=self.headers)
+        req = http_transport.get(get_url, auth=self._auth,
+                                 headers=self.headers)
         if req.status_code in [200, 201]:
             return True
         else:
@@ -152,13 +213,137 @@ class GitHubIssueHelper:
         appropriate REST API.
         """
         update_url = self.issue_url + "/" + str(issue_number)
-        req = requests.patch(update_url, data=json.dumps(update_data),
-                             auth=self._auth, headers=self.headers)
+        req = http_transport.patch(update_url, data=json.dumps(update_data),
+                                   auth=self.get_pool_auth(),
+                                   headers=self.headers)
         if req.status_code in [200, 201]:
             return True
         else:
-            print(req.status_code)
-            print(req.text)
+            msgt('Failed to update issue #%s: %s' %
+                 (issue_number, req.status_code))
+            msg(req.text)
+
+        return False
+
+    def get_issue(self, issue_number):
+        """
+        This function is used to retrieve an issue using the REST API.
+        Returns the issue as a dict or None if it is not found.
+        """
+        get_url = self.issue_url + "/" + str(issue_number)
+        req = http_transport.get(get_url, auth=self.get_pool_auth(),
+                                 headers=self.headers)
+        if req.status_code in [200]:
+            return req.json()
+        else:
+            msgt('Failed to retrieve issue #%s: %s' %
+                 (issue_number, req.status_code))
+            msg(req.text)
+
+        return None
+
+    def open_issue(self, issue_dict):
+        """
+        This function is used to create an issue, without comments, using
+        the REST API.  Returns an Issue with the github issue number or None
+        if the creation failed.
+        """
+        req = http_transport.post(self.issue_url, data=json.dumps(issue_dict),
+                                  auth=self._auth, headers=self.headers)
+        if req.status_code in [200, 201]:
+            issue_data = req.json()
+            return Issue(issue_data['number'], issue_data['id'],
+                         issue_data['html_url'])
+        else:
+            msgt('Failed to create an issue: %s' % req.status_code)
+            msg(req.text)
+
+        return None
+
+    def list_comments(self, issue_number):
+        """
+        This function is used to retrieve all the comments of an issue,
+        following the pages of the REST API.  Returns a list of dicts.
+        """
+        comments = []
+        list_url = self.issue_url + "/" + str(issue_number) + "/comments"
+        params = {'per_page': 100}
+        while list_url:
+            req = http_transport.get(list_url, params=params,
+                                     auth=self.get_pool_auth(),
+                                     headers=self.headers)
+            if req.status_code not in [200]:
+                msgt('Failed to list the comments of issue #%s: %s' %
+                     (issue_number, req.status_code))
+                msg(req.text)
+                break
+            comments += req.json()
+            list_url = req.links.get('next', {}).get('url', None)
+            params = None   # already part of the "next" url
+
+        return comments
+
+    def list_issues(self, since=None):
+        """
+        This function is used to retrieve all the issues--open and
+        closed--of the repository, optionally only those updated since an
+        ISO 8601 time, following the pages of the REST API.  Pull requests
+        are left out.  Returns a list of dicts.
+        """
+        issues = []
+        list_url = self.issue_url
+        params = {'state': 'all', 'per_page': 100}
+        if since:
+            params['since'] = since
+        while list_url:
+            req = http_transport.get(list_url, params=params,
+                                     auth=self.get_pool_auth(),
+                                     headers=self.headers)
+            if req.status_code not in [200]:
+                msgt('Failed to list the issues: %s' % req.status_code)
+                msg(req.text)
+                break
+            issues += [x for x in req.json() if 'pull_request' not in x]
+            list_url = req.links.get('next', {}).get('url', None)
+            params = None   # already part of the "next" url
+
+        return issues
+
+    def create_comment(self, issue_number, body):
+        """
+        This function is used to add a comment to an issue using the REST
+        API.  Returns the comment as a dict or None if the creation failed.
+        """
+        comments_url = self.issue_url + "/" + str(issue_number) + "/comments"
+        req = http_transport.post(comments_url,
+                                  data=json.dumps({'body': body}),
+                                  auth=self.get_pool_auth(),
+                                  headers=self.headers)
+        if req.status_code in [200, 201]:
+            return req.json()
+        else:
+            msgt('Failed to add a comment to issue #%s: %s' %
+                 (issue_number, req.status_code))
+            msg(req.text)
+
+        return None
+
+    def update_comment(self, comment_id, body):
+        """
+        This function is used to update the body of a comment using the
+        REST API.
+        """
+        update_url = self.issue_url + "/comments/" + str(comment_id)
+        req = http_transport.patch(update_url,
+                                   data=json.dumps({'body': body}),
+                                   auth=self.get_pool_auth(),
+                                   headers=self.headers)
+        if req.status_code in [200]:
+            return True
+        else:
+            msgt('Failed to update comment %s: %s' %
+                 (comment_id, req.status_code))
+            msg(req.text)
 
         return False
 
@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+
+if __name__ == '__main__':
+    SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+    from utils import http_transport
+    from github_issues.github_golden_commet import Issue
+except Exception as e:
+    raise
+
+
+class GitHubGraphQLHelper:
+    """
+    Create GitHub issues with the GraphQL API (v4).
+
+    Several mutations are sent in a single request, as aliases of one
+    "mutation" operation.  GitHub runs them in order, so an issue is
+    created with its labels, assignee and milestone in one mutation, and
+    the comments and close of a batch of issues follow in as few requests
+    as the batch size allows.
+
+    Requests go through the RateLimitGovernor of the account, as its REST
+    calls do: each mutation takes a content creation token.
+    """
+    GRAPHQL_URL = 'https://api.github.com/graphql'
+    LABELS_URL = 'https://api.github.com/repos/%s/%s/labels'
+
+    # Color of the labels created for names missing on GitHub, as the
+    # REST API does when an issue is created with them
+    NEW_LABEL_COLOR = 'ededed'
+
+    DEFAULT_BATCH_SIZE = 10
+
+    CREATE_ISSUE_SELECTION = '{ issue { id number url } }'
+    ADD_COMMENT_SELECTION = '{ commentEdge { node { databaseId url } } }'
+    CLOSE_ISSUE_SELECTION = '{ issue { number } }'
+
+    def __init__(self, gim=None, **config):
+        """
+        :param gim: GithubIssueMaker, for the comment index
+        :param config: see settings.base.get_github_golden_auth, plus
+            an optional "batch_size": maximum number of mutations per
+            request.  Default is DEFAULT_BATCH_SIZE
+        """
+        self._user = config['user']
+        self._repo = config['repo']
+        self._token = config['password']
+        self.batch_size = config.get('batch_size', None) or \
+            self.DEFAULT_BATCH_SIZE
+
+        self.headers = {'Authorization': 'bearer %s' % self._token}
+        self.gim = gim
+
+        self.repository_id = None
+        self.label_ids = None           # { label name : node id }
+        self.user_ids = {}              # { login : node id or None }
+        self.milestone_ids = {}         # { milestone # : node id or None }
+
+    def run_query(self, query, variables=None, content_cost=0):
+        """
+        Send a query or mutation.  Let it blow up if the request fails.
+
+        :param content_cost: number of mutations, each taking a content
+            creation token.  0 for a query
+        :returns: tuple of (data dict, list of errors)
+        """
+        req = http_transport.post(self.GRAPHQL_URL,
+                                  data=json.dumps({'query': query,
+                                                   'variables': variables or
+                                                   {}}),
+                                  headers=self.headers,
+                                  governor_auth=(self._user, self._token),
+                                  content_cost=content_cost)
+        if not req.status_code == 200:
+            msgt('Error!')
+            msg(req.text)
+            raise Exception('GraphQL request failed! Status code: %s' %
+                            req.status_code)
+
+        result = req.json()
+        errors = result.get('errors', None) or []
+        for error in errors:
+            msg('GraphQL error: %s' % error.get('message', error))
+        return result.get('data', None) or {}, errors
+
+    def run_mutations(self, mutations):
+        """
+        Send mutations as aliases of single requests, up to
+        self.batch_size per request
+
+        :param mutations: list of tuples of
+            (mutation name, input type, input dict, selection)
+        :returns: list of the mutation results--None for a failure--in
+            the order of the mutations
+        """
+        results = []
+        for start in range(0, len(mutations), self.batch_size):
+            batch = mutations[start:start + self.batch_size]
+            var_defs = ['$in%d: %s!' % (idx, x[1])
+                        for idx, x in enumerate(batch)]
+            fields = ['  m%d: %s(input: $in%d) %s' % (idx, x[0], idx, x[3])
+                      for idx, x in enumerate(batch)]
+            query = 'mutation(%s) {\n%s\n}' % (', '.join(var_defs),
+                                               '\n'.join(fields))
+            variables = dict(('in%d' % idx, x[2])
+                             for idx, x in enumerate(batch))
+
+            data, errors = self.run_query(query, variables,
+                                          content_cost=len(batch))
+            results += [data.get('m%d' % idx, None)
+                        for idx in range(len(batch))]
+        return results
+
+    def get_repository_id(self):
+        if self.repository_id is None:
+            data, errors = self.run_query(
+                'query($owner: String!, $name: String!) '
+                '{ repository(owner: $owner, name: $name) { id } }',
+                dict(owner=self._user, name=self._repo))
+            if not data.get('repository', None):
+                msgx('ERROR: Repository not found: %s/%s' %
+                     (self._user, self._repo))
+            self.repository_id = data['repository']['id']
+        return self.repository_id
+
+    def load_label_ids(self):
+        """
+        Retrieve the node ids of all the labels of the repository
+        """
+        self.label_ids = {}
+        cursor = None
+        while True:
+            data, errors = self.run_query(
+                'query($owner: String!, $name: String!, $cursor: String) '
+                '{ repository(owner: $owner, name: $name) { '
+                'labels(first: 100, after: $cursor) { '
+                'nodes { id name } pageInfo { hasNextPage endCursor } } } }',
+                dict(owner=self._user, name=self._repo, cursor=cursor))
+            labels = data['repository']['labels']
+            for label in labels['nodes']:
+                self.label_ids[label['name']] = label['id']
+            if not labels['pageInfo']['hasNextPage']:
+                break
+            cursor = labels['pageInfo']['endCursor']
+
+    def create_label(self, label_name):
+        """
+        Create a label missing on GitHub with the REST API--GraphQL has
+        no mutation for it
+
+        :returns: the node id of the label, or None
+        """
+        req = http_transport.post(self.LABELS_URL % (self._user, self._repo),
+                                  data=json.dumps(
+                                      {'name': label_name,
+                                       'color': self.NEW_LABEL_COLOR}),
+                                  auth=(self._user, self._token))
+        if req.status_code == 201:
+            msg('Label created on GitHub: %s' % label_name)
+            return req.json()['node_id']
+
+        msgt('Failed to create label: %s' % label_name)
+        msg('%s %s' % (req.status_code, req.text))
+        return None
+
+    def get_label_ids(self, label_names):
+        """
+        :returns: list of the node ids of the labels.  Labels missing on
+            GitHub are created
+        """
+        if self.label_ids is None:
+            self.load_label_ids()
+
+        label_ids = []
+        for label_name in label_names:
+            if label_name not in self.label_ids:
+                label_id = self.create_label(label_name)
+                if label_id is None:
+                    continue
+                self.label_ids[label_name] = label_id
+            label_ids.append(self.label_ids[label_name])
+        return label_ids
+
+    def load_user_ids(self, logins):
+        """
+        Retrieve the node ids of the logins not yet looked up, in a single
+        aliased query
+        """
+        logins = sorted(set(x for x in logins if x not in self.user_ids))
+        if not logins:
+            return
+
+        var_defs = ['$u%d: String!' % idx for idx in range(len(logins))]
+        fields = ['  u%d: user(login: $u%d) { id }' % (idx, idx)
+                  for idx in range(len(logins))]
+        data, errors = self.run_query(
+            'query(%s) {\n%s\n}' % (', '.join(var_defs), '\n'.join(fields)),
+            dict(('u%d' % idx, x) for idx, x in enumerate(logins)))
+        for idx, login in enumerate(logins):
+            user = data.get('u%d' % idx, None)
+            self.user_ids[login] = user['id'] if user else None
+
+    def get_milestone_id(self, milestone_number):
+        if milestone_number not in self.milestone_ids:
+            data, errors = self.run_query(
+                'query($owner: String!, $name: String!, $number: Int!) '
+                '{ repository(owner: $owner, name: $name) { '
+                'milestone(number: $number) { id } } }',
+                dict(owner=self._user, name=self._repo,
+                     number=int(milestone_number)))
+            milestone = data['repository']['milestone']
+            self.milestone_ids[milestone_number] = \
+                milestone['id'] if milestone else None
+        return self.milestone_ids[milestone_number]
+
+    def get_create_issue_input(self, payload):
+        """
+        :param payload: see GithubIssueMaker.compile_github_payload
+        :returns: CreateIssueInput dict
+        """
+        issue_dict = payload['issue']
+        create_input = {'repositoryId': self.get_repository_id(),
+                        'title': issue_dict['title'],
+                        'body': issue_dict['body']}
+
+        label_ids = self.get_label_ids(payload.get('labels', None) or [])
+        if label_ids:
+            create_input['labelIds'] = label_ids
+
+        assignee = issue_dict.get('assignee', None)
+        if assignee and self.user_ids.get(assignee, None):
+            create_input['assigneeIds'] = [self.user_ids[assignee]]
+
+        if issue_dict.get('milestone', None):
+            milestone_id = self.get_milestone_id(issue_dict['milestone'])
+            if milestone_id:
+                create_input['milestoneId'] = milestone_id
+
+        return create_input
+
+    def create_issues(self, payloads):
+        """
+        Create the issues of a list of payloads, then add their comments
+        and close them
+
+        :param payloads: list of payloads, see
+            GithubIssueMaker.compile_github_payload
+        :returns: list of Issue or None--if the creation failed--in the
+            order of the payloads
+        """
+        self.load_user_ids([x['issue']['assignee'] for x in payloads
+                            if x['issue'].get('assignee', None)])
+
+        # (1) Create the issues with labels, assignee and milestone
+        #
+        created = self.run_mutations(
+            [('createIssue', 'CreateIssueInput',
+              self.get_create_issue_input(x), self.CREATE_ISSUE_SELECTION)
+             for x in payloads])
+
+        issue_objs = []
+        for payload, result in zip(payloads, created):
+            if not result or not result.get('issue', None):
+                msgt('Failed to create github issue: [#%s]' %
+                     payload['redmine_issue_num'])
+                issue_objs.append(None)
+                continue
+            issue_objs.append(Issue(result['issue']['number'],
+                                    result['issue']['id'],
+                                    result['issue']['url']))
+            msg('Github issue created: %s' % result['issue']['number'])
+
+        # (2) Add the comments, then close the closed issues
+        #
+        mutations = []
+        comment_keys = []       # (payload, comment) for each addComment
+        for payload, issue_obj in zip(payloads, issue_objs):
+            if issue_obj is None:
+                continue
+            for comment in payload['comments']:
+                mutations.append(('addComment', 'AddCommentInput',
+                                  {'subjectId': issue_obj.id,
+                                   'body': comment['body']},
+                                  self.ADD_COMMENT_SELECTION))
+                comment_keys.append((payload, comment))
+            if payload['closed']:
+                mutations.append(('closeIssue', 'CloseIssueInput',
+                                  {'issueId': issue_obj.id},
+                                  self.CLOSE_ISSUE_SELECTION))
+                comment_keys.append(None)
+
+        results = self.run_mutations(mutations)
+        for comment_key, result in zip(comment_keys, results):
+            if comment_key is None or not result:
+                continue
+            payload, comment = comment_key
+            comment_node = result['commentEdge']['node']
+            if self.gim is not None:
+                for journal_num in comment.get('journals', []):
+                    self.gim.get_comment_index().add_comment(
+                        payload['redmine_issue_num'], journal_num,
+                        comment_node['databaseId'], comment_node['url'])
+
+        failed_cnt = len([x for x in results if not x])
+        if failed_cnt > 0:
+            msgt('%s comment/close mutation(s) failed' % failed_cnt)
+
+        return issue_objs
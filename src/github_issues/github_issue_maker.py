@@ -4,12 +4,11 @@ from jinja2 import Environment, PackageLoader
 import os
 import sys
 import json
-import time
 import re
+import hashlib
+import difflib
 
 import csv
-import requests
-import pygithub3
 
 if __name__ == '__main__':
     SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -19,14 +18,23 @@ try:
     from settings.base import get_github_auth, get_github_golden_auth, \
         REDMINE_SERVER, USE_IMPORT_API, REDMINE_CATEGORY_MAP, \
         REDMINE_STATUS_MAP, REDMINE_USER_MAP, REDMINE_VERSION_MAP, \
-        REDMINE_PRIORITY_MAP, REDMINE_CF_MAP, REDMINE_TRACKER_MAP
+        REDMINE_PRIORITY_MAP, REDMINE_CF_MAP, REDMINE_TRACKER_MAP, \
+        GITHUB_COMMENT_INDEX_FILE, GITHUB_JOURNAL_COALESCE, \
+        GITHUB_DROP_NOOP_DETAILS, GITHUB_DETAIL_INLINE_MAX_CHARS, \
+        GITHUB_DETAIL_DIFF_MAX_CHARS, GITHUB_API_BACKEND, \
+        GITHUB_GRAPHQL_BATCH_SIZE, GITHUB_IMPORT_MAX_IN_FLIGHT, \
+        GITHUB_IMPORT_DEADLINE
 
     from utils.msg_util import *
     from github_issues.md_translate import translate_for_github
     from github_issues.milestone_helper import MilestoneHelper
     from github_issues.label_helper import LabelHelper
+    from github_issues.comment_index import CommentIndex
+    from github_issues.reference_rewriter import ReferenceRewriter
 
-    from github_golden_commet import GitHubIssueImporter
+    from github_issues.github_golden_commet import GitHubIssueImporter
+    from github_issues.github_graphql import GitHubGraphQLHelper
+    from github_issues.import_pipeline import IssueImportPipeline
 except Exception as e:
     raise
 
@@ -42,11 +50,23 @@ class GithubIssueMaker:
                           'Cannot Reproduce']
 
     def __init__(self, user_map_helper=None, label_mapping_filename=None,
-                 milestone_mapping_filename=None, use_import_api=False):
+                 milestone_mapping_filename=None, use_import_api=False,
+                 update_map_labels=True,
+                 comment_index_filename=GITHUB_COMMENT_INDEX_FILE,
+                 journal_coalesce=GITHUB_JOURNAL_COALESCE,
+                 drop_noop_details=GITHUB_DROP_NOOP_DETAILS,
+                 api_backend=GITHUB_API_BACKEND):
         self.github_conn = None
-        self.comments_service = None
+        self.graphql_conn = None
+        self.api_backend = api_backend
+        self.comment_index = None
+        self.reference_rewriter = None
+        self.comment_index_filename = comment_index_filename
+        self.journal_coalesce = journal_coalesce
+        self.drop_noop_details = drop_noop_details
         self.milestone_manager = MilestoneHelper(milestone_mapping_filename)
-        self.label_helper = LabelHelper(label_mapping_filename)
+        self.label_helper = LabelHelper(label_mapping_filename,
+                                        update_map_labels=update_map_labels)
         self.jinja_env = Environment(loader=PackageLoader('github_issues',
                                                           'templates'))
         self.user_map_helper = user_map_helper
@@ -60,17 +80,10 @@ class GithubIssueMaker:
         self.redmine_cf_map = self.read_csv_kvmap(REDMINE_CF_MAP)
         self.redmine_tracker_map = self.read_csv_kvmap(REDMINE_TRACKER_MAP)
 
-    def get_comments_service(self):
-        if self.comments_service is None:
-            self.comments_service = \
-                pygithub3.services.issues.Comments(**get_github_auth())
-
-        return self.comments_service
-
     def get_github_conn(self):
-        if self.github_conn is None:
-            self.github_conn = pygithub3.Github(**get_github_auth())
-        return self.github_conn
+        # All GitHub calls go through the REST helper and the shared
+        # HTTP transport (utils/http_transport.py)
+        return self.get_github_golden_conn()
 
     def get_github_golden_conn(self):
         if self.github_conn is None:
@@ -78,6 +91,18 @@ class GithubIssueMaker:
                 self, **get_github_golden_auth())
         return self.github_conn
 
+    def get_graphql_conn(self):
+        if self.graphql_conn is None:
+            self.graphql_conn = GitHubGraphQLHelper(
+                self, batch_size=GITHUB_GRAPHQL_BATCH_SIZE,
+                **get_github_golden_auth())
+        return self.graphql_conn
+
+    def get_comment_index(self):
+        if self.comment_index is None:
+            self.comment_index = CommentIndex(self.comment_index_filename)
+        return self.comment_index
+
     def read_csv_kvmap(self, file_path):
         msgt('Loading cvs map: %s' % file_path)
         kv_map = {}
@@ -158,13 +183,38 @@ class GithubIssueMaker:
 
     # TODO: search references in description text and also correct them
     def update_github_issue_with_related(self, redmine_json_fname,
-                                         redmine2github_issue_map):
+                                         redmine2github_issue_map,
+                                         last_update=None):
         """
         Update a GitHub issue with related tickets as specfied in Redmine
 
         - Read the current github description
         - Add related notes to the bottom of description
-        - Update the description
+        - Update the description, if it changed
+
+        :param last_update: optional, the dicts returned by the earlier
+            calls for this issue, merged.  If the last call succeeded and
+            the redmine issue and the github issue numbers it references
+            are unchanged, no API call is made.
+
+        References are always rewritten from the description and comments
+        as they were before the first update, kept under "originals", so
+        an update made again--after a failure, or when more issues are
+        mapped--doesn't rewrite the github issue numbers of the last one.
+
+        :returns: None if the issue isn't migrated, else a dict:
+            {"redmine_issue": 4160, "github_issue": 35,
+             "input_sha": sha256 of the redmine issue and the github issue
+                          numbers it references,
+             "status": "skipped", "unchanged", "updated" or "failed",
+             "redmine_closed": True if the redmine issue is closed,
+             "api_calls": calls made,
+             "api_calls_saved": calls made by an update of every body and
+                                matched comment, minus api_calls,
+             "full_api_calls": calls made by an update of every body and
+                               matched comment,
+             "originals": only in the first call, {"body": description,
+                          "comments": { comment id (str) : body }}}
 
         "relations": [
               {
@@ -208,6 +258,21 @@ class GithubIssueMaker:
             msg('Redmine issue not in nap')
             return
 
+        result = dict(redmine_issue=redmine_issue_num,
+                      github_issue=github_issue_num,
+                      input_sha=self.get_related_input_sha(
+                          json_str, rd, github_issue_num,
+                          redmine2github_issue_map),
+                      status='skipped', api_calls=0,
+                      redmine_closed=self.is_redmine_issue_closed(rd))
+        if last_update and \
+                last_update.get('input_sha', None) == result['input_sha'] \
+                and not last_update.get('status', None) == 'failed':
+            msg('Unchanged since the last update: %s' % redmine_issue_num)
+            result['full_api_calls'] = last_update.get('full_api_calls', 0)
+            result['api_calls_saved'] = result['full_api_calls']
+            return result
+
         # Related tickets under 'relations'
         #
         github_related_tickets = []
@@ -267,32 +332,50 @@ class GithubIssueMaker:
         # end: Related tickets under 'children'
 
         update_issue = False
-        try:
-            issue = self.get_github_conn().issues.get(number=github_issue_num)
-            # time.sleep(1)
-            time.sleep(0.5)
-            updated_description, update_issue = \
-                self.fix_issue_references(issue.body,
-                                          redmine2github_issue_map)
-            if issue.comments > 0:
-                comments = self.get_github_conn().issues.comments.list(
-                    number=github_issue_num)
-                # time.sleep(1)
-                time.sleep(0.5)
-                for page in comments:
-                    for comm in page:
-                        updated_cbody, did_match = \
-                            self.fix_issue_references(
-                                comm.body, redmine2github_issue_map)
-                        if did_match is True:
-                            self.get_github_conn().issues.comments.update(
-                                id=comm.id, message=updated_cbody)
-                            msg('Comment updated!')
-                            # time.sleep(1)
-                            time.sleep(0.5)
-        except pygithub3.exceptions.NotFound:
+        update_failed = False
+        issue = self.get_github_conn().issues.get_issue(github_issue_num)
+        result['api_calls'] += 1
+        full_api_calls = 1
+        if issue is None:
             msg('Issue not found!')
             return
+        comments = []
+        if issue['comments'] > 0:
+            comments = self.get_github_conn().issues.list_comments(
+                github_issue_num)
+            result['api_calls'] += 1
+            full_api_calls += 1
+
+        originals = (last_update or {}).get('originals', None)
+        if originals is None:
+            # the text as migrated, before any reference is rewritten
+            originals = {'body': issue['body'],
+                         'comments': dict(('%s' % comm['id'], comm['body'])
+                                          for comm in comments)}
+            result['originals'] = originals
+
+        updated_description, update_issue = self.fix_issue_references(
+            originals['body'], redmine2github_issue_map)
+        if comments:
+            # comments added after the first update are left as they are
+            current_cbodies = dict((comm['id'], comm['body'])
+                                   for comm in comments)
+            updated_cbodies = self.get_reference_rewriter(
+                redmine2github_issue_map).rewrite_bodies(
+                    dict((x, originals['comments'][str(x)]) for x in
+                         current_cbodies if str(x) in originals['comments']))
+            for comment_id, updated_cbody in updated_cbodies.items():
+                if updated_cbody == current_cbodies[comment_id]:
+                    # rewritten by an earlier update
+                    continue
+                result['api_calls'] += 1
+                full_api_calls += 1
+                if self.get_github_conn().issues.update_comment(
+                        comment_id, updated_cbody):
+                    msg('Comment updated!')
+                else:
+                    msg('Comment update failed: %s' % comment_id)
+                    update_failed = True
 
         #
         # Update github issue with related and child tickets
@@ -328,7 +411,7 @@ class GithubIssueMaker:
             msg('Github sub-issues: %s' % github_children_str)
 
             template = self.jinja_env.get_template('related_issues.md')
-            template_params = {'original_description': issue.body,
+            template_params = {'original_description': updated_description,
                                'original_issues': original_issues_str,
                                'related_issues': related_issue_str,
                                'child_issues_original': original_children_str,
@@ -336,50 +419,117 @@ class GithubIssueMaker:
 
             updated_description = template.render(template_params)
 
+        result['status'] = 'unchanged'
         if update_issue is True:
-            issue = self.get_github_conn().issues.update(
-                number=github_issue_num, data={'body': updated_description})
-            time.sleep(1)
-            msg('Issue updated!')  # ' % issue.body)
+            full_api_calls += 1
+            if self.get_body_sha(updated_description) == \
+                    self.get_body_sha(issue['body']):
+                msg('Description unchanged, not updated')
+            else:
+                result['api_calls'] += 1
+                if self.get_github_conn().issues.update_issue(
+                        github_issue_num, {'body': updated_description}):
+                    result['status'] = 'updated'
+                    msg('Issue updated!')  # ' % issue.body)
+                else:
+                    msg('Issue update failed')
+                    update_failed = True
+
+        if update_failed:
+            # not saved as the last update, so the next run tries again
+            result['status'] = 'failed'
+
+        result['full_api_calls'] = full_api_calls
+        result['api_calls_saved'] = full_api_calls - result['api_calls']
+        return result
+
+    def get_body_sha(self, body):
+        return hashlib.sha256((body or '').encode('utf-8')).hexdigest()
+
+    def get_related_input_sha(self, json_str, rd, github_issue_num,
+                              redmine2github_issue_map):
+        """
+        :returns: sha256 of everything the related issue update depends on:
+            the redmine issue JSON and the github issue numbers of the
+            redmine issues it references
+        """
+        ref_ids = set()
+        for match in ReferenceRewriter.REFERENCE_PATTERN.finditer(json_str):
+            if match.group('issue'):
+                ref_ids.add(int(match.group('issue')))
+        for rel in rd.get('relations', None) or []:
+            for id_key in ['issue_id', 'issue_to_id']:
+                if rel.get(id_key, None) is not None:
+                    ref_ids.add(int(rel[id_key]))
+        for ctick in rd.get('children', None) or []:
+            if ctick.get('id', None) is not None:
+                ref_ids.add(int(ctick['id']))
+
+        mapped_ids = [(x, redmine2github_issue_map.get(str(x), None))
+                      for x in sorted(ref_ids)]
+        sha = hashlib.sha256(json_str.encode('utf-8'))
+        sha.update(json.dumps([github_issue_num, mapped_ids]).encode('utf-8'))
+        return sha.hexdigest()
+
+    def get_reference_rewriter(self, redmine2github_issue_map):
+        if self.reference_rewriter is None or \
+                self.reference_rewriter.redmine2github_issue_map is not \
+                redmine2github_issue_map:
+            self.reference_rewriter = ReferenceRewriter(
+                redmine2github_issue_map,
+                comment_url_lookup=self.get_comment_url)
+        return self.reference_rewriter
 
     def fix_issue_references(self, text, redmine2github_issue_map):
-        # msg('fix_issue_references')
-        result = text
-        did_match = False
-
-        # search comment references
-        matches = re.findall(r'#[0-9]+(?:(?:-[0-9]+)|(?:#note-[0-9]+))', text)
-        for match in matches:
-            issue_id = re.search(r'#[0-9]+', match)
-            msgt('Match (1st) found: %s' % issue_id.group(0))
-            comm_nbr = re.search(r'-[0-9]+', match)
-            git_issue = \
-                redmine2github_issue_map.get(issue_id.group(0)[1:], None)
-            comments = \
-                self.get_github_conn().issues.comments.list(number=git_issue)
-
-            i = 1
-            url = None
-            cni = int(comm_nbr.group(0)[1:])
-            for page in comments:
-                for comm in page:
-                    if i == cni:
-                        repl = comm.html_url
-                        if repl is not None:
-                            result = re.sub(match, repl, text)
-                            did_match = True
-                    i += 1
-
-        # search issue references
-        matches = re.findall(r'#[0-9]+', result)
-        for match in matches:
-            msgt('Match (2nd) found: %s' % match[1:])
-            repl = redmine2github_issue_map.get(match[1:], None)
-            if repl is not None:
-                result = re.sub(match, '#' + str(repl), result)
-                did_match = True
-
-        return result, did_match
+        """
+        Rewrite the redmine issue, note and commit references of a text
+
+        :returns: tuple of (rewritten text, True if the text changed)
+        """
+        return self.get_reference_rewriter(
+            redmine2github_issue_map).rewrite(text)
+
+    def get_comment_url(self, redmine_issue_num, github_issue_num,
+                        journal_num):
+        """
+        Look up the GitHub comment made from a redmine journal in the
+        comment index.
+
+        Issues not in it--imported, or migrated before the index
+        existed--have their comments listed once, from the API, and added
+        to the index with their recorded layout or, without one, as one
+        comment per journal.  That can't be assumed when journals are
+        coalesced or dropped: the redmine note is linked instead.
+        """
+        comment_index = self.get_comment_index()
+        if not comment_index.has_issue(redmine_issue_num):
+            journal_groups = comment_index.get_layout(redmine_issue_num)
+            if journal_groups is None and \
+                    (self.journal_coalesce or self.drop_noop_details):
+                return self.format_redmine_note_link(redmine_issue_num,
+                                                     journal_num)
+
+            msg('Comment index: add comments of github issue #%s' %
+                github_issue_num)
+            comment_index.add_comments(
+                redmine_issue_num,
+                self.get_github_conn().issues.list_comments(github_issue_num),
+                journal_groups)
+
+        return comment_index.get_comment_url(redmine_issue_num,
+                                             journal_num) or \
+            self.format_redmine_note_link(redmine_issue_num, journal_num)
+
+    def record_comment_layout(self, payload):
+        """
+        Record the journal #'s of the comments of an issue created with
+        the import API, which doesn't return the comment ids
+        """
+        comment_index = self.get_comment_index()
+        if not comment_index.has_issue(payload['redmine_issue_num']):
+            comment_index.add_layout(
+                payload['redmine_issue_num'],
+                [x.get('journals', None) or [] for x in payload['comments']])
 
     def format_redmine_issue_link(self, issue_id):
         if issue_id is None:
@@ -387,6 +537,51 @@ class GithubIssueMaker:
 
         return os.path.join(REDMINE_SERVER, 'issues', '%d' % issue_id)
 
+    def format_redmine_note_link(self, issue_id, journal_num):
+        return os.path.join(REDMINE_SERVER, 'issues',
+                            '%s#note-%s' % (issue_id, journal_num))
+
+    def get_redmine_marker_pattern(self):
+        """
+        :returns: regex matching the "Original Redmine Issue" line of an
+            issue description (templates/description.md).  Group 1 is
+            the redmine issue #
+        """
+        return re.compile(r'Original Redmine Issue: \[(\d+)\]\(%s\1\)' %
+                          re.escape(os.path.join(REDMINE_SERVER, 'issues',
+                                                 '')))
+
+    def find_migrated_issues(self, redmine_issue_nums, since=None):
+        """
+        Look for the github issues made from redmine issues, by the redmine
+        marker in their description
+
+        :param redmine_issue_nums: list of redmine issue #'s
+        :param since: optional, ISO 8601 time.  Only the github issues
+            updated since are listed
+        :returns: dict of { redmine issue # : github issue # }.  If an
+            issue was created more than once, the first one is kept
+        """
+        redmine_issue_nums = set(int(x) for x in redmine_issue_nums)
+        marker_pattern = self.get_redmine_marker_pattern()
+
+        found = {}
+        for issue in self.get_github_conn().issues.list_issues(since):
+            match = marker_pattern.search(issue.get('body', None) or '')
+            if match is None:
+                continue
+            redmine_issue_num = int(match.group(1))
+            if redmine_issue_num not in redmine_issue_nums:
+                continue
+            if redmine_issue_num in found:
+                msg('Redmine issue #%s is on github more than once: #%s and '
+                    '#%s' % (redmine_issue_num, found[redmine_issue_num],
+                             issue['number']))
+                if found[redmine_issue_num] < issue['number']:
+                    continue
+            found[redmine_issue_num] = issue['number']
+        return found
+
     def close_gitgub_issue_using_api(self, github_issue_id):
         """
         This function is used to close the issue while migrating using
@@ -407,24 +602,19 @@ class GithubIssueMaker:
             return False
         msgt('Close issue: %s' % github_issue_num)
 
-        try:
-            issue = self.get_github_conn().issues.get(number=github_issue_num)
-        except pygithub3.exceptions.NotFound:
+        issue = self.get_github_conn().issues.get_issue(github_issue_num)
+        if issue is None:
             msg('Issue not found!')
             return False
 
-        if issue.state in self.ISSUE_STATE_CLOSED:
+        if issue['state'] == 'closed':
             msg('Already closed')
             return True
 
         updated_issue = \
-            self.get_github_conn().issues.update(number=github_issue_num,
-                                                 data={'state': 'closed'})
-        if not updated_issue:
-            msg('Failed to close issue')
-            return False
-
-        if updated_issue.state in self.ISSUE_STATE_CLOSED:
+            self.get_github_conn().issues.update_issue(github_issue_num,
+                                                       {'state': 'closed'})
+        if updated_issue is True:
             msg('Issue closed')
             return True
 
@@ -440,6 +630,22 @@ class GithubIssueMaker:
         - Add/Create Labels
         - Add/Create Milestones
         """
+        payload = self.compile_github_payload(redmine_json_fname, **kwargs)
+        return self.make_github_issue_from_payload(payload)
+
+    def compile_github_payload(self, redmine_json_fname, **kwargs):
+        """
+        Render everything needed to create the GitHub issue for a Redmine
+        issue, without calling the GitHub API.
+
+        :returns: dict with the format:
+            {"redmine_issue_num": 4160,
+             "issue": { GitHub API issue: title, body, assignee, labels,
+                        ... },
+             "comments": [ {"body": ..., "created_at": ...}, ... ],
+             "labels": [ label names ],
+             "closed": true/false}
+        """
         if not os.path.isfile(redmine_json_fname):
             msgx('ERROR.  make_github_issue. file not found: %s'
                  % redmine_json_fname)
@@ -452,7 +658,7 @@ class GithubIssueMaker:
         rd = json.loads(json_str)       # The redmine issue as a python dict
 
         # msg(json.dumps(rd, indent=4))
-        msg('Attempt to create issue: [#%s][%s]' %
+        msg('Compile issue: [#%s][%s]' %
             (rd.get('id'), rd.get('subject').encode('utf-8')))
 
         # (1) Format the github issue description
@@ -527,53 +733,153 @@ class GithubIssueMaker:
             if assignee:
                 github_issue_dict['assignee'] = assignee
 
+        # Map the redmine labels to the github labels, created with the
+        # issue
+        label_names = []
+        if self.label_helper.using_label_map:
+            label_names = self.label_helper.get_label_names_based_on_map(rd)
+        if label_names:
+            github_issue_dict['labels'] = label_names
+
         msg(github_issue_dict)
 
-        if include_comments:
-            journals = rd.get('journals', None)
+        #
+        # (3) Render the redmine comments (journals) as github comments
+        #
+        comments = []
+        journals = rd.get('journals', None)
+        if include_comments and journals:
+            comments = self.process_journals(journals, attachments)
+
+        return {'redmine_issue_num': rd.get('id'),
+                'issue': github_issue_dict,
+                'comments': comments,
+                'labels': label_names,
+                'closed': self.is_redmine_issue_closed(rd)}
+
+    def make_github_issue_from_payload(self, payload):
+        """
+        Create a GitHub issue from a payload made by compile_github_payload
+
+        :returns: the GitHub issue # or None if the creation failed
+        """
+        if self.api_backend == 'graphql':
+            return self.make_github_issues_from_payloads([payload])[0]
+
+        msg('Attempt to create issue: [#%s]' % payload['redmine_issue_num'])
 
         #
-        # (3) Create the issue on github
+        # (1) Create the issue on github
         #
         if self.use_import_api is True:
             issue_obj = \
-                self.get_github_golden_conn().issues.create(
-                    github_issue_dict, journals, attachments)
+                self.get_github_golden_conn().issues.create_issue(
+                    {'issue': payload['issue'],
+                     'comments': payload['comments'],
+                     'redmine_issue_num': payload['redmine_issue_num']})
         else:
             issue_obj = \
-                self.get_github_conn().issues.create(github_issue_dict)
+                self.get_github_conn().issues.open_issue(payload['issue'])
+
+        if issue_obj is None:
+            msgt('Failed to create github issue')
+            return None
 
         msgt('Github issue created: %s' % issue_obj.number)
         msg('issue id: %s' % issue_obj.id)
         msg('issue url: %s' % issue_obj.html_url)
-
-        # Map the redmine labels to the github labels
-        label_names = self.label_helper.get_label_names_based_on_map(rd)
-        self.label_helper.add_labels_to_issue(issue_obj.id, label_names)
-
-        # Map the new github Issue number to the redmine issue number
-        #
-        # redmine2github_id_map.update({ rd.get('id', 'unknown') :
-        # issue_obj.number })
-
-        # print( redmine2github_id_map)
+        if self.use_import_api is True:
+            self.record_comment_layout(payload)
 
         #
-        # (4) Add the redmine comments (journals) as github comments
+        # (2) Add the rendered comments
         #
-        if journals and self.use_import_api is not True:
-            self.add_comments_for_issue(issue_obj.number, journals,
-                                        attachments)
+        if payload['comments'] and self.use_import_api is not True:
+            self.add_comments(issue_obj.number, payload['comments'],
+                              payload['redmine_issue_num'])
 
         #
-        #   (5) Should this issue be closed?
+        #   (3) Should this issue be closed?
         #
-        if self.is_redmine_issue_closed(rd) and \
-                self.use_import_api is not True:
+        if payload['closed'] and self.use_import_api is not True:
             self.close_github_issue(issue_obj.number)
-        elif self.is_redmine_issue_closed(rd) and self.use_import_api:
+        elif payload['closed'] and self.use_import_api:
             self.close_gitgub_issue_using_api(issue_obj.id)
-        return issue_obj.id
+
+        # The import API's Issue carries the github issue # as its id
+        if self.use_import_api is True:
+            return issue_obj.id
+        return issue_obj.number
+
+    def open_github_issue(self, payload):
+        """
+        Create a GitHub issue, with its labels, assignee and milestone but
+        without its comments, using the REST API.  See
+        MigrationManager.migrate_issues_staged
+
+        :returns: the GitHub issue # or None if the creation failed
+        """
+        msg('Attempt to create issue: [#%s]' % payload['redmine_issue_num'])
+        issue_obj = self.get_github_conn().issues.open_issue(payload['issue'])
+        if issue_obj is None:
+            msgt('Failed to create github issue: [#%s]' %
+                 payload['redmine_issue_num'])
+            return None
+
+        msgt('Github issue created: %s' % issue_obj.number)
+        msg('issue url: %s' % issue_obj.html_url)
+        return issue_obj.number
+
+    def get_unposted_comments(self, payload):
+        """
+        :returns: list of the comments of a payload not in the comment
+            index, e.g. not added before a migration was interrupted
+        """
+        comment_index = self.get_comment_index()
+        unposted = []
+        for comment in payload['comments']:
+            journal_nums = comment.get('journals', None) or []
+            if journal_nums and all(
+                    comment_index.get_comment_url(
+                        payload['redmine_issue_num'], x) is not None
+                    for x in journal_nums):
+                continue
+            unposted.append(comment)
+        return unposted
+
+    def make_github_issues_from_payloads(self, payloads):
+        """
+        Create GitHub issues from a list of payloads.  With the 'graphql'
+        api_backend, the issues are created together in aliased mutations
+
+        :returns: list of GitHub issue numbers--None if the creation
+            failed--in the order of the payloads
+        """
+        if not self.api_backend == 'graphql':
+            return [self.make_github_issue_from_payload(x) for x in payloads]
+
+        msg('Attempt to create issues: %s' %
+            ', '.join('[#%s]' % x['redmine_issue_num'] for x in payloads))
+        issue_objs = self.get_graphql_conn().create_issues(payloads)
+        return [x.number if x is not None else None for x in issue_objs]
+
+    def import_github_issues(self, payloads):
+        """
+        Create GitHub issues with the issue import API, keeping up to
+        GITHUB_IMPORT_MAX_IN_FLIGHT imports pending at once.  The comments
+        and the closed state are part of each import.
+
+        :param payloads: iterable of payloads, see compile_github_payload
+        :returns: generator of (redmine issue #, GitHub issue # or None),
+            in the order the imports finish
+        """
+        pipeline = IssueImportPipeline(
+            max_in_flight=GITHUB_IMPORT_MAX_IN_FLIGHT,
+            deadline=GITHUB_IMPORT_DEADLINE, **get_github_golden_auth())
+        for payload, issue_number, errors in pipeline.run(payloads):
+            if issue_number:
+                self.record_comment_layout(payload)
+            yield payload['redmine_issue_num'], issue_number
 
     def is_redmine_issue_closed(self, redmine_issue_dict):
         """
@@ -616,112 +922,231 @@ class GithubIssueMaker:
             return self.redmine_cf_map[name]
         return name
 
+    def is_noop_detail(self, detail):
+        """
+        A journal detail that changes nothing, e.g. a value set to itself
+        """
+        old_value = detail.get('old_value', None) or None
+        new_value = detail.get('new_value', None) or None
+        return old_value == new_value
+
+    def is_long_text_detail(self, prop, name, old_value, new_value):
+        """
+        Description changes, and other values too long to show inline,
+        are shown as a diff
+        """
+        if prop == 'attr' and name == 'description':
+            return True
+        return any(len(x) > GITHUB_DETAIL_INLINE_MAX_CHARS for x in
+                   [old_value or '', new_value or ''])
+
+    def format_text_change(self, old_value, new_value):
+        """
+        Show a text change as a summary line plus a unified diff, or the
+        summary line alone if the diff is over GITHUB_DETAIL_DIFF_MAX_CHARS
+
+        :returns: dict with the detail keys "new_value" (the summary),
+            "diff" and "diff_fence"
+        """
+        # skip the "---" and "+++" header lines
+        diff_lines = list(difflib.unified_diff(
+            (old_value or '').splitlines(), (new_value or '').splitlines(),
+            lineterm='', n=1))[2:]
+        added_cnt = len([x for x in diff_lines if x.startswith('+')])
+        removed_cnt = len([x for x in diff_lines if x.startswith('-')])
+
+        text_change = {'new_value': '(%s line(s) added, %s line(s) removed)'
+                                    % (added_cnt, removed_cnt),
+                       'diff': None,
+                       'diff_fence': None}
+
+        diff = '\n'.join(diff_lines)
+        if diff and len(diff) <= GITHUB_DETAIL_DIFF_MAX_CHARS:
+            # a fence longer than any run of backticks in the diff
+            longest_run = max([len(x) for x in re.findall('`+', diff)] or
+                              [0])
+            text_change['diff'] = diff
+            text_change['diff_fence'] = '`' * max(3, longest_run + 1)
+        return text_change
+
+    def process_journal(self, j, attachment_lookup):
+        """
+        :returns: dict with the params of the "comment.md" template, or
+            None if the journal is dropped
+        """
+        notes = j.get('notes', None)
+        if not notes:
+            notes = ''
+
+        author_name = j.get('user', {}).get('name', None)
+        author_github_username = self.format_name_for_github(author_name)
+        comment_attachments = []
+        comment_details = []
+
+        # Find attachments that were added with this comment
+        for d in j.get('details'):
+            if d.get('property') == 'attachment':
+                attachment = attachment_lookup.get(d.get('name'), None)
+
+                if attachment is not None:
+                    comment_attachments.append(attachment)
+            elif self.drop_noop_details and self.is_noop_detail(d):
+                continue
+
+            detail = {}
+            action = None
+            prop = d.get('property')
+            name = d.get('name')
+            old_value = d.get('old_value')
+            new_value = d.get('new_value')
+            if prop == 'cf':
+                name = self.map_property_names(name)
+            if prop == 'relation':
+                if new_value:
+                    new_value = '#' + new_value
+                if old_value:
+                    old_value = '#' + old_value
+            if self.is_long_text_detail(prop, name, old_value, new_value):
+                detail.update(self.format_text_change(old_value, new_value))
+                action = 'was changed '
+            elif old_value is not None and new_value is not None:
+                detail['old_value'] = \
+                    self.map_property_ids(prop, name, old_value)
+                detail['new_value'] = \
+                    'to ' + self.map_property_ids(prop, name, new_value)
+                action = 'was changed from '
+                if detail['old_value'] is None or \
+                        detail['old_value'] == '':
+                    action = 'was changed '
+            elif old_value is None and new_value is not None:
+                detail['new_value'] = \
+                    'as ' + self.map_property_ids(prop, name, new_value)
+                action = 'was configured '
+            elif old_value is not None and new_value is None:
+                detail['old_value'] = \
+                    self.map_property_ids(prop, name, old_value)
+                action = 'removed '
+
+            detail['name'] = name
+            detail['action'] = action
+            comment_details.append(detail)
+
+        if self.drop_noop_details and not notes and \
+                not comment_details and not comment_attachments:
+            return None
+
+        return {'description': translate_for_github(notes),
+                'note_date': j.get('created_on', None),
+                'author_name': author_name,
+                'author_github_username': author_github_username,
+                'attachments': comment_attachments,
+                'details': comment_details}
+
     def process_journals(self, journals, attachments):
+        """
+        Render the redmine journals as github comments.
+
+        Each comment is a dict: {"body": ..., "created_at": ...,
+        "journals": [1-based #'s of the journals it was made from]}
+
+        With self.journal_coalesce, journals without notes are merged into
+        one "change history" comment:
+            - 'consecutive': per run of consecutive journals without notes
+            - 'all': for the whole issue, placed at the first of them
+        """
         if journals is None:
             msg('no journals')
             return
 
-        comments = []
         comment_template = self.jinja_env.get_template('comment.md')
+        history_template = self.jinja_env.get_template('change_history.md')
+
+        # { attachment id (str) : attachment dict }
+        attachment_lookup = dict((str(x.get('id')), x) for x in
+                                 attachments or [])
+
+        # Group the journals: [ [(journal #, note_dict), ...], ... ]
+        journal_groups = []
+        history_group = None
+        for journal_num, j in enumerate(journals, 1):
+            note_dict = self.process_journal(j, attachment_lookup)
+            if note_dict is None:
+                continue
+
+            if self.journal_coalesce and not note_dict['description']:
+                if history_group is None:
+                    history_group = []
+                    journal_groups.append(history_group)
+                history_group.append((journal_num, note_dict))
+                continue
 
-        for j in journals:
-            notes = j.get('notes', None)
-            if not notes:
-                notes = ''
-
-            author_name = j.get('user', {}).get('name', None)
-            author_github_username = self.format_name_for_github(author_name)
-            comment_attachments = []
-            comment_details = []
-
-            # Find attachments that were added with this comment
-            for d in j.get('details'):
-                if d.get('property') == 'attachment':
-                    attachment = \
-                        next((x for x in attachments
-                              if str(x.get('id')) == d.get('name')), None)
-
-                    if attachment is not None:
-                        comment_attachments.append(attachment)
-
-                detail = {}
-                prop = d.get('property')
-                name = d.get('name')
-                old_value = d.get('old_value')
-                new_value = d.get('new_value')
-                if prop == 'cf':
-                    name = self.map_property_names(name)
-                if prop == 'relation':
-                    if new_value:
-                        new_value = '#' + new_value
-                    if old_value:
-                        old_value = '#' + old_value
-                if old_value is not None and new_value is not None:
-                    detail['old_value'] = \
-                        self.map_property_ids(prop, name, old_value)
-                    detail['new_value'] = \
-                        'to ' + self.map_property_ids(prop, name, new_value)
-                    action = 'was changed from '
-                    if detail['old_value'] is None or \
-                            detail['old_value'] == '':
-                        action = 'was changed '
-                elif old_value is None and new_value is not None:
-                    detail['new_value'] = \
-                        'as ' + self.map_property_ids(prop, name, new_value)
-                    action = 'was configured '
-                elif old_value is not None and new_value is None:
-                    detail['old_value'] = \
-                        self.map_property_ids(prop, name, old_value)
-                    action = 'removed '
-
-                detail['name'] = name
-                detail['action'] = action
-                comment_details.append(detail)
-
-            note_dict = {'description': translate_for_github(notes),
-                         'note_date': j.get('created_on', None),
-                         'author_name': author_name,
-                         'author_github_username': author_github_username,
-                         'attachments': comment_attachments,
-                         'details': comment_details}
-            comment_info = comment_template.render(note_dict)
+            journal_groups.append([(journal_num, note_dict)])
+            if self.journal_coalesce == 'consecutive':
+                history_group = None
+
+        comments = []
+        for journal_group in journal_groups:
+            note_dict = journal_group[0][1]
+            if len(journal_group) == 1:
+                comment_info = comment_template.render(note_dict)
+            else:
+                comment_info = history_template.render(
+                    {'entries': [x[1] for x in journal_group]})
 
             comment_data = {}
             if 'note_date' in note_dict and \
                     note_dict['note_date'] is not None:
                 comment_data['created_at'] = note_dict['note_date']
             comment_data['body'] = comment_info
+            comment_data['journals'] = [x[0] for x in journal_group]
             comments.append(comment_data)
 
+        if len(comments) < len(journals):
+            msg('%s journal(s) migrated as %s comment(s)' %
+                (len(journals), len(comments)))
         return comments
 
-    def add_comments_for_issue(self, issue_num, journals, attachments):
+    def add_comments_for_issue(self, issue_num, journals, attachments,
+                               redmine_issue_num=None):
         """
         Add comments
         """
         comments = self.process_journals(journals, attachments)
+        self.add_comments(issue_num, comments, redmine_issue_num)
+
+    def add_comments(self, issue_num, comments, redmine_issue_num=None):
+        """
+        Add comments rendered by process_journals.  If redmine_issue_num is
+        given, each comment is recorded in the comment index under the
+        journal #'s it was made from
 
+        :returns: True if every comment was added
+        """
+        all_added = True
         for comm in comments:
-            comment_obj = None
-            try:
-                comment_obj = \
-                    self.get_comments_service().create(
-                        issue_num, comm['body'])
-                msgt('sleep 1 second....')
-                time.sleep(1)
-            except requests.exceptions.HTTPError as e:
-                msgt('Error creating comment: %s' % e.message)
+            comment_obj = \
+                self.get_github_conn().issues.create_comment(issue_num,
+                                                             comm['body'])
+            if comment_obj is None:
+                msgt('Error creating comment')
+                all_added = False
                 continue
 
-            if comment_obj:
-                dashes()
-                msg('comment created')
+            dashes()
+            msg('comment created')
+
+            msg('comment id: %s' % comment_obj['id'])
+            msg('api issue_url: %s' % comment_obj['issue_url'])
+            msg('api comment url: %s' % comment_obj['url'])
+            msg('html_url: %s' % comment_obj['html_url'])
+
+            if redmine_issue_num is not None:
+                for journal_num in comm['journals']:
+                    self.get_comment_index().add_comment(
+                        redmine_issue_num, journal_num, comment_obj['id'],
+                        comment_obj['html_url'])
 
-                msg('comment id: %s' % comment_obj.id)
-                msg('api issue_url: %s' % comment_obj.issue_url)
-                msg('api comment url: %s' % comment_obj.url)
-                msg('html_url: %s' % comment_obj.html_url)
-                # msg(dir(comment_obj))
+        return all_added
 
 
 if __name__ == '__main__':
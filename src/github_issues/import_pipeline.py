@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+
+if __name__ == '__main__':
+    SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+    from utils import http_transport
+except Exception as e:
+    raise
+
+
+class IssueImportPipeline:
+    """
+    Create issues with GitHub's issue import API, keeping up to
+    max_in_flight imports pending at once.
+
+    Submitted imports are kept in a pending table { import id : entry }.
+    Their status is checked in bulk, with one listing of the repository's
+    imports (GET /repos/:owner/:repo/import/issues?since=...) per poll,
+    instead of one request per import.  Polls back off while nothing
+    finishes, and an import still pending after deadline seconds is
+    reported as failed.
+    """
+    ACCEPT_HEADER = 'application/vnd.github.golden-comet-preview+json'
+
+    # 1 keeps the redmine issue order
+    DEFAULT_MAX_IN_FLIGHT = 1
+    DEFAULT_DEADLINE = 600      # seconds
+
+    # Wait between polls: from MIN_POLL_INTERVAL, doubled while no import
+    # finishes, up to MAX_POLL_INTERVAL
+    MIN_POLL_INTERVAL = 0.5
+    MAX_POLL_INTERVAL = 10
+
+    def __init__(self, **config):
+        """
+        :param config: see settings.base.get_github_golden_auth, plus
+            optional "max_in_flight" and "deadline" (seconds)
+        """
+        self._user = config['user']
+        self._repo = config['repo']
+        self._auth = (self._user, config['password'])
+        self.max_in_flight = config.get('max_in_flight', None) or \
+            self.DEFAULT_MAX_IN_FLIGHT
+        self.deadline = config.get('deadline', None) or self.DEFAULT_DEADLINE
+
+        self.import_url = 'https://api.github.com/repos/%s/%s/import/issues' \
+                          % (self._user, self._repo)
+        self.headers = {'Accept': self.ACCEPT_HEADER}
+
+        self.pending = {}   # { import id : entry dict, see submit }
+
+    def get_import_data(self, payload):
+        """
+        :returns: the import API request for a payload, see
+            GithubIssueMaker.compile_github_payload
+        """
+        comments = [dict((k, v) for k, v in x.items() if not k == 'journals')
+                    for x in payload['comments']]
+        return {'issue': payload['issue'], 'comments': comments}
+
+    def submit(self, payload):
+        """
+        Submit the import of a payload and add it to the pending table.
+        If GitHub rejects the assignee--e.g. not a collaborator--the
+        import is submitted again without it
+
+        :returns: None, or a result--see run--if the submission failed
+        """
+        import_data = self.get_import_data(payload)
+        while True:
+            try:
+                req = http_transport.post(self.import_url,
+                                          data=json.dumps(import_data),
+                                          auth=self._auth,
+                                          headers=self.headers)
+            except Exception as e:
+                # the imports already pending are still checked
+                msg('Import submission failed: [#%s] %s' %
+                    (payload['redmine_issue_num'], e))
+                return (payload, None, ['%s' % e])
+
+            if req.status_code == 422 and \
+                    'Validation Failed' in req.text and \
+                    'assignee' in import_data['issue']:
+                msg('Import submission failed: [#%s] %s.  Submitted '
+                    'again without the assignee' %
+                    (payload['redmine_issue_num'], req.text))
+                import_data['issue'] = dict(
+                    (k, v) for k, v in import_data['issue'].items()
+                    if not k == 'assignee')
+                continue
+            break
+
+        if not req.status_code == 202:
+            msg('Import submission failed: [#%s] %s %s' %
+                (payload['redmine_issue_num'], req.status_code, req.text))
+            return (payload, None, [req.text])
+
+        import_status = req.json()
+        self.pending[import_status['id']] = dict(
+            payload=payload, created_at=import_status['created_at'],
+            deadline=time.time() + self.deadline)
+        msg('Import submitted: [#%s] import id %s' %
+            (payload['redmine_issue_num'], import_status['id']))
+        return None
+
+    def poll(self):
+        """
+        Check the status of the pending imports, with one listing of the
+        imports created since the oldest pending one
+
+        :returns: list of results of the finished imports, see run
+        """
+        since = min(x['created_at'] for x in self.pending.values())
+        statuses = []
+        list_url = self.import_url
+        params = {'since': since}
+        while list_url:
+            try:
+                req = http_transport.get(list_url, params=params,
+                                         auth=self._auth,
+                                         headers=self.headers)
+            except Exception as e:
+                # checked again at the next poll
+                msg('Import status listing failed: %s' % e)
+                break
+            if not req.status_code == 200:
+                msg('Import status listing failed: %s %s' %
+                    (req.status_code, req.text))
+                break
+            statuses += req.json()
+            list_url = req.links.get('next', {}).get('url', None)
+            params = None   # already part of the "next" url
+
+        results = []
+        for import_status in statuses:
+            entry = self.pending.get(import_status['id'], None)
+            if entry is None:
+                continue
+
+            if import_status['status'] == 'imported':
+                issue_number = \
+                    int(import_status['issue_url'].split('/')[-1])
+                results.append((entry['payload'], issue_number, None))
+            elif import_status['status'] == 'failed':
+                results.append((entry['payload'], None,
+                                import_status.get('errors', None) or []))
+            else:
+                continue
+            del self.pending[import_status['id']]
+
+        # Pending past their deadline
+        now = time.time()
+        for import_id, entry in list(self.pending.items()):
+            if entry['deadline'] < now:
+                results.append((entry['payload'], None,
+                                ['Still pending after %s seconds, import '
+                                 'id %s' % (self.deadline, import_id)]))
+                del self.pending[import_id]
+
+        return results
+
+    def run(self, payloads):
+        """
+        Import the payloads, keeping up to self.max_in_flight pending
+
+        :param payloads: iterable of payloads
+        :returns: generator of (payload, github issue # or None, errors or
+            None), in the order the imports finish
+        """
+        payloads = iter(payloads)
+        is_exhausted = False
+        poll_interval = self.MIN_POLL_INTERVAL
+
+        while True:
+            # (1) Fill the pipeline
+            while not is_exhausted and len(self.pending) < self.max_in_flight:
+                payload = next(payloads, None)
+                if payload is None:
+                    is_exhausted = True
+                    break
+                result = self.submit(payload)
+                if result is not None:
+                    yield result
+
+            if not self.pending:
+                break
+
+            # (2) Check the pending imports
+            time.sleep(poll_interval)
+            results = self.poll()
+            for result in results:
+                payload, issue_number, errors = result
+                if errors:
+                    msgt('Import failed: [#%s]\n%s' %
+                         (payload['redmine_issue_num'],
+                          json.dumps(errors, indent=4)))
+                else:
+                    msg('Import done: [#%s] -> github issue #%s' %
+                        (payload['redmine_issue_num'], issue_number))
+                yield result
+
+            if results:
+                poll_interval = self.MIN_POLL_INTERVAL
+            else:
+                poll_interval = min(poll_interval * 2,
+                                    self.MAX_POLL_INTERVAL)
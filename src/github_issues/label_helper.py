@@ -1,7 +1,6 @@
 import os
 import sys
 
-import requests
 import json
 
 if __name__ == '__main__':
@@ -14,6 +13,7 @@ try:
         GITHUB_TARGET_REPOSITORY
 
     from utils.msg_util import *
+    from utils import http_transport
     from github_issues.label_map import LabelMap
 except Exception as e:
     raise
@@ -21,12 +21,17 @@ except Exception as e:
 
 class LabelHelper:
 
-    def __init__(self, label_map_filename=None):
+    def __init__(self, label_map_filename=None, update_map_labels=True):
         """The add label to issue seems broken in pygithub3, just use this
-        for now"""
+        for now
+
+        :param update_map_labels: if False, don't create/update the mapped
+            labels on GitHub--e.g. when only compiling payloads offline
+        """
         self.auth = (GITHUB_LOGIN, GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN)
 
         self.label_map_filename = label_map_filename
+        self.update_map_labels = update_map_labels
         self.label_map = None
         self.using_label_map = False
         self.load_map()
@@ -42,7 +47,8 @@ class LabelHelper:
         self.label_map = LabelMap(self.label_map_filename)
         self.using_label_map = True
 
-        self.make_update_map_labels()
+        if self.update_map_labels:
+            self.make_update_map_labels()
 
     def make_update_map_labels(self):
         """
@@ -61,7 +67,7 @@ class LabelHelper:
             label_url = 'https://api.github.com/repos/%s/%s/labels/%s' % \
                         (GITHUB_TARGET_USERNAME, GITHUB_TARGET_REPOSITORY,
                          label_info.github_label_name)
-            req = requests.get(label_url, auth=self.auth)
+            req = http_transport.get(label_url, auth=self.auth)
             msg('url: %s' % label_url)
             msg('status: %s' % req.status_code)
 
@@ -85,8 +91,9 @@ class LabelHelper:
                      label_info.github_label_name)
                 data = dict(name=label_info.github_label_name,
                             color=label_info.github_label_color)
-                req = requests.patch(label_url, data=json.dumps(data),
-                                     auth=self.auth)
+                req = http_transport.patch(label_url,
+                                           data=json.dumps(data),
+                                           auth=self.auth)
                 if req.status_code == 200:
                     msg('  Color updated!')
                     msg(req.text)
@@ -99,8 +106,8 @@ class LabelHelper:
                         (GITHUB_TARGET_USERNAME, GITHUB_TARGET_REPOSITORY)
             data = dict(name=label_info.github_label_name,
                         color=label_info.github_label_color)
-            req = requests.post(label_url, data=json.dumps(data),
-                                auth=self.auth)
+            req = http_transport.post(label_url, data=json.dumps(data),
+                                      auth=self.auth)
             msg(req.text)
             msg(req.status_code)
             if req.status_code in [200, 201]:
@@ -115,7 +122,7 @@ class LabelHelper:
         label_url = 'https://api.github.com/repos/%s/%s/issues/%s/labels' % \
                     (GITHUB_TARGET_USERNAME, GITHUB_TARGET_REPOSITORY,
                      issue_id)
-        req = requests.delete(label_url, auth=self.auth)
+        req = http_transport.delete(label_url, auth=self.auth)
         msg('labels deleted!')
 
     def add_labels_to_issue(self, issue_id, labels=[]):
@@ -137,7 +144,8 @@ class LabelHelper:
         labels_for_call = json.dumps(labels)
         msg('labels: %s' % labels_for_call)
 
-        req = requests.post(label_url, auth=self.auth, data=labels_for_call)
+        req = http_transport.post(label_url, auth=self.auth,
+                                  data=labels_for_call)
         msg('result: %s' % req.text)
 
     def get_label_from_id_name(self, label_info_dict, key_name=None,
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+if __name__ == '__main__':
+    SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+except Exception as e:
+    raise
+
+
+class MigrationLedger:
+    """
+    SQLite record of the migration, one row per redmine issue:
+
+        redmine_issue, github_number, github_id, phase, payload_sha,
+        created_at, updated_at
+
+    The database is in WAL mode: each update is a small append to the
+    write-ahead log, and a crash never leaves a half-written record.
+
+    The { redmine issue # : github issue # } JSON map used by other
+    scripts (e.g. redmine_ticket/redmine_issue_updater.py) is written
+    with export_map_file
+    """
+    # Phases of an issue, in order
+    PHASE_SUBMITTED = 'submitted'
+    PHASE_CREATED = 'created'
+    PHASE_COMMENTED = 'commented'
+    PHASE_LABELLED = 'labelled'
+    PHASE_CLOSED = 'closed'
+    # Migrated before the ledger existed: comments and close are done
+    PHASE_LEGACY = 'legacy'
+    PHASE_RELATED = 'related'
+    PHASES = [PHASE_SUBMITTED, PHASE_CREATED, PHASE_COMMENTED,
+              PHASE_LABELLED, PHASE_CLOSED, PHASE_LEGACY, PHASE_RELATED]
+
+    def __init__(self, ledger_fname):
+        """
+        :param ledger_fname: str, the SQLite database file.  Created if
+            it doesn't exist
+        """
+        self.ledger_fname = ledger_fname
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(ledger_fname, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS issue (
+                redmine_issue INTEGER PRIMARY KEY,
+                github_number INTEGER,
+                github_id TEXT,
+                phase TEXT NOT NULL,
+                payload_sha TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL)""")
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, redmine_issue_num, phase, github_number=None,
+               github_id=None, payload_sha=None):
+        """
+        Record the phase reached by an issue.  The phase only moves
+        forward: an earlier phase than the recorded one is ignored.  A
+        github_number, github_id or payload_sha of None keeps the recorded
+        value
+        """
+        with self.lock:
+            self.upsert(redmine_issue_num, phase, github_number, github_id,
+                        payload_sha)
+
+    def upsert(self, redmine_issue_num, phase, github_number, github_id,
+               payload_sha):
+        """
+        Write a row.  The caller holds self.lock
+        """
+        if phase not in self.PHASES:
+            raise ValueError('Unknown phase: %s' % phase)
+
+        # e.g. a late "commented" doesn't move a closed issue back
+        row = self.conn.execute(
+            'SELECT phase FROM issue WHERE redmine_issue = ?',
+            (int(redmine_issue_num),)).fetchone()
+        if row is not None and row['phase'] in self.PHASES and \
+                self.PHASES.index(row['phase']) > self.PHASES.index(phase):
+            phase = row['phase']
+
+        now = time.time()
+        if github_id is not None:
+            github_id = '%s' % github_id
+        self.conn.execute("""
+            INSERT INTO issue (redmine_issue, github_number, github_id,
+                               phase, payload_sha, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (redmine_issue) DO UPDATE SET
+                github_number = COALESCE(excluded.github_number,
+                                         github_number),
+                github_id = COALESCE(excluded.github_id, github_id),
+                phase = excluded.phase,
+                payload_sha = COALESCE(excluded.payload_sha, payload_sha),
+                updated_at = excluded.updated_at""",
+                          (int(redmine_issue_num), github_number, github_id,
+                           phase, payload_sha, now, now))
+
+    def get_entry(self, redmine_issue_num):
+        """
+        :returns: dict with the row of a redmine issue, or None
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT * FROM issue WHERE redmine_issue = ?',
+                (int(redmine_issue_num),)).fetchone()
+        if row is None:
+            return None
+        return dict(row)
+
+    def get_entries(self, phase=None):
+        """
+        :returns: list of dicts with the rows, optionally of one phase,
+            sorted by redmine issue #
+        """
+        query = 'SELECT * FROM issue'
+        params = ()
+        if phase is not None:
+            query += ' WHERE phase = ?'
+            params = (phase,)
+        with self.lock:
+            rows = self.conn.execute(query + ' ORDER BY redmine_issue',
+                                     params).fetchall()
+        return [dict(x) for x in rows]
+
+    def get_issue_map(self):
+        """
+        :returns: dict of { redmine issue # (str) : github issue # }, the
+            format of the JSON map file
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT redmine_issue, github_number FROM issue '
+                'WHERE github_number IS NOT NULL').fetchall()
+        return dict(('%s' % x['redmine_issue'], x['github_number'])
+                    for x in rows)
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT COUNT(*) FROM issue').fetchone()[0] == 0
+
+    def import_map_file(self, map_fname):
+        """
+        Add the issues of a { redmine issue # : github issue # } JSON map
+        file, e.g. from a migration run before the ledger existed.  They
+        are recorded in the PHASE_LEGACY phase
+        """
+        fh = open(map_fname, 'r')
+        issue_map = json.loads(fh.read())
+        fh.close()
+
+        with self.lock:
+            # one transaction for the whole map
+            self.conn.execute('BEGIN')
+            for redmine_issue_num, github_number in issue_map.items():
+                self.upsert(redmine_issue_num, self.PHASE_LEGACY,
+                            github_number, None, None)
+            self.conn.execute('COMMIT')
+        msg('Ledger: %s issue(s) added from %s' %
+            (len(issue_map), map_fname))
+
+    def export_map_file(self, map_fname):
+        """
+        Write the { redmine issue # : github issue # } JSON map file
+        """
+        tmp_fname = map_fname + '.tmp'
+        fh = open(tmp_fname, 'w')
+        fh.write(json.dumps(self.get_issue_map()))
+        fh.close()
+        os.replace(tmp_fname, map_fname)
+        msg('file updated: %s' % map_fname)
@@ -1,9 +1,12 @@
 import os
 import sys
 
-import time
-import re
 import json
+import time
+import queue
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 if __name__ == '__main__':
     SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -12,10 +15,17 @@ if __name__ == '__main__':
 try:
     from settings.base import get_github_auth, REDMINE_ISSUES_DIRECTORY,\
         USER_MAP_FILE, LABEL_MAP_FILE, MILESTONE_MAP_FILE,\
-        REDMINE_TO_GITHUB_MAP_FILE, USE_IMPORT_API
+        REDMINE_TO_GITHUB_MAP_FILE, USE_IMPORT_API, GITHUB_PAYLOAD_DIRECTORY,\
+        GITHUB_RELATED_STATE_FILE, GITHUB_RELATED_MAX_WORKERS, \
+        GITHUB_API_BACKEND, GITHUB_GRAPHQL_BATCH_SIZE, \
+        GITHUB_MIGRATION_LEDGER_FILE, GITHUB_IMPORT_DEADLINE, \
+        GITHUB_FINISH_MAX_WORKERS, GITHUB_PIPELINE_QUEUE_SIZE
 
     from github_issues.user_map_helper import UserMapHelper
     from github_issues.github_issue_maker import GithubIssueMaker
+    from github_issues.payload_compiler import PayloadCompiler
+    from github_issues.migration_ledger import MigrationLedger
+    from github_issues.corpus_index import CorpusIndex
     from utils.msg_util import *
 except Exception as e:
     raise
@@ -29,8 +39,12 @@ class MigrationManager:
 
         self.redmine_json_directory = redmine_json_directory
 
-        # Keep track of redmine issue #'s and related github issue #'s
+        # Keep track of redmine issue #'s and related github issue #'s.
+        # The ledger is the record; the map file is exported from it
         self.redmine2github_map_file = redmine2github_map_file
+        self.ledger_file = kwargs.get('ledger_file',
+                                      GITHUB_MIGRATION_LEDGER_FILE)
+        self.ledger = None
 
         self.include_comments = kwargs.get('include_comments', True)
         self.include_assignee = kwargs.get('include_assignee', True)
@@ -53,21 +67,67 @@ class MigrationManager:
         self.redmine_issue_end_number = \
             kwargs.get('redmine_issue_end_number', None)
 
+        # (optional) select the issues to load with a filter expression,
+        # e.g. "status=open tracker=Bug updated>2024-01-01".  See
+        # CorpusIndex.  The start and end issue numbers also apply
+        self.issue_filter = kwargs.get('issue_filter', None)
+        self.corpus_index_file = kwargs.get('corpus_index_file', None)
+        self.corpus_index = None
+        self.fnames_to_migrate = None
+
+        # (optional) directory for the compiled GitHub payloads.  If set,
+        # all payloads are compiled, in a process pool, before any issue
+        # is sent to GitHub
+        self.payload_directory = kwargs.get('payload_directory', None)
+
+        # Related tickets pass: number of issues updated concurrently and
+        # the append-only file recording each successful update
+        self.related_max_workers = kwargs.get('related_max_workers',
+                                              GITHUB_RELATED_MAX_WORKERS)
+        self.related_state_file = kwargs.get('related_state_file',
+                                             GITHUB_RELATED_STATE_FILE)
+
+        # REST API: threads adding the comments and closing the issues,
+        # and the number of issues held in each queue between the stages
+        self.finish_max_workers = kwargs.get('finish_max_workers',
+                                             GITHUB_FINISH_MAX_WORKERS)
+        self.pipeline_queue_size = kwargs.get('pipeline_queue_size',
+                                              GITHUB_PIPELINE_QUEUE_SIZE)
+
     def does_redmine_json_directory_exist(self):
         if not os.path.isdir(self.redmine_json_directory):
             return False
         return True
 
+    def get_corpus_index(self):
+        """
+        Load the index of the redmine JSON files and refresh it once
+        """
+        if self.corpus_index is None:
+            if not self.does_redmine_json_directory_exist():
+                msgx('ERROR: Directory does not exist: %s' %
+                     self.redmine_json_directory)
+
+            self.corpus_index = CorpusIndex(
+                self.redmine_json_directory, self.corpus_index_file,
+                closed_statuses=GithubIssueMaker.ISSUE_STATE_CLOSED)
+            self.corpus_index.refresh()
+        return self.corpus_index
+
     def get_redmine_json_fnames(self):
-        if not self.does_redmine_json_directory_exist():
-            msgx('ERROR: Directory does not exist: %s' %
-                 self.redmine_json_directory)
+        return self.get_corpus_index().get_fnames()
 
-        pat = '^\d{1,10}\.json$'
-        fnames = [x for x in os.listdir(self.redmine_json_directory) if
-                  re.match(pat, x)]
-        fnames.sort()
-        return fnames
+    def get_issue_filter(self):
+        """
+        :returns: the filter expression of the issues to migrate: the start
+            and end issue numbers and self.issue_filter
+        """
+        terms = ['id>=%s' % self.redmine_issue_start_number]
+        if self.redmine_issue_end_number:
+            terms.append('id<=%s' % self.redmine_issue_end_number)
+        if self.issue_filter:
+            terms.append(self.issue_filter)
+        return ' '.join(terms)
 
     def sanity_check(self):
         # Is there a redmine JSON file directory with JSON files?
@@ -88,6 +148,12 @@ class MigrationManager:
             msgx('ERROR: Directory not found for redmine2github_map_file [%s]'
                  % self.redmine2github_map_file)
 
+        try:
+            self.get_corpus_index().parse_filter(self.issue_filter)
+        except ValueError as e:
+            msgx('ERROR: Invalid issue filter [%s]: %s' %
+                 (self.issue_filter, e))
+
         if not type(self.redmine_issue_start_number) is int:
             msgx('ERROR: The start issue number is not an integer [%s]'
                  % self.redmine_issue_start_number)
@@ -117,64 +183,461 @@ class MigrationManager:
 
         return user_map_helper
 
-    def save_dict_to_file(self, d):
-        d_str = json.dumps(d)
-        fh = open(self.redmine2github_map_file, 'w')
-        fh.write(d_str)
-        fh.close()
+    def get_ledger(self):
+        """
+        Open the ledger.  A new ledger starts with the issues of an existing
+        map file, e.g. from a migration run before the ledger existed
+        """
+        if self.ledger is None:
+            self.ledger = MigrationLedger(self.ledger_file)
+            if self.ledger.is_empty() and \
+                    os.path.isfile(self.redmine2github_map_file):
+                self.ledger.import_map_file(self.redmine2github_map_file)
+        return self.ledger
+
+    def save_map_file(self):
+        """
+        Write the map file from the ledger, for the scripts that read it
+        """
+        self.get_ledger().export_map_file(self.redmine2github_map_file)
 
     def get_dict_from_map_file(self):
-        # new dict, file doesn't exist yet
-        if not os.path.isfile(self.redmine2github_map_file):
-            return {}   # {redmine issue # : github issue #}
+        """
+        :returns: dict of {redmine issue # : github issue #}
+        """
+        return self.get_ledger().get_issue_map()
+
+    def get_payload_sha(self, payload):
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def record_submitted(self, payload):
+        """
+        Record, before the call, that an issue is about to be created
+        """
+        self.get_ledger().record(payload['redmine_issue_num'],
+                                 MigrationLedger.PHASE_SUBMITTED,
+                                 payload_sha=self.get_payload_sha(payload))
+
+    def record_created(self, redmine_issue_num, github_issue_number):
+        """
+        Confirm, after the call, that an issue was created
+        """
+        self.get_ledger().record(redmine_issue_num,
+                                 MigrationLedger.PHASE_CREATED,
+                                 github_number=github_issue_number)
+
+    def reconcile_submitted(self, gm):
+        """
+        Settle the issues left in the 'submitted' phase by an interrupted
+        run: the call creating them may or may not have reached GitHub.
+        The github issues found with their redmine marker are recorded as
+        created.  The others are sent again.
+
+        :returns: list of redmine issue #'s not to send in this run.  An
+            import submitted less than GITHUB_IMPORT_DEADLINE seconds ago
+            may still be pending
+        """
+        ledger = self.get_ledger()
+        entries = ledger.get_entries(phase=MigrationLedger.PHASE_SUBMITTED)
+        if not entries:
+            return []
+
+        msgt('Reconcile %s issue(s) submitted by an interrupted run' %
+             len(entries))
+        # List the github issues updated since the first submission, with
+        # a margin for clock skew.  Imported issues keep the redmine
+        # created and updated dates, so with the import API all the issues
+        # are listed
+        since = None
+        if not (USE_IMPORT_API and GITHUB_API_BACKEND == 'rest'):
+            since = time.strftime(
+                '%Y-%m-%dT%H:%M:%SZ',
+                time.gmtime(min(x['updated_at'] for x in entries) - 300))
+        found = gm.find_migrated_issues(
+            [x['redmine_issue'] for x in entries], since=since)
+
+        import_pending_since = time.time() - GITHUB_IMPORT_DEADLINE
+        held_back = []
+        for entry in entries:
+            redmine_issue_num = entry['redmine_issue']
+            if redmine_issue_num in found:
+                self.record_created(redmine_issue_num,
+                                    found[redmine_issue_num])
+                msg('Found on github: %s -> github issue #%s' %
+                    (redmine_issue_num, found[redmine_issue_num]))
+            elif USE_IMPORT_API and GITHUB_API_BACKEND == 'rest' and \
+                    entry['updated_at'] > import_pending_since:
+                held_back.append(redmine_issue_num)
+                msg('Import may still be pending, left for the next run: '
+                    '%s' % redmine_issue_num)
+            else:
+                msg('Not on github, to send again: %s' % redmine_issue_num)
+        return held_back
+
+    def get_fnames_to_send(self, held_back, phases_to_send=None):
+        """
+        :param held_back: list of redmine issue #'s not to send
+        :param phases_to_send: optional, list of the ledger phases to send.
+            Default is the issues not on github yet
+        :returns: list of the redmine JSON file names to migrate
+        """
+        if phases_to_send is None:
+            phases_to_send = [None, MigrationLedger.PHASE_SUBMITTED]
 
-        fh = open(self.redmine2github_map_file, 'rU')
-        content = fh.read()
+        phases = dict((x['redmine_issue'], x['phase'])
+                      for x in self.get_ledger().get_entries())
+        json_fnames = []
+        for json_fname in self.get_fnames_to_migrate():
+            redmine_issue_num = int(json_fname.replace('.json', ''))
+            if redmine_issue_num in held_back:
+                continue
+            if phases.get(redmine_issue_num, None) in phases_to_send:
+                json_fnames.append(json_fname)
+
+        msgt('Issues to send: %s (done: %s)' %
+             (len(json_fnames), len(self.get_fnames_to_migrate()) -
+              len(json_fnames) - len(held_back)))
+        return json_fnames
+
+    def get_fnames_to_migrate(self):
+        """
+        :returns: list of the redmine JSON file names selected by
+            get_issue_filter.  Selected from the corpus index, without
+            reading the files
+        """
+        if self.fnames_to_migrate is None:
+            self.fnames_to_migrate = self.get_corpus_index().select(
+                self.get_issue_filter())
+            msg('Issues selected: %s of %s [%s]' %
+                (len(self.fnames_to_migrate),
+                 len(self.get_redmine_json_fnames()),
+                 self.get_issue_filter()))
+        return self.fnames_to_migrate
+
+    def compile_payloads(self):
+        """
+        Render the GitHub payloads of the issues to migrate, without
+        calling the GitHub API
+
+        :returns: PayloadCompiler with the compiled payloads
+        """
+        payload_compiler = PayloadCompiler(
+            self.redmine_json_directory, self.payload_directory,
+            user_mapping_filename=self.user_mapping_filename,
+            label_mapping_filename=self.label_mapping_filename,
+            milestone_mapping_filename=self.milestone_mapping_filename,
+            use_import_api=USE_IMPORT_API,
+            include_comments=self.include_comments,
+            include_assignee=self.include_assignee,
+            include_attachments=self.include_attachments)
+
+        compile_errors = payload_compiler.compile_payloads(
+            self.get_fnames_to_migrate())
+        if compile_errors:
+            msgx('ERROR: Fix the compile errors before migrating')
+
+        return payload_compiler
+
+    def load_related_state(self):
+        """
+        :returns: dict of { redmine issue # : update results }, the results
+            of the updates of an issue merged in order, e.g. the
+            "originals" of the first one with the status of the last one
+        """
+        related_state = {}
+        if not self.related_state_file or \
+                not os.path.isfile(self.related_state_file):
+            return related_state
+
+        fh = open(self.related_state_file, 'r')
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a line cut short by a crash
+                continue
+            related_state.setdefault(entry['redmine_issue'], {}).update(
+                entry)
         fh.close()
 
-        # let it blow up if incorrect
-        return json.loads(content)
+        return related_state
+
+    def is_issue_finished(self, ledger, redmine_issue_num, redmine_closed):
+        """
+        :returns: True if the comments of an issue are posted and, for a
+            closed redmine issue, the github issue is closed
+        """
+        entry = ledger.get_entry(redmine_issue_num)
+        if entry is None:
+            return False
+        if entry['phase'] in [MigrationLedger.PHASE_CLOSED,
+                              MigrationLedger.PHASE_LEGACY,
+                              MigrationLedger.PHASE_RELATED]:
+            return True
+        return entry['phase'] == MigrationLedger.PHASE_COMMENTED and \
+            not redmine_closed
 
     def migrate_related_tickets(self):
         """
         After github issues are already migrated, go back and udpate the
         descriptions to include "related tickets"
+
+        Issues are updated concurrently by up to self.related_max_workers
+        threads.  Issues unchanged since their last update are skipped and
+        unchanged descriptions are not sent
         """
         gm = GithubIssueMaker()
 
-        issue_cnt = 0
         redmine2github_issue_map = self.get_dict_from_map_file()
+        related_state = self.load_related_state()
+        ledger = self.get_ledger()
+
+        # Made before the threads start
+        gm.get_github_conn()
+        gm.get_comment_index()
+        gm.get_reference_rewriter(redmine2github_issue_map)
+
+        json_fnames = self.get_fnames_to_migrate()
+        issue_total = len(json_fnames)
+        msgt('Update related tickets for %s issue(s) using %s worker(s)' %
+             (issue_total, self.related_max_workers))
+
+        status_counts = dict(skipped=0, unchanged=0, updated=0,
+                             not_migrated=0, failed=0)
+        api_calls = 0
+        api_calls_saved = 0
+        with ThreadPoolExecutor(max_workers=self.related_max_workers) as \
+                executor:
+            futures = {}
+            for json_fname in json_fnames:
+                redmine_issue_num = int(json_fname.replace('.json', ''))
+                json_fname_fullpath = os.path.join(
+                    self.redmine_json_directory, json_fname)
+                future = executor.submit(
+                    gm.update_github_issue_with_related,
+                    json_fname_fullpath, redmine2github_issue_map,
+                    related_state.get(redmine_issue_num, None))
+                futures[future] = redmine_issue_num
+
+            for cnt, future in enumerate(as_completed(futures), 1):
+                redmine_issue_num = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    status_counts['failed'] += 1
+                    msg('(%s/%s) Failed: %s - %s' %
+                        (cnt, issue_total, redmine_issue_num, e))
+                    continue
+
+                if result is None:
+                    status_counts['not_migrated'] += 1
+                    continue
+
+                msg('(%s/%s) %s: %s' % (cnt, issue_total, redmine_issue_num,
+                                        result['status']))
+                status_counts[result['status']] += 1
+                api_calls += result['api_calls']
+                api_calls_saved += result['api_calls_saved']
+
+                # A failed update is saved too--keeping the text of the
+                # issue before its first update--but it is tried again
+                if result['status'] in ['updated', 'unchanged'] and \
+                        self.is_issue_finished(ledger, redmine_issue_num,
+                                               result['redmine_closed']):
+                    ledger.record(redmine_issue_num,
+                                  MigrationLedger.PHASE_RELATED)
+                if self.related_state_file and \
+                        not result['status'] == 'skipped':
+                    fh = open(self.related_state_file, 'a')
+                    fh.write(json.dumps(result) + '\n')
+                    fh.close()
+
+        msgt('Related tickets: %s updated, %s unchanged, %s skipped, %s not '
+             'migrated, %s failed\nAPI calls: %s made, %s saved' %
+             (status_counts['updated'], status_counts['unchanged'],
+              status_counts['skipped'], status_counts['not_migrated'],
+              status_counts['failed'], api_calls, api_calls_saved))
+
+    def load_payload(self, gm, payload_compiler, json_fname):
+        """
+        :returns: the payload of a redmine JSON file name, loaded from the
+            payload_compiler or, if None, compiled by gm
+        """
+        if payload_compiler is not None:
+            return payload_compiler.load_payload(json_fname)
 
-        for json_fname in self.get_redmine_json_fnames():
-            # Pull the issue number from the file name
-            redmine_issue_num = int(json_fname.replace('.json', ''))
+        return gm.compile_github_payload(
+            os.path.join(self.redmine_json_directory, json_fname),
+            include_assignee=self.include_assignee,
+            include_comments=self.include_comments,
+            include_attachments=self.include_attachments)
 
-            # Start processing at or after redmine_issue_START_number
-            if not redmine_issue_num >= self.redmine_issue_start_number:
-                msg('Skipping Redmine issue: %s (start at %s)' %
-                    (redmine_issue_num, self.redmine_issue_start_number))
-                continue        # skip Attempt to create issue
-                # his
-
-            # Don't process after the redmine_issue_END_number
-            if self.redmine_issue_end_number:
-                if redmine_issue_num > self.redmine_issue_end_number:
-                    print(redmine_issue_num, self.redmine_issue_end_number)
-                    break
+    def import_issues(self, gm, payload_compiler, json_fnames):
+        """
+        Create the issues with the issue import API, several imports at
+        once.  Payloads are loaded, or compiled, as the imports are
+        submitted
+        """
+        def get_recorded_payloads():
+            for cnt, json_fname in enumerate(json_fnames, 1):
+                msgt('(%s) Loading redmine issue from file [%s]' %
+                     (cnt, json_fname))
+                payload = self.load_payload(gm, payload_compiler, json_fname)
+                # the payload is submitted as soon as it is yielded
+                self.record_submitted(payload)
+                yield payload
+
+        failed_issue_nums = []
+        for redmine_issue_num, github_issue_number in \
+                gm.import_github_issues(get_recorded_payloads()):
+            if github_issue_number:
+                self.record_created(redmine_issue_num, github_issue_number)
+            else:
+                failed_issue_nums.append(redmine_issue_num)
+        self.save_map_file()
 
-            issue_cnt += 1
+        if failed_issue_nums:
+            msgt('%s issue(s) failed to import: %s' %
+                 (len(failed_issue_nums),
+                  ', '.join('%s' % x for x in sorted(failed_issue_nums))))
 
-            msgt('(%s) Loading redmine issue: [%s] from file [%s]' %
-                 (issue_cnt, redmine_issue_num, json_fname))
+    def finish_issue(self, gm, payload, github_issue_number, phase):
+        """
+        Add the comments of a created issue--those not added by an
+        interrupted run--then close it if needed.  An issue with missing
+        comments is left open, in the 'created' phase, for the next run
 
-            json_fname_fullpath = os.path.join(self.redmine_json_directory,
-                                               json_fname)
-            gm.update_github_issue_with_related(json_fname_fullpath,
-                                                redmine2github_issue_map)
+        :returns: True if the issue is finished
+        """
+        ledger = self.get_ledger()
+        redmine_issue_num = payload['redmine_issue_num']
+
+        if phase in [MigrationLedger.PHASE_SUBMITTED,
+                     MigrationLedger.PHASE_CREATED]:
+            comments = gm.get_unposted_comments(payload)
+            if not gm.add_comments(github_issue_number, comments,
+                                   redmine_issue_num):
+                msg('Comments missing on github issue #%s, left for the '
+                    'next run' % github_issue_number)
+                return False
+            ledger.record(redmine_issue_num, MigrationLedger.PHASE_COMMENTED)
+
+        if payload['closed']:
+            if not gm.close_github_issue(github_issue_number):
+                return False
+            ledger.record(redmine_issue_num, MigrationLedger.PHASE_CLOSED)
+        return True
+
+    def migrate_issues_staged(self, gm, payload_compiler, json_fnames):
+        """
+        Migrate the issues with the REST API in three stages, linked by
+        queues of up to self.pipeline_queue_size issues:
+
+        - producer: loads, or compiles, the payloads
+        - creator: creates the issues one at a time, in redmine issue
+          order, so the github issue numbers follow the redmine ones
+        - finishers: self.finish_max_workers threads add the comments and
+          close the issues already created
+
+        A full queue blocks the stage feeding it.  Labels, assignee and
+        milestone are sent with the creation.  The phase reached by each
+        issue is recorded in the ledger: issues created by an interrupted
+        run are only finished
+        """
+        ledger = self.get_ledger()
+        phases = dict((x['redmine_issue'], x)
+                      for x in ledger.get_entries())
+
+        payload_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        finish_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        producer_errors = []
+        failed_issue_nums = []
+
+        # Made before the threads start
+        gm.get_github_conn()
+        gm.get_comment_index()
+
+        def produce():
+            try:
+                for cnt, json_fname in enumerate(json_fnames, 1):
+                    msgt('(%s) Loading redmine issue from file [%s]' %
+                         (cnt, json_fname))
+                    payload_queue.put(
+                        self.load_payload(gm, payload_compiler, json_fname))
+            except (Exception, SystemExit) as e:
+                # msgx() raises SystemExit.  Stop: the following issues
+                # would get other github issue numbers
+                producer_errors.append('%s: %s' % (type(e).__name__, e))
+            finally:
+                payload_queue.put(None)
+
+        def finish():
+            while True:
+                item = finish_queue.get()
+                if item is None:
+                    return
+                payload, github_issue_number, phase = item
+                try:
+                    self.finish_issue(gm, payload, github_issue_number,
+                                      phase)
+                except Exception as e:
+                    msg('Failed to finish github issue #%s: %s' %
+                        (github_issue_number, e))
+                    failed_issue_nums.append(payload['redmine_issue_num'])
+
+        producer = threading.Thread(target=produce)
+        producer.daemon = True
+        producer.start()
+        finishers = [threading.Thread(target=finish)
+                     for x in range(self.finish_max_workers)]
+        for finisher in finishers:
+            finisher.start()
+
+        try:
+            while True:
+                payload = payload_queue.get()
+                if payload is None:
+                    break
+
+                redmine_issue_num = payload['redmine_issue_num']
+                entry = phases.get(redmine_issue_num, None)
+                if entry is None or \
+                        entry['phase'] == MigrationLedger.PHASE_SUBMITTED:
+                    self.record_submitted(payload)
+                    github_issue_number = gm.open_github_issue(payload)
+                    if not github_issue_number:
+                        failed_issue_nums.append(redmine_issue_num)
+                        continue
+                    self.record_created(redmine_issue_num,
+                                        github_issue_number)
+                    phase = MigrationLedger.PHASE_CREATED
+                else:
+                    github_issue_number = entry['github_number']
+                    phase = entry['phase']
+
+                finish_queue.put((payload, github_issue_number, phase))
+        finally:
+            for finisher in finishers:
+                finish_queue.put(None)
+            for finisher in finishers:
+                finisher.join()
+            self.save_map_file()
+
+        if producer_errors:
+            msgx('ERROR: Migration stopped.  %s' % producer_errors[0])
+        if failed_issue_nums:
+            msgt('%s issue(s) failed: %s' %
+                 (len(failed_issue_nums),
+                  ', '.join('%s' % x for x in sorted(failed_issue_nums))))
 
     def migrate_issues(self):
         self.sanity_check()
 
+        payload_compiler = None
+        if self.payload_directory:
+            payload_compiler = self.compile_payloads()
+
         # Load a map if a filename was passed to the constructor
         user_map_helper = self.get_user_map_helper()    # None is ok
         # Note: for self.label_mapping_filename, None is ok
@@ -184,46 +647,96 @@ class MigrationManager:
             milestone_mapping_filename=self.milestone_mapping_filename,
             use_import_api=USE_IMPORT_API)
 
+        # Resume: issues already on github are not sent again
+        held_back = self.reconcile_submitted(gm)
+
+        if GITHUB_API_BACKEND == 'rest' and not USE_IMPORT_API:
+            # issues created by an interrupted run are finished
+            json_fnames = self.get_fnames_to_send(
+                held_back, [None, MigrationLedger.PHASE_SUBMITTED,
+                            MigrationLedger.PHASE_CREATED,
+                            MigrationLedger.PHASE_COMMENTED])
+            self.migrate_issues_staged(gm, payload_compiler, json_fnames)
+            return
+
+        if USE_IMPORT_API and GITHUB_API_BACKEND == 'rest':
+            json_fnames = self.get_fnames_to_send(held_back)
+            self.import_issues(gm, payload_compiler, json_fnames)
+            return
+
+        # issues created by an interrupted run are finished
+        json_fnames = self.get_fnames_to_send(
+            held_back, [None, MigrationLedger.PHASE_SUBMITTED,
+                        MigrationLedger.PHASE_CREATED,
+                        MigrationLedger.PHASE_COMMENTED])
+        self.migrate_issues_in_batches(gm, payload_compiler, json_fnames)
+
+    def migrate_issues_in_batches(self, gm, payload_compiler, json_fnames):
+        """
+        Migrate the issues with the GraphQL API.  With compiled payloads,
+        the issues are created, commented and closed in batches of
+        GITHUB_GRAPHQL_BATCH_SIZE.
+
+        Each created issue is then finished as with the REST API: the
+        comments whose mutations failed are added again, so an issue is
+        only recorded past the 'created' phase once all its comments are
+        on github.  Issues created by an interrupted run are only finished
+        """
+        phases = dict((x['redmine_issue'], x)
+                      for x in self.get_ledger().get_entries())
+
         # Iterate through json files
         issue_cnt = 0
 
-        mapping_dict = self.get_dict_from_map_file()
-        for json_fname in self.get_redmine_json_fnames():
-            # Pull the issue number from the file name
-            redmine_issue_num = int(json_fname.replace('.json', ''))
-
-            # Start processing at or after redmine_issue_START_number
-            if not redmine_issue_num >= self.redmine_issue_start_number:
-                msg('Skipping Redmine issue: %s (start at %s)' %
-                    (redmine_issue_num, self.redmine_issue_start_number))
-                continue        # skip tAttempt to create issue
-                # his
-
-            # Don't process after the redmine_issue_END_number
-            if self.redmine_issue_end_number:
-                if redmine_issue_num > self.redmine_issue_end_number:
-                    print(redmine_issue_num, self.redmine_issue_end_number)
-                    break
-
-            issue_cnt += 1
-
-            msgt('(%s) Loading redmine issue: [%s] from file [%s]' %
-                 (issue_cnt, redmine_issue_num, json_fname))
-            json_fname_fullpath = os.path.join(self.redmine_json_directory,
-                                               json_fname)
-            gm_kwargs = {'include_assignee': self.include_assignee,
-                         'include_comments': self.include_comments,
-                         'include_attachments': self.include_attachments}
-            github_issue_number = gm.make_github_issue(json_fname_fullpath,
-                                                       **gm_kwargs)
-
-            if github_issue_number:
-                mapping_dict.update({redmine_issue_num: github_issue_number})
-                self.save_dict_to_file(mapping_dict)
-
-            msgt('sleep 2 seconds....')
-            time.sleep(2)
-
+        batch_size = 1
+        if payload_compiler is not None:
+            batch_size = GITHUB_GRAPHQL_BATCH_SIZE
+
+        for start in range(0, len(json_fnames), batch_size):
+            batch_fnames = json_fnames[start:start + batch_size]
+            for json_fname in batch_fnames:
+                issue_cnt += 1
+                msgt('(%s) Loading redmine issue: [%s] from file [%s]' %
+                     (issue_cnt, int(json_fname.replace('.json', '')),
+                      json_fname))
+
+            payloads = [self.load_payload(gm, payload_compiler, x)
+                        for x in batch_fnames]
+
+            # (payload, github issue #, phase) of the issues to finish
+            to_finish = []
+            to_create = []
+            for payload in payloads:
+                entry = phases.get(payload['redmine_issue_num'], None)
+                if entry is None or \
+                        entry['phase'] == MigrationLedger.PHASE_SUBMITTED:
+                    to_create.append(payload)
+                else:
+                    to_finish.append((payload, entry['github_number'],
+                                      entry['phase']))
+
+            for payload in to_create:
+                self.record_submitted(payload)
+            github_issue_numbers = gm.make_github_issues_from_payloads(
+                to_create)
+
+            for payload, github_issue_number in zip(to_create,
+                                                    github_issue_numbers):
+                if github_issue_number:
+                    self.record_created(payload['redmine_issue_num'],
+                                        github_issue_number)
+                    to_finish.append((payload, github_issue_number,
+                                      MigrationLedger.PHASE_CREATED))
+
+            for payload, github_issue_number, phase in to_finish:
+                try:
+                    self.finish_issue(gm, payload, github_issue_number,
+                                      phase)
+                except Exception as e:
+                    msg('Failed to finish github issue #%s: %s' %
+                        (github_issue_number, e))
+
+        self.save_map_file()
 
 if __name__ == '__main__':
     json_input_directory = None
@@ -242,7 +755,8 @@ if __name__ == '__main__':
                   include_assignee=True,
                   include_attachments=True,
                   user_mapping_filename=USER_MAP_FILE,
-                  label_mapping_filename=LABEL_MAP_FILE)
+                  label_mapping_filename=LABEL_MAP_FILE,
+                  payload_directory=GITHUB_PAYLOAD_DIRECTORY)
 
     if iin is not None:
         kwargs['redmine_issue_start_number'] = iin
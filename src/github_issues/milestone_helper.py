@@ -1,9 +1,10 @@
 from __future__ import print_function
 
-# GITHUB_LOGIN, GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN,
-# GITHUB_TARGET_REPOSITORY, GITHUB_TARGET_USERNAME
-from settings.base import get_github_auth
+from settings.base import GITHUB_LOGIN, \
+    GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN, GITHUB_TARGET_USERNAME, \
+    GITHUB_TARGET_REPOSITORY
 from utils.msg_util import *
+from utils import http_transport
 from datetime import datetime
 
 from jinja2 import Template
@@ -14,8 +15,6 @@ import sys
 import json
 import csv
 
-import pygithub3
-
 if __name__ == '__main__':
     SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     sys.path.append(SRC_ROOT)
@@ -44,11 +43,16 @@ class MilestoneHelper:
     """
     Certain redmine attributes, such as "fixed_version", will be translated
     into milestones
+
+    Milestones are listed and created with the REST API, through the shared
+    HTTP transport.  They are listed once, then looked up by title
     """
+    MILESTONES_URL = 'https://api.github.com/repos/%s/%s/milestones' % \
+                     (GITHUB_TARGET_USERNAME, GITHUB_TARGET_REPOSITORY)
 
     def __init__(self, milestone_mapping_filename=None):
-        self.github_conn = None
-        self.milestone_service = None
+        self.auth = (GITHUB_LOGIN, GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN)
+        self.milestone_numbers = None     # { title : milestone number }
         self.milestone_mapping_filename = milestone_mapping_filename
 
         self.milestone_lookup = {}    # { redmine_name : LabelInfo }
@@ -56,8 +60,6 @@ class MilestoneHelper:
 
         self.load_milestone_lookup()
 
-        self.get_github_conn()
-
     def load_milestone_lookup(self):
         if self.milestone_mapping_filename is None:
             self.using_milestone_map = False
@@ -93,10 +95,24 @@ class MilestoneHelper:
             msg('[%s] -> [%s][%s]' % (redmine_name, milestone_info.name,
                                       milestone_info.due_date))
 
-    def get_github_conn(self):
-        if self.github_conn is None:
-            self.github_conn = pygithub3.Github(**get_github_auth())
-        return self.github_conn
+    def load_milestone_numbers(self):
+        """
+        Retrieve the numbers of all the milestones--open and closed--of the
+        repository, following the pages of the REST API
+        """
+        self.milestone_numbers = {}
+        list_url = self.MILESTONES_URL
+        params = {'state': 'all', 'per_page': 100}
+        while list_url:
+            req = http_transport.get(list_url, params=params, auth=self.auth)
+            if not req.status_code == 200:
+                msgx('Failed to list the milestones: %s\n%s' %
+                     (req.status_code, req.text))
+            for milestone in req.json():
+                self.milestone_numbers[milestone['title']] = \
+                    milestone['number']
+            list_url = req.links.get('next', {}).get('url', None)
+            params = None   # already part of the "next" url
 
     def get_create_milestone_number(self, title):
         """Given a milestone title, retrieve the milestone number.
@@ -110,9 +126,17 @@ class MilestoneHelper:
         if mnum:
             return mnum
 
-        mstone = self.get_milestones_service().create({'title': title})
+        req = http_transport.post(self.MILESTONES_URL,
+                                  data=json.dumps({'title': title}),
+                                  auth=self.auth)
+        if not req.status_code == 201:
+            msgt('Failed to create milestone: %s' % title)
+            msg('%s %s' % (req.status_code, req.text))
+            return None
 
-        return mstone.number
+        msg('Milestone created on GitHub: %s' % title)
+        self.milestone_numbers[title] = req.json()['number']
+        return self.milestone_numbers[title]
 
     def get_mile_stone_number(self, title):
         """Given a milestone title, retrieve the milestone number.
@@ -125,36 +149,9 @@ class MilestoneHelper:
         if not title:
             return None
 
-        kwargs = dict(state='all')
-        milestones = self.get_milestones_service().list(**kwargs)
-
-        # for page in milestones:
-        #     print('--page--')
-        #     for resource in page:
-        #         print('--resource--')
-        #         print (resource)
-        #         print (resource.number)
-        #         print (resource.title)
-        # return
-
-        # print(title)
-        # print(milestones)
-        for page in milestones:
-            for resource in page:
-                # print(resource)
-                if resource.title == title:
-                    return resource.number
-        return None
-
-    def get_milestones_service(self):
-        if self.milestone_service is None:
-            self.milestone_service = pygithub3.services.issues.Milestones(
-                **get_github_auth())
-            # labels_service = pygithub3.services.issues.Labels(**auth)
-            # #labels_service = pygithub3.services.issues.Labels(**auth)
-            # pygithub3.services.issues.Comments(**config)
-
-        return self.milestone_service
+        if self.milestone_numbers is None:
+            self.load_milestone_numbers()
+        return self.milestone_numbers.get(title, None)
 
     def get_create_milestone(self, redmine_issue_dict):
         # Add milestones!
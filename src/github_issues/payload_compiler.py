@@ -0,0 +1,277 @@
+import os
+import sys
+import re
+import json
+import hashlib
+import multiprocessing
+
+if __name__ == '__main__':
+    SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from settings.base import USE_IMPORT_API, GITHUB_JOURNAL_COALESCE, \
+        GITHUB_DROP_NOOP_DETAILS, GITHUB_DETAIL_INLINE_MAX_CHARS, \
+        GITHUB_DETAIL_DIFF_MAX_CHARS, REDMINE_SERVER, REDMINE_CATEGORY_MAP, \
+        REDMINE_STATUS_MAP, REDMINE_USER_MAP, REDMINE_VERSION_MAP, \
+        REDMINE_PRIORITY_MAP, REDMINE_CF_MAP, REDMINE_TRACKER_MAP
+    from github_issues.user_map_helper import UserMapHelper
+    from github_issues.github_issue_maker import GithubIssueMaker
+    from utils.msg_util import *
+except Exception as e:
+    raise
+
+# GithubIssueMaker of each worker process, made by init_worker
+_worker_gim = None
+_worker_gim_kwargs = None
+
+
+def init_worker(gim_settings, gim_kwargs):
+    """
+    Build one GithubIssueMaker per worker process.  No calls are made to
+    GitHub: labels are only mapped, not created/updated
+    """
+    global _worker_gim, _worker_gim_kwargs
+
+    user_map_helper = None
+    if gim_settings['user_mapping_filename']:
+        user_map_helper = UserMapHelper(gim_settings['user_mapping_filename'])
+
+    _worker_gim = GithubIssueMaker(
+        user_map_helper=user_map_helper,
+        label_mapping_filename=gim_settings['label_mapping_filename'],
+        milestone_mapping_filename=gim_settings['milestone_mapping_filename'],
+        use_import_api=gim_settings['use_import_api'],
+        update_map_labels=False)
+    _worker_gim_kwargs = gim_kwargs
+
+
+def compile_payload_file(fnames):
+    """
+    Compile one redmine JSON file into a GitHub payload file
+
+    :param fnames: tuple of (redmine JSON file, payload file)
+    :returns: tuple of (redmine JSON file, error message or None)
+    """
+    redmine_json_fname, payload_fname = fnames
+    try:
+        payload = _worker_gim.compile_github_payload(redmine_json_fname,
+                                                     **_worker_gim_kwargs)
+        tmp_fname = payload_fname + '.tmp'
+        fh = open(tmp_fname, 'w')
+        fh.write(json.dumps(payload))
+        fh.close()
+        os.replace(tmp_fname, payload_fname)
+    except (Exception, SystemExit) as e:
+        # msgx() raises SystemExit, which would kill the worker process
+        return redmine_json_fname, '%s: %s' % (type(e).__name__, e)
+
+    return redmine_json_fname, None
+
+
+class PayloadCompiler:
+    """
+    Render the GitHub payloads--issue title/body, assignee, state, labels
+    and comments--of a directory of redmine JSON files, across all CPU
+    cores, without calling the GitHub API.
+
+    Each payload is written to (payload_directory)/(redmine JSON file name)
+    and sent later by GithubIssueMaker.make_github_issue_from_payload
+    """
+    # { redmine JSON file name : error message }, written after each run
+    COMPILE_ERRORS_FNAME = 'compile_errors.json'
+
+    # Payloads written with another PAYLOAD_VERSION, or other compile
+    # settings or map files, are compiled again
+    PAYLOAD_VERSION = 2
+    PAYLOAD_VERSION_FNAME = 'payload_version.json'
+
+    # The jinja templates of the issue bodies and comments
+    TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(
+        __file__)), 'templates')
+
+    def __init__(self, redmine_json_directory, payload_directory, **kwargs):
+        """
+        Constructor
+
+        :param redmine_json_directory: str, directory with the redmine
+            issues in JSON format
+        :param payload_directory: str, directory for the payloads.  Directory
+            will be created
+        :param processes: optional, int number of worker processes.
+            Default is the number of CPUs
+        :param user_mapping_filename: optional, see MigrationManager
+        :param label_mapping_filename: optional, see MigrationManager
+        :param milestone_mapping_filename: optional, see MigrationManager
+        :param include_comments: optional, default True
+        :param include_assignee: optional, default True
+        :param include_attachments: optional, default True
+        """
+        self.redmine_json_directory = redmine_json_directory
+        self.payload_directory = payload_directory
+        self.processes = kwargs.get('processes', None) or \
+            multiprocessing.cpu_count()
+
+        self.gim_settings = dict(
+            user_mapping_filename=kwargs.get('user_mapping_filename', None),
+            label_mapping_filename=kwargs.get('label_mapping_filename', None),
+            milestone_mapping_filename=kwargs.get(
+                'milestone_mapping_filename', None),
+            use_import_api=kwargs.get('use_import_api', USE_IMPORT_API))
+
+        self.gim_kwargs = {
+            'include_comments': kwargs.get('include_comments', True),
+            'include_assignee': kwargs.get('include_assignee', True),
+            'include_attachments': kwargs.get('include_attachments', True)}
+
+        if not os.path.isdir(self.payload_directory):
+            os.makedirs(self.payload_directory)
+            msgt('Directory created: %s' % self.payload_directory)
+
+        self.version_fname = os.path.join(self.payload_directory,
+                                          self.PAYLOAD_VERSION_FNAME)
+        self.settings_sha = self.get_settings_sha()
+        if not self.get_payload_version() == \
+                {'version': self.PAYLOAD_VERSION,
+                 'settings_sha': self.settings_sha}:
+            self.clear_payloads()
+
+    def get_settings_sha(self):
+        """
+        :returns: sha256 of everything a payload depends on besides its
+            redmine JSON file: the compile settings and the contents of
+            the map files and templates
+        """
+        compile_settings = dict(self.gim_settings)
+        compile_settings.update(self.gim_kwargs)
+        compile_settings.update(
+            journal_coalesce=GITHUB_JOURNAL_COALESCE,
+            drop_noop_details=GITHUB_DROP_NOOP_DETAILS,
+            detail_inline_max_chars=GITHUB_DETAIL_INLINE_MAX_CHARS,
+            detail_diff_max_chars=GITHUB_DETAIL_DIFF_MAX_CHARS,
+            redmine_server=REDMINE_SERVER)
+
+        sha = hashlib.sha256(json.dumps(compile_settings,
+                                        sort_keys=True).encode('utf-8'))
+        fnames = [self.gim_settings['user_mapping_filename'],
+                  self.gim_settings['label_mapping_filename'],
+                  self.gim_settings['milestone_mapping_filename'],
+                  REDMINE_CATEGORY_MAP, REDMINE_STATUS_MAP, REDMINE_USER_MAP,
+                  REDMINE_VERSION_MAP, REDMINE_PRIORITY_MAP, REDMINE_CF_MAP,
+                  REDMINE_TRACKER_MAP]
+        fnames += [os.path.join(self.TEMPLATE_DIRECTORY, x) for x in
+                   sorted(os.listdir(self.TEMPLATE_DIRECTORY))]
+        for fname in fnames:
+            if fname and os.path.isfile(fname):
+                fh = open(fname, 'rb')
+                sha.update(fh.read())
+                fh.close()
+            sha.update(b'\0')
+        return sha.hexdigest()
+
+    def get_payload_version(self):
+        """
+        :returns: dict with the PAYLOAD_VERSION and settings sha of the
+            payloads in the payload_directory, or None
+        """
+        if not os.path.isfile(self.version_fname):
+            return None
+
+        fh = open(self.version_fname, 'r')
+        version = json.loads(fh.read())
+        fh.close()
+        return version
+
+    def clear_payloads(self):
+        """
+        Remove the payloads written with another PAYLOAD_VERSION or other
+        compile settings
+        """
+        pat = r'^\d{1,10}\.json$'
+        fnames = [x for x in os.listdir(self.payload_directory) if
+                  re.match(pat, x)]
+        for fname in fnames:
+            os.remove(self.get_payload_fname(fname))
+        msgt('Payload version or compile settings changed, %s payload(s) '
+             'removed' % len(fnames))
+
+        fh = open(self.version_fname, 'w')
+        fh.write(json.dumps({'version': self.PAYLOAD_VERSION,
+                             'settings_sha': self.settings_sha}))
+        fh.close()
+
+    def get_payload_fname(self, json_fname):
+        return os.path.join(self.payload_directory, json_fname)
+
+    def is_payload_current(self, json_fname):
+        """
+        A payload is current if it is newer than its redmine JSON file.
+        Payloads compiled with other settings are removed by the
+        constructor
+        """
+        payload_fname = self.get_payload_fname(json_fname)
+        if not os.path.isfile(payload_fname):
+            return False
+
+        redmine_json_fname = os.path.join(self.redmine_json_directory,
+                                          json_fname)
+        return os.path.getmtime(payload_fname) >= \
+            os.path.getmtime(redmine_json_fname)
+
+    def load_payload(self, json_fname):
+        """
+        :returns: the payload dict for a redmine JSON file name
+        """
+        fh = open(self.get_payload_fname(json_fname), 'r')
+        payload = json.loads(fh.read())
+        fh.close()
+        return payload
+
+    def compile_payloads(self, json_fnames):
+        """
+        Compile the payloads that are missing or older than their redmine
+        JSON file, then write the COMPILE_ERRORS_FNAME
+
+        :param json_fnames: list of redmine JSON file names, e.g.
+            ['04160.json', ...]
+        :returns: dict of { redmine JSON file name : error message }
+        """
+        to_compile = [x for x in json_fnames if
+                      not self.is_payload_current(x)]
+        compile_total = len(to_compile)
+        msgt('Payloads to compile: %s (up to date: %s)' %
+             (compile_total, len(json_fnames) - compile_total))
+
+        compile_errors = {}
+        if compile_total > 0:
+            work = [(os.path.join(self.redmine_json_directory, x),
+                     self.get_payload_fname(x)) for x in to_compile]
+            pool = multiprocessing.Pool(
+                min(self.processes, compile_total), init_worker,
+                (self.gim_settings, self.gim_kwargs))
+            try:
+                results = pool.imap_unordered(compile_payload_file, work,
+                                              chunksize=8)
+                for cnt, (redmine_json_fname, err) in enumerate(results, 1):
+                    json_fname = os.path.basename(redmine_json_fname)
+                    if err is None:
+                        msg('(%s/%s) compiled: %s' %
+                            (cnt, compile_total, json_fname))
+                    else:
+                        msg('(%s/%s) FAILED: %s - %s' %
+                            (cnt, compile_total, json_fname, err))
+                        compile_errors[json_fname] = err
+            finally:
+                pool.close()
+                pool.join()
+
+        errors_fname = os.path.join(self.payload_directory,
+                                    self.COMPILE_ERRORS_FNAME)
+        fh = open(errors_fname, 'w')
+        fh.write(json.dumps(compile_errors, indent=4, sort_keys=True))
+        fh.close()
+
+        if compile_errors:
+            msgt('%s payload(s) failed to compile.  See: %s' %
+                 (len(compile_errors), errors_fname))
+        return compile_errors
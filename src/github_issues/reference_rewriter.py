@@ -0,0 +1,97 @@
+import os
+import sys
+import re
+
+if __name__ == '__main__':
+    SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+except Exception as e:
+    raise
+
+
+class ReferenceRewriter:
+    """
+    Rewrite the Redmine references in a GitHub issue or comment body, in a
+    single scan of the text:
+
+        - issue references: "#123" -> "#(github issue #)"
+        - note references: "#123-4", "#123#note-4" -> html_url of the
+          GitHub comment made from journal 4 of issue 123
+        - commit references: "commit:abc1234", "commit:repo|abc1234" ->
+          "abc1234", which GitHub links to the commit
+
+    Each reference is matched as a whole, so "#12" is never rewritten
+    inside "#123" or "#12a"
+    """
+    REFERENCE_PATTERN = re.compile(r"""
+        commit:(?:[\w.-]+\|)?(?P<commit>[0-9a-fA-F]{7,40})\b
+        |
+        (?<![\w&])\#(?P<issue>[0-9]+)
+            (?:-(?P<note>[0-9]+)|\#note-(?P<note_anchor>[0-9]+))?
+            (?!\w)
+        """, re.VERBOSE)
+
+    def __init__(self, redmine2github_issue_map, comment_url_lookup=None):
+        """
+        :param redmine2github_issue_map: dict of
+            { redmine issue # (str) : github issue # }
+        :param comment_url_lookup: optional, function of
+            (redmine issue #, github issue #, journal #) returning the
+            html_url of a comment or None.  If not given, note references
+            are rewritten as issue references
+        """
+        self.redmine2github_issue_map = redmine2github_issue_map
+        self.comment_url_lookup = comment_url_lookup
+
+    def rewrite_reference(self, match):
+        if match.group('commit'):
+            return match.group('commit')
+
+        redmine_issue_num = match.group('issue')
+        github_issue_num = self.redmine2github_issue_map.get(
+            redmine_issue_num, None)
+        if github_issue_num is None:
+            return match.group(0)
+
+        journal_num = match.group('note') or match.group('note_anchor')
+        if journal_num and self.comment_url_lookup is not None:
+            comment_url = self.comment_url_lookup(redmine_issue_num,
+                                                  github_issue_num,
+                                                  journal_num)
+            if comment_url is not None:
+                return comment_url
+
+        # Keep any note suffix, e.g. "#123-4" -> "#456-4"
+        return '#%s%s' % (github_issue_num,
+                          match.group(0)[len(redmine_issue_num) + 1:])
+
+    def rewrite(self, text):
+        """
+        :returns: tuple of (rewritten text, True if the text changed)
+        """
+        if not text:
+            return text, False
+
+        result = self.REFERENCE_PATTERN.sub(self.rewrite_reference, text)
+        return result, not result == text
+
+    def rewrite_bodies(self, bodies):
+        """
+        Batch version of rewrite, e.g. for every body of the corpus
+
+        :param bodies: dict of { key : issue or comment body }
+        :returns: dict of { key : rewritten body } for the bodies that
+            changed
+        """
+        rewritten = {}
+        for key, text in bodies.items():
+            result, did_change = self.rewrite(text)
+            if did_change:
+                rewritten[key] = result
+
+        msg('References rewritten in %s of %s bodies' %
+            (len(rewritten), len(bodies)))
+        return rewritten
@@ -0,0 +1,273 @@
+from __future__ import print_function
+
+from os.path import dirname, join, abspath
+
+import sys
+import time
+import asyncio
+
+# https://docs.aiohttp.org/
+import aiohttp
+
+try:
+    from urlparse import urljoin
+except Exception as e:
+    from urllib.parse import urljoin        # python 3.x
+
+if __name__ == '__main__':
+    SRC_ROOT = dirname(dirname(abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+    from redmine_ticket.redmine_issue_downloader import RedmineIssueDownloader
+except Exception as e:
+    raise
+
+
+class RequestRateLimiter:
+    """
+    Keep no more than "max_in_flight" requests open, and space out their
+    start so that no more than "requests_per_second" are sent.  None means
+    no limit.  Used as "async with limiter:" around each request
+
+    Requests waiting for a slot are not started, so the time they wait is
+    not counted against their timeout
+    """
+
+    def __init__(self, requests_per_second=None, max_in_flight=None):
+        self.interval = None
+        if requests_per_second:
+            self.interval = 1.0 / requests_per_second
+        self.next_start = 0
+        self.lock = asyncio.Lock()
+
+        self.semaphore = None
+        if max_in_flight:
+            self.semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def __aenter__(self):
+        if self.semaphore is not None:
+            await self.semaphore.acquire()
+        await self.wait()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+    async def wait(self):
+        if self.interval is None:
+            return
+
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_start > now:
+                await asyncio.sleep(self.next_start - now)
+                now = self.next_start
+            self.next_start = now + self.interval
+
+
+class RedmineAsyncDownloader(RedmineIssueDownloader):
+    """
+    Drop-in replacement for RedmineIssueDownloader.download_tickets2.
+
+    Calls the redmine REST endpoints "/issues.json" and "/issues/{id}.json"
+    directly with asyncio, over a single keep-alive connection pool,
+    instead of going through python-redmine.  The files written are the
+    same: "(padded issue id).json" and "issue_list.json"
+    """
+    # Maximum number of requests in flight
+    DEFAULT_CONCURRENCY = 10
+
+    # Seconds allowed to connect, and between two reads of a response
+    DEFAULT_REQUEST_TIMEOUT = 60
+
+    def __init__(self, redmine_server, redmine_api_key,
+                 project_name_or_identifier, issues_base_directory, **kwargs):
+        """
+        Constructor.  Accepts the RedmineIssueDownloader arguments, plus:
+
+        :param concurrency: optional, int maximum number of requests in
+            flight.  Default is DEFAULT_CONCURRENCY
+        :param request_timeout: optional, seconds allowed to connect and
+            between two reads.  Default is DEFAULT_REQUEST_TIMEOUT
+        :param requests_per_second: optional, cap on the number of requests
+            started per second.  Default is None, no cap
+        """
+        self.concurrency = kwargs.get('concurrency',
+                                      self.DEFAULT_CONCURRENCY)
+        self.request_timeout = kwargs.get('request_timeout',
+                                          self.DEFAULT_REQUEST_TIMEOUT)
+        self.requests_per_second = kwargs.get('requests_per_second', None)
+
+        RedmineIssueDownloader.__init__(self, redmine_server,
+                                        redmine_api_key,
+                                        project_name_or_identifier,
+                                        issues_base_directory, **kwargs)
+
+    def connect_to_redmine(self):
+        # No python-redmine connection.  A client session is opened for
+        # the duration of each download
+        msg('Using server [%s] project [%s]' %
+            (self.redmine_server, self.project_name_or_identifier))
+
+    def download_tickets2(self):
+        asyncio.run(self.download_tickets_async())
+
+    async def get_json(self, session, limiter, path, params):
+        """
+        GET a redmine REST endpoint and return the decoded JSON.
+        Let it blow up on any error status.
+        """
+        url = urljoin(self.redmine_server, path)
+        async with limiter:
+            async with session.get(url, params=params) as response:
+                if not response.status == 200:
+                    text = await response.text()
+                    msgt('Error!')
+                    msg(text)
+                    raise Exception('Request failed! Status code: %s\n'
+                                    'Url: %s' % (response.status,
+                                                 response.url))
+                return await response.json()
+
+    async def get_issue_page(self, session, limiter, offset, issue_ids=None):
+        params = self.get_issue_filter_params()
+        params.update(dict(sort='id', offset=offset,
+                           limit=self.RECORD_RETRIEVAL_SIZE))
+        if issue_ids:
+            params['issue_id'] = issue_ids
+        if self.use_list_includes:
+            params['include'] = self.LIST_INCLUDES
+
+        data = await self.get_json(session, limiter, 'issues.json', params)
+        msg('Retrieved records via idx: %s - %s' %
+            (offset, offset + len(data['issues'])))
+        return data
+
+    async def get_issue(self, session, limiter, listed_issue):
+        """
+        Retrieve the full information for an issue from the issue list
+
+        :returns: tuple of (listed_issue, json string or bytes with issue
+            information)
+        """
+        if self.raw_json and not self.use_list_includes:
+            url = urljoin(self.redmine_server,
+                          'issues/%s.json' % listed_issue['id'])
+            async with limiter:
+                async with session.get(
+                        url, params=dict(include=self.ISSUE_INCLUDES)) as \
+                        response:
+                    if not response.status == 200:
+                        text = await response.text()
+                        msgt('Error!')
+                        msg(text)
+                        raise Exception('Request failed! Status code: %s\n'
+                                        'Url: %s' % (response.status,
+                                                     response.url))
+                    content = await response.read()
+            msg('Issue retrieved: %s' % listed_issue['id'])
+            return listed_issue, self.unwrap_raw_issue(content)
+
+        include = self.ISSUE_INCLUDES
+        if self.use_list_includes:
+            include = self.DETAIL_INCLUDES
+
+        data = await self.get_json(session, limiter,
+                                   'issues/%s.json' % listed_issue['id'],
+                                   dict(include=include))
+        issue = data['issue']
+        if self.use_list_includes:
+            full_issue = dict(listed_issue)
+            for include_name in self.DETAIL_INCLUDES.split(','):
+                if include_name in issue:
+                    full_issue[include_name] = issue[include_name]
+            issue = full_issue
+
+        msg('Issue retrieved: %s' % listed_issue['id'])
+        return listed_issue, self.format_issue_json(issue)
+
+    async def enumerate_issues_async(self, session, limiter):
+        """
+        For specific tickets, retrieve "issue_id" filtered chunks in
+        parallel.  Otherwise the first page gives the total count and the
+        remaining pages are retrieved in parallel.
+
+        :returns: list of issue dicts from the issue list, sorted by id
+        """
+        if self.specific_tickets_to_download is not None:
+            pages = await asyncio.gather(
+                *[self.get_issue_page(session, limiter, 0, x) for x in
+                  self.get_specific_issue_id_chunks()])
+            return self.select_listed_issues([x['issues'] for x in pages])
+
+        first_page = await self.get_issue_page(session, limiter, 0)
+        ticket_cnt = first_page['total_count']
+        msg('ticket_cnt: %d' % ticket_cnt)
+
+        pages = [first_page]
+        pages += await asyncio.gather(
+            *[self.get_issue_page(session, limiter, offset) for offset in
+              range(self.RECORD_RETRIEVAL_SIZE, ticket_cnt,
+                    self.RECORD_RETRIEVAL_SIZE)])
+
+        return self.select_listed_issues([x['issues'] for x in pages])
+
+    async def download_tickets_async(self):
+        msg('Gathering issue information.... (may take a minute)')
+
+        # At most self.concurrency requests are started at once: the
+        # others wait in the limiter, not for a pooled connection, so the
+        # timeouts only count the time spent on the network
+        limiter = RequestRateLimiter(self.requests_per_second,
+                                     self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=None,
+                                        sock_connect=self.request_timeout,
+                                        sock_read=self.request_timeout)
+        # Note: the API KEY may be sent in the "X-Redmine-API-Key" header
+        #   from: http://www.redmine.org/projects/redmine/wiki/Rest_api
+        headers = {'X-Redmine-API-Key': self.redmine_api_key}
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=headers) as session:
+            # (1) Enumerate the issues
+            listed_issues = await self.enumerate_issues_async(session,
+                                                              limiter)
+            msgt('Retrieve %s issue(s)' % len(listed_issues))
+
+            # (2) Retrieve and write the details of each issue
+            tasks = [self.get_issue(session, limiter, x)
+                     for x in self.skip_saved_issues(listed_issues)]
+            issue_total = len(tasks)
+            for cnt, task in enumerate(asyncio.as_completed(tasks), 1):
+                # let it blow up if the retrieval failed
+                listed_issue, json_str = await task
+                msg('(%s/%s) %s - %s' % (cnt, issue_total, listed_issue['id'],
+                                         listed_issue['subject']))
+                self.write_single_issue(listed_issue, json_str)
+
+        issue_dict = dict((self.pad_issue_id(x['id']), x['subject'])
+                          for x in listed_issues)
+        self.finish_download(issue_dict, listed_issues)
+
+
+if __name__ == '__main__':
+    from settings.base import REDMINE_SERVER, REDMINE_PROJECT_ID, \
+        REDMINE_API_KEY, REDMINE_ISSUES_DIRECTORY, REDMINE_ISSUES_STATUS, \
+        REDMINE_SYNC_STATE_FILE, REDMINE_ASYNC_CONCURRENCY, \
+        REDMINE_REQUEST_TIMEOUT, REDMINE_REQUESTS_PER_SECOND, \
+        REDMINE_DOWNLOAD_RAW_JSON
+
+    rn = RedmineAsyncDownloader(
+        REDMINE_SERVER, REDMINE_API_KEY, REDMINE_PROJECT_ID,
+        REDMINE_ISSUES_DIRECTORY, issue_status=REDMINE_ISSUES_STATUS,
+        sync_state_file=REDMINE_SYNC_STATE_FILE,
+        concurrency=REDMINE_ASYNC_CONCURRENCY,
+        request_timeout=REDMINE_REQUEST_TIMEOUT,
+        requests_per_second=REDMINE_REQUESTS_PER_SECOND,
+        raw_json=REDMINE_DOWNLOAD_RAW_JSON,
+        resume='--resume' in sys.argv)
+    rn.download_tickets2()
@@ -0,0 +1,265 @@
+from __future__ import print_function
+
+from os.path import dirname, join, abspath, isdir, isfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import os
+import re
+import sys
+import json
+import hashlib
+
+if __name__ == '__main__':
+    SRC_ROOT = dirname(dirname(abspath(__file__)))
+    sys.path.append(SRC_ROOT)
+
+try:
+    from utils.msg_util import *
+    from utils import http_transport
+except Exception as e:
+    raise
+
+
+class RedmineAttachmentDownloader:
+    """
+    Mirror the attachments listed in downloaded Redmine issues, so they
+    remain available after the Redmine server is retired.
+
+    Files are stored by content in (attachments_dirname)/sha256/(ab)/(hash)
+    so identical files are kept once.  The mapping
+    { attachment id : path relative to attachments_dirname } is written to
+    ATTACHMENT_MAP_FNAME for the rendering stage.
+    """
+    STORE_DIRNAME = 'sha256'
+    PARTIAL_DIRNAME = 'partial'
+
+    # Append-only record of the mirrored attachments.  One JSON line each:
+    #   {"id": 1234, "path": "sha256/ab/ab12...", "sha256": "ab12..."}
+    MANIFEST_FNAME = 'attachment_manifest.jsonl'
+
+    # { attachment id : path }, written at the end of each run
+    ATTACHMENT_MAP_FNAME = 'attachment_map.json'
+
+    DEFAULT_MAX_WORKERS = 4
+
+    # Bytes held in memory per download
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, redmine_api_key, issues_dirname, attachments_dirname,
+                 **kwargs):
+        """
+        Constructor
+
+        :param redmine_api_key: str with a redmine api key
+        :param issues_dirname: str, directory with the redmine issues in
+            JSON format.  e.g. (REDMINE_ISSUES_DIRECTORY)/2014-0702
+        :param attachments_dirname: str, directory to mirror the
+            attachments.  Directory will be created
+        :param max_workers: optional, int number of attachments downloaded
+            concurrently.  Default is DEFAULT_MAX_WORKERS
+        """
+        self.redmine_api_key = redmine_api_key
+        self.issues_dirname = issues_dirname
+        self.attachments_dirname = attachments_dirname
+        self.max_workers = kwargs.get('max_workers',
+                                      self.DEFAULT_MAX_WORKERS)
+
+        self.store_dirname = join(self.attachments_dirname,
+                                  self.STORE_DIRNAME)
+        self.partial_dirname = join(self.attachments_dirname,
+                                    self.PARTIAL_DIRNAME)
+        self.manifest_fname = join(self.attachments_dirname,
+                                   self.MANIFEST_FNAME)
+
+        self.setup()
+
+    def setup(self):
+        if not isdir(self.issues_dirname):
+            msgx('Directory doesn\'t exist: %s' % self.issues_dirname)
+
+        for dirname_to_make in [self.store_dirname, self.partial_dirname]:
+            if not isdir(dirname_to_make):
+                os.makedirs(dirname_to_make)
+                msgt('Directory created: %s' % dirname_to_make)
+
+    def get_attachments(self):
+        """
+        Read the "attachments" arrays of the issue JSON files
+
+        :returns: list of attachment dicts, sorted by id
+        """
+        pat = r'^\d{1,10}\.json$'
+        fnames = [x for x in os.listdir(self.issues_dirname) if
+                  re.match(pat, x)]
+
+        attachment_lookup = {}     # { attachment id : attachment dict }
+        for fname in fnames:
+            fh = open(join(self.issues_dirname, fname), 'r')
+            rd = json.loads(fh.read())
+            fh.close()
+
+            for attachment in rd.get('attachments', None) or []:
+                if attachment.get('content_url', None):
+                    attachment_lookup[attachment['id']] = attachment
+
+        return [attachment_lookup[x] for x in sorted(attachment_lookup)]
+
+    def load_manifest(self):
+        """
+        :returns: dict of { attachment id : path }
+        """
+        attachment_map = {}
+        if not isfile(self.manifest_fname):
+            return attachment_map
+
+        fh = open(self.manifest_fname, 'r')
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a line cut short by a crash
+                continue
+            attachment_map[entry['id']] = entry['path']
+        fh.close()
+
+        return attachment_map
+
+    def get_store_path(self, sha256):
+        """
+        :returns: path of a file in the content-addressed store, relative
+            to self.attachments_dirname
+        """
+        return join(self.STORE_DIRNAME, sha256[:2], sha256)
+
+    def download_attachment(self, attachment):
+        """
+        Stream an attachment to a partial file--resuming it with an HTTP
+        Range request if an earlier run was interrupted--then move it into
+        the content-addressed store.
+
+        :param attachment: attachment dict from a redmine issue
+        :returns: tuple of (path relative to attachments_dirname, sha256)
+        """
+        partial_fname = join(self.partial_dirname,
+                             '%s.part' % attachment['id'])
+
+        headers = {'X-Redmine-API-Key': self.redmine_api_key}
+        resume_from = 0
+        if isfile(partial_fname):
+            resume_from = os.path.getsize(partial_fname)
+            headers['Range'] = 'bytes=%d-' % resume_from
+
+        r = http_transport.get(attachment['content_url'], headers=headers,
+                               stream=True)
+        if r.status_code == 416:
+            # Range not satisfiable: the partial file is already complete
+            r.close()
+        elif r.status_code in [200, 206]:
+            mode = 'ab'
+            if r.status_code == 200:
+                mode = 'wb'     # server ignored the Range, start over
+            fh = open(partial_fname, mode)
+            for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
+                fh.write(chunk)
+            fh.close()
+        else:
+            raise Exception('Request for attachment failed! Status code: '
+                            '%s\nUrl: %s' % (r.status_code,
+                                             attachment['content_url']))
+
+        filesize = attachment.get('filesize', None)
+        if filesize is not None and \
+                not os.path.getsize(partial_fname) == filesize:
+            raise Exception('Attachment %s is incomplete: %s of %s bytes' %
+                            (attachment['id'],
+                             os.path.getsize(partial_fname), filesize))
+
+        sha = hashlib.sha256()
+        fh = open(partial_fname, 'rb')
+        for chunk in iter(lambda: fh.read(self.CHUNK_SIZE), b''):
+            sha.update(chunk)
+        fh.close()
+        sha256 = sha.hexdigest()
+
+        store_path = self.get_store_path(sha256)
+        store_fullpath = join(self.attachments_dirname, store_path)
+        if isfile(store_fullpath):
+            os.remove(partial_fname)    # identical file already stored
+        else:
+            # another worker may make the same directory
+            os.makedirs(dirname(store_fullpath), exist_ok=True)
+            os.replace(partial_fname, store_fullpath)
+
+        return store_path, sha256
+
+    def download_attachments(self):
+        """
+        Mirror every attachment not already in the manifest, using up to
+        self.max_workers concurrent downloads, then write the
+        ATTACHMENT_MAP_FNAME
+        """
+        attachment_map = self.load_manifest()
+        attachments = [x for x in self.get_attachments() if
+                       x['id'] not in attachment_map]
+        attachment_total = len(attachments)
+        msgt('Attachments to download: %s (already mirrored: %s)' %
+             (attachment_total, len(attachment_map)))
+
+        failed_cnt = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = dict((executor.submit(self.download_attachment, x), x)
+                           for x in attachments)
+            for cnt, future in enumerate(as_completed(futures), 1):
+                attachment = futures[future]
+                try:
+                    store_path, sha256 = future.result()
+                except Exception as e:
+                    # keep the partial file, the next run resumes it
+                    failed_cnt += 1
+                    msg('(%s/%s) Failed: %s - %s' %
+                        (cnt, attachment_total, attachment['id'], e))
+                    continue
+
+                msg('(%s/%s) %s - %s' % (cnt, attachment_total,
+                                         attachment['id'],
+                                         attachment.get('filename', '')))
+                attachment_map[attachment['id']] = store_path
+
+                fh = open(self.manifest_fname, 'a')
+                fh.write(json.dumps(dict(id=attachment['id'],
+                                         path=store_path,
+                                         sha256=sha256)) + '\n')
+                fh.close()
+
+        self.write_attachment_map(attachment_map)
+        if failed_cnt > 0:
+            msgt('%s attachment(s) failed.  Run again to resume them' %
+                 failed_cnt)
+
+    def write_attachment_map(self, attachment_map):
+        map_fname = join(self.attachments_dirname, self.ATTACHMENT_MAP_FNAME)
+        fh = open(map_fname, 'w')
+        fh.write(json.dumps(dict(('%s' % k, v) for k, v in
+                                 attachment_map.items()), indent=4))
+        fh.close()
+        msg('file updated: %s' % map_fname)
+
+
+if __name__ == '__main__':
+    from settings.base import REDMINE_API_KEY, REDMINE_ISSUES_DIRECTORY, \
+        REDMINE_ATTACHMENTS_DIRECTORY, REDMINE_DOWNLOAD_MAX_WORKERS
+
+    # The issue directory is the first argument.  Default is the most
+    # recent download, e.g. (REDMINE_ISSUES_DIRECTORY)/2014-0702
+    if len(sys.argv) > 1:
+        issues_dir = sys.argv[1]
+    else:
+        dirnames = sorted(x for x in os.listdir(REDMINE_ISSUES_DIRECTORY)
+                          if re.match(r'^\d{4}-\d{4}$', x))
+        if not dirnames:
+            msgx('Usage: redmine_attachment_downloader.py (issue directory)')
+        issues_dir = os.path.join(REDMINE_ISSUES_DIRECTORY, dirnames[-1])
+    rad = RedmineAttachmentDownloader(REDMINE_API_KEY, issues_dir,
+                                      REDMINE_ATTACHMENTS_DIRECTORY,
+                                      max_workers=REDMINE_DOWNLOAD_MAX_WORKERS)
+    rad.download_attachments()
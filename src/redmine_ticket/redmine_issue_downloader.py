@@ -2,13 +2,16 @@ from __future__ import print_function
 
 from os.path import dirname, join, abspath, isdir
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 # http://python-redmine.readthedocs.org/
 from redmine import Redmine
 
 import os
 import sys
+import re
 import json
-import requests
+import shutil
+import hashlib
 
 try:
     from urlparse import urljoin
@@ -21,6 +24,7 @@ if __name__ == '__main__':
 
 try:
     from utils.msg_util import *
+    from utils import http_transport
 except Exception as e:
     raise
 
@@ -44,6 +48,40 @@ class RedmineIssueDownloader:
     #
     ZERO_PADDING_LEVEL = 5
 
+    # Number of issue details retrieved concurrently.  Each worker holds
+    # one request open against the redmine server, so keep this modest.
+    DEFAULT_MAX_WORKERS = 4
+
+    # Page size of the issue list endpoint
+    RECORD_RETRIEVAL_SIZE = 100
+
+    # Includes requested when retrieving a single issue
+    ISSUE_INCLUDES = 'children,attachments,journals,watchers,relations'
+
+    # With "use_list_includes", the issue list endpoint is asked for the
+    # includes it supports and only the remaining ones are retrieved with
+    # a follow-up request per issue
+    LIST_INCLUDES = 'relations,attachments'
+    DETAIL_INCLUDES = 'children,journals,watchers'
+
+    # With "raw_json", the body of "/issues/{id}.json" is {"issue": {...}}.
+    # The issue itself is written to the file, without being decoded
+    RAW_ISSUE_PREFIX = b'{"issue":'
+
+    # Number of follow-up requests sent together with "use_list_includes"
+    DEFAULT_DETAIL_BATCH_SIZE = 25
+
+    # With a "sync_state_file", only issues updated since the last run are
+    # downloaded (to the usual date-stamped directory) and then added to
+    # this persistent directory under the issues_base_directory
+    CORPUS_DIRNAME = 'corpus'
+
+    # Append-only record of the issues written to the issue directory.
+    # One JSON line per issue:
+    #   {"id": 375, "subject": "...", "updated_on": "...", "size": 2048,
+    #    "sha256": "..."}
+    MANIFEST_FNAME = 'issue_manifest.jsonl'
+
     def __init__(self, redmine_server, redmine_api_key,
                  project_name_or_identifier, issues_base_directory, **kwargs):
         """
@@ -58,6 +96,28 @@ class RedmineIssueDownloader:
             issues in JSON format.  Directory will be crated
         :param specific_tickets_to_download: optional, list of specific
             ticket numbers to download. e.g. [2215, 2216, etc]
+            These are requested directly, instead of paging through the
+            whole project
+        :param issue_filters: optional, dict of extra filters for the issue
+            list, applied by the redmine server.  e.g.
+            {'tracker_id': 1, 'created_on': '><2014-01-01|2014-06-30'}
+        :param max_workers: optional, int number of issues retrieved
+            concurrently.  Default is DEFAULT_MAX_WORKERS
+        :param use_list_includes: optional, boolean.  If True, save the
+            issue records returned by the list endpoint (with
+            LIST_INCLUDES) and only retrieve DETAIL_INCLUDES per issue
+        :param detail_batch_size: optional, int number of follow-up requests
+            sent per batch when use_list_includes is True
+        :param sync_state_file: optional, str path of a JSON file holding
+            the "updated_on" high-water mark of the previous run.  If
+            specified, only issues updated since then are downloaded and
+            then added to the CORPUS_DIRNAME directory
+        :param raw_json: optional, boolean.  If True, the issue JSON sent by
+            the server is written as is (compact), without going through
+            python-redmine and re-serializing it with indentation
+        :param resume: optional, boolean.  If True, continue the most recent
+            download that has a MANIFEST_FNAME, skipping the issues it
+            already holds with the same "updated_on"
         """
         self.redmine_server = redmine_server
         self.redmine_api_key = redmine_api_key
@@ -68,66 +128,208 @@ class RedmineIssueDownloader:
 
         self.specific_tickets_to_download = \
             kwargs.get('specific_tickets_to_download', None)
+        self.issue_filters = kwargs.get('issue_filters', {})
+
+        self.max_workers = kwargs.get('max_workers',
+                                      self.DEFAULT_MAX_WORKERS)
+        if not type(self.max_workers) is int or self.max_workers < 1:
+            msgx('ERROR: max_workers must be a positive integer [%s]' %
+                 self.max_workers)
+
+        self.use_list_includes = kwargs.get('use_list_includes', False)
+        self.detail_batch_size = kwargs.get('detail_batch_size',
+                                            self.DEFAULT_DETAIL_BATCH_SIZE)
+
+        self.sync_state_file = kwargs.get('sync_state_file', None)
+        self.sync_state = {}    # see load_sync_state
+        self.corpus_dirname = join(self.issues_base_directory,
+                                   self.CORPUS_DIRNAME)
 
         self.redmine_conn = None
         self.redmine_project = None
 
-        self.issue_dirname = join(
-            self.issues_base_directory, datetime.today().strftime(
-                RedmineIssueDownloader.TIME_FORMAT_STRING))
+        self.raw_json = kwargs.get('raw_json', False)
+        self.resume = kwargs.get('resume', False)
+
+        self.issue_dirname = None
+        if self.resume:
+            self.issue_dirname = self.get_resumable_issue_dirname()
+        if self.issue_dirname is None:
+            self.issue_dirname = join(
+                self.issues_base_directory, datetime.today().strftime(
+                    RedmineIssueDownloader.TIME_FORMAT_STRING))
+        self.manifest_fname = join(self.issue_dirname, self.MANIFEST_FNAME)
 
         self.setup()
 
+    def get_resumable_issue_dirname(self):
+        """
+        :returns: the most recent date-stamped directory under
+            self.issues_base_directory with a MANIFEST_FNAME, or None
+        """
+        if not isdir(self.issues_base_directory):
+            return None
+
+        pat = r'^\d{4}-\d{4}$'     # TIME_FORMAT_STRING
+        dirnames = [x for x in os.listdir(self.issues_base_directory) if
+                    re.match(pat, x) and os.path.isfile(
+                        join(self.issues_base_directory, x,
+                             self.MANIFEST_FNAME))]
+        if len(dirnames) == 0:
+            return None
+
+        dirnames.sort()
+        msg('Resuming download in: %s' % dirnames[-1])
+        return join(self.issues_base_directory, dirnames[-1])
+
+    def load_manifest(self):
+        """
+        :returns: dict of { issue id : updated_on } for the issues in the
+            manifest.  For repeated ids, the last line wins
+        """
+        saved_issues = {}
+        if not os.path.isfile(self.manifest_fname):
+            return saved_issues
+
+        fh = open(self.manifest_fname, 'r')
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a line cut short by a crash
+                continue
+            saved_issues[entry['id']] = entry.get('updated_on', None)
+        fh.close()
+
+        return saved_issues
+
+    def skip_saved_issues(self, listed_issues):
+        """
+        With self.resume, drop the issues already in the manifest with the
+        same "updated_on"
+
+        :param listed_issues: list of issue dicts from the issue list
+        :returns: list of issue dicts still to be retrieved
+        """
+        if not self.resume:
+            return listed_issues
+
+        saved_issues = self.load_manifest()
+        remaining_issues = \
+            [x for x in listed_issues if x['id'] not in saved_issues or
+             not saved_issues[x['id']] == x.get('updated_on', None)]
+
+        msgt('Resume: %s issue(s) already saved, %s to retrieve' %
+             (len(listed_issues) - len(remaining_issues),
+              len(remaining_issues)))
+        return remaining_issues
+
     def setup(self):
         self.connect_to_redmine()
         if not isdir(self.issue_dirname):
             os.makedirs(self.issue_dirname)
             msgt('Directory created: %s' % self.issue_dirname)
 
+        if self.sync_state_file is not None:
+            self.load_sync_state()
+            if not isdir(self.corpus_dirname):
+                os.makedirs(self.corpus_dirname)
+                msgt('Directory created: %s' % self.corpus_dirname)
+
+    def load_sync_state(self):
+        """
+        The sync state file is a JSON dict:
+            {"high_water_mark": "2014-07-02T14:43:02Z",
+             "last_snapshot_directory": "(issues_base_directory)/2014-0702"}
+        """
+        if not os.path.isfile(self.sync_state_file):
+            self.sync_state = {}    # first run, download everything
+            return
+
+        fh = open(self.sync_state_file, 'r')
+        content = fh.read()
+        fh.close()
+
+        # let it blow up if incorrect
+        self.sync_state = json.loads(content)
+        msg('Sync state loaded: %s' % self.sync_state)
+
+    def save_sync_state(self):
+        fh = open(self.sync_state_file, 'w')
+        fh.write(json.dumps(self.sync_state, indent=4))
+        fh.close()
+        msg('Sync state updated: %s' % self.sync_state_file)
+
+    def get_issue_filter_params(self):
+        """
+        Query parameters shared by the issue count and the issue list
+        """
+        params = dict(project_id=self.project_name_or_identifier,
+                      status_id=self.issue_status)
+        params.update(self.issue_filters)
+
+        # The sync high-water mark replaces any "updated_on" filter
+        high_water_mark = self.sync_state.get('high_water_mark', None)
+        if high_water_mark:
+            params['updated_on'] = '>=%s' % high_water_mark
+
+        return params
+
     def connect_to_redmine(self):
-        self.redmine_conn = Redmine(self.redmine_server,
-                                    key=self.redmine_api_key)
+        self.redmine_conn = Redmine(
+            self.redmine_server, key=self.redmine_api_key,
+            requests={'timeout': http_transport.get_timeout()})
         self.redmine_project = \
             self.redmine_conn.project.get(self.project_name_or_identifier)
         msg('Connected to server [%s] project [%s]' %
             (self.redmine_server, self.project_name_or_identifier))
 
-    def get_issue_count(self):
-        msgt('get_issue_count')
-
-        issue_query_str = \
-            'issues.json?project_id=%s&limit=1&status_id=%s' % \
-            (self.project_name_or_identifier, self.issue_status)
-
-        url = urljoin(self.redmine_server, issue_query_str)
-        msg('Issue count url: %s' % url)
-
+    def get_api_auth(self):
         # Note: Auth purposely uses the API KEY "as a username with a random
         # password via HTTP Basic authentication"
         #   from: http://www.redmine.org/projects/redmine/wiki/Rest_api
         #
-        auth = (self.redmine_api_key, 'random-pw')
-        r = requests.get(url, auth=auth)
+        return (self.redmine_api_key, 'random-pw')
+
+    def get_issues_json(self, params):
+        """
+        Retrieve a page of the issue list via the regular api, not the
+        python redmine package
+
+        :param params: dict of query parameters for "issues.json"
+        :returns: dict with the decoded JSON
+        """
+        url = urljoin(self.redmine_server, 'issues.json')
+
+        r = http_transport.get(url, params=params, auth=self.get_api_auth())
         if not r.status_code == 200:
             msgt('Error!')
             msg(r.text)
-            raise Exception("Request for issue count failed! Status code: "
-                            "%s\nUrl: %s\nAuth:%s" % (r.status_code, url,
-                                                      auth))
+            raise Exception("Request for issues failed! Status code: "
+                            "%s\nUrl: %s\nParams: %s" % (r.status_code, url,
+                                                         params))
 
-        msg('Convert result to JSON')
         try:
             data = r.json()     # Let it blow up
         except Exception as e:
             msgt('Error!')
             msg('Data from request (as text): %s' % r.text)
-            raise Exception('Failed to convert issue count data to JSON.\n'
-                            'Url: %s\nAuth:%s" % (url, auth)')
+            raise Exception('Failed to convert issue data to JSON.\n'
+                            'Url: %s\nParams: %s' % (url, params))
 
         if 'total_count' not in data:
             msgx('Total count not found in data: \n[%s]' % data)
 
-        return data['total_count']
+        return data
+
+    def get_issue_count(self):
+        msgt('get_issue_count')
+
+        params = self.get_issue_filter_params()
+        params['limit'] = 1
+        msg('Issue count params: %s' % params)
+
+        return self.get_issues_json(params)['total_count']
 
     def write_issue_list(self, issue_fname, issue_dict):
         if issue_fname is None or not type(issue_dict) == dict:
@@ -142,59 +344,229 @@ class RedmineIssueDownloader:
     def show_project_info(self):
         msg(self.redmine_project._attributes)
 
+    def get_issue_page(self, offset, issue_ids=None):
+        """
+        Retrieve one page of the issue list
+
+        :param offset: int offset of the first record
+        :param issue_ids: optional, str of comma separated issue ids to
+            restrict the list to.  e.g. "2215,2216"
+        :returns: list of issue dicts
+        """
+        params = self.get_issue_filter_params()
+        params.update(dict(sort='id', offset=offset,
+                           limit=self.RECORD_RETRIEVAL_SIZE))
+        if issue_ids:
+            params['issue_id'] = issue_ids
+        if self.use_list_includes:
+            params['include'] = self.LIST_INCLUDES
+
+        listed_issues = self.get_issues_json(params)['issues']
+        msg('Retrieved records via idx: %s - %s' %
+            (offset, offset + len(listed_issues)))
+        return listed_issues
+
+    def enumerate_issues(self):
+        """
+        Retrieve every page of the issue list--in parallel, as the offsets
+        are known from the total count--before any issue details are
+        retrieved.
+
+        :returns: list of issue dicts from the issue list, sorted by id
+        """
+        if self.specific_tickets_to_download is not None:
+            return self.enumerate_specific_issues()
+
+        ticket_cnt = self.get_issue_count()
+        offsets = list(range(0, ticket_cnt, self.RECORD_RETRIEVAL_SIZE))
+        msg('ticket_cnt: %d' % ticket_cnt)
+        msg('num pages: %d' % len(offsets))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = list(executor.map(self.get_issue_page, offsets))
+
+        return self.select_listed_issues(pages)
+
+    def get_specific_issue_id_chunks(self):
+        """
+        Split self.specific_tickets_to_download into "issue_id" filter
+        values of at most RECORD_RETRIEVAL_SIZE ids.
+
+        :returns: list of str.  e.g. ["2215,2216,3362", ...]
+        """
+        issue_ids = sorted(set(self.specific_tickets_to_download))
+        return [','.join(['%s' % x for x in
+                          issue_ids[idx:idx + self.RECORD_RETRIEVAL_SIZE]])
+                for idx in range(0, len(issue_ids),
+                                 self.RECORD_RETRIEVAL_SIZE)]
+
+    def enumerate_specific_issues(self):
+        """
+        Retrieve only the issues in self.specific_tickets_to_download,
+        using "issue_id" filters on the issue list--in parallel chunks.
+
+        :returns: list of issue dicts from the issue list, sorted by id
+        """
+        id_chunks = self.get_specific_issue_id_chunks()
+        msg('specific tickets: %d' % len(self.specific_tickets_to_download))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = list(executor.map(lambda x: self.get_issue_page(0, x),
+                                      id_chunks))
+
+        return self.select_listed_issues(pages)
+
+    def select_listed_issues(self, pages):
+        """
+        Flatten pages of the issue list, dropping duplicates (an issue may
+        move between pages while they are retrieved) and, if specified,
+        issues not in self.specific_tickets_to_download
+
+        :param pages: list of lists of issue dicts
+        :returns: list of issue dicts, sorted by id
+        """
+        listed_issue_lookup = {}    # { issue id : issue dict }
+        for page in pages:
+            for listed_issue in page:
+                listed_issue_lookup[listed_issue['id']] = listed_issue
+
+        if self.specific_tickets_to_download is not None:
+            # only download specific tickets
+            #
+            specific_ids = set(self.specific_tickets_to_download)
+            listed_issue_lookup = dict(
+                (k, v) for k, v in listed_issue_lookup.items()
+                if k in specific_ids)
+
+        return [listed_issue_lookup[x]
+                for x in sorted(listed_issue_lookup.keys())]
+
     def download_tickets2(self):
         """
-        fyi: Retrieving total count via regular api, not python redmine
-        package
+        (1) Enumerate the issues via the regular api, not python redmine
+            package
+        (2) Retrieve and write the details of each issue
         """
-        issue_dict = {}
-        issue_fname = join(self.issue_dirname, 'issue_list.json')
         msg('Gathering issue information.... (may take a minute)')
 
-        ticket_cnt = self.get_issue_count()
+        listed_issues = self.enumerate_issues()
+        msgt('Retrieve %s issue(s)' % len(listed_issues))
+
+        self.save_issues(self.skip_saved_issues(listed_issues))
+
+        issue_dict = dict((self.pad_issue_id(x['id']), x['subject'])
+                          for x in listed_issues)
+        self.finish_download(issue_dict, listed_issues)
+
+    def finish_download(self, issue_dict, issues):
+        """
+        Write the "issue_list.json" and, in sync mode, add the issues to
+        the corpus and move the high-water mark
+
+        :param issue_dict: dict of { padded issue id : subject }
+        :param issues: list of the downloaded issue dicts
+        """
+        issue_fname = join(self.issue_dirname, 'issue_list.json')
+        self.write_issue_list(issue_fname, issue_dict)
+
+        if self.sync_state_file is None:
+            return
+
+        # Highest "updated_on" of the downloaded issues
+        high_water_mark = self.sync_state.get('high_water_mark', None)
+        for issue in issues:
+            updated_on = issue.get('updated_on', None)
+            if updated_on and (high_water_mark is None or
+                               updated_on > high_water_mark):
+                high_water_mark = updated_on
 
-        RECORD_RETRIEVAL_SIZE = 100
-
-        num_loops = ticket_cnt / RECORD_RETRIEVAL_SIZE
-        extra_recs = ticket_cnt % RECORD_RETRIEVAL_SIZE
-        if extra_recs > 0:
-            num_loops += 1
-        msg('num_loops: %d' % num_loops)
-        msg('extra_recs: %d' % extra_recs)
-
-        for loop_num in range(0, round(num_loops)):
-            start_record = loop_num * RECORD_RETRIEVAL_SIZE
-            end_record = (loop_num + 1) * RECORD_RETRIEVAL_SIZE
-
-            msgt('Retrieve records via idx (skip last): %s - %s' %
-                 (start_record, end_record))
-
-            # limit of 100 is returning 125
-            rec_cnt = 0
-            for item in self.redmine_conn.issue.filter(
-                    project_id=self.project_name_or_identifier,
-                    status_id=self.issue_status, sort='id',
-                    offset=start_record)[:RECORD_RETRIEVAL_SIZE]:
-                rec_cnt += 1
-                msg('(%s) %s - %s' % (rec_cnt, item.id, item.subject))
-
-                if self.specific_tickets_to_download is not None:
-                    # only download specific tickets
-                    #
-                    if item.id in self.specific_tickets_to_download:
-                        self.save_single_issue(item)
-                        issue_dict[self.pad_issue_id(item.id)] = item.subject
-                    continue    # go to next item
-                else:
-                    # Get all tickets
-                    #
-                    self.save_single_issue(item)
-                    issue_dict[self.pad_issue_id(item.id)] = item.subject
-                if rec_cnt == RECORD_RETRIEVAL_SIZE:
-                    break
-                # continue
-                # self.save_single_issue(item)
-            self.write_issue_list(issue_fname, issue_dict)
+        self.add_to_corpus(issue_dict)
+        self.sync_state['high_water_mark'] = high_water_mark
+        self.sync_state['last_snapshot_directory'] = self.issue_dirname
+        self.save_sync_state()
+
+    def add_to_corpus(self, issue_dict):
+        """
+        Copy the issues downloaded to self.issue_dirname into the
+        persistent corpus directory and merge their subjects into the
+        corpus "issue_list.json"
+
+        :param issue_dict: dict of { padded issue id : subject }
+        """
+        corpus_issue_fname = join(self.corpus_dirname, 'issue_list.json')
+        corpus_issue_dict = {}
+        if os.path.isfile(corpus_issue_fname):
+            fh = open(corpus_issue_fname, 'r')
+            corpus_issue_dict = json.loads(fh.read())
+            fh.close()
+
+        for padded_id in sorted(issue_dict.keys()):
+            shutil.copy2(join(self.issue_dirname, padded_id + '.json'),
+                         join(self.corpus_dirname, padded_id + '.json'))
+            corpus_issue_dict[padded_id] = issue_dict[padded_id]
+
+        self.write_issue_list(corpus_issue_fname, corpus_issue_dict)
+        msgt('%s issue(s) added to corpus: %s' %
+             (len(issue_dict), self.corpus_dirname))
+
+    def save_issues(self, listed_issues):
+        """
+        Retrieve and write a list of issues, using up to self.max_workers
+        concurrent requests.  Each file is written as soon as its issue has
+        been retrieved.
+
+        With use_list_includes, the requests are sent in batches of
+        self.detail_batch_size
+
+        :param listed_issues: list of issue dicts from the issue list
+        """
+        if not listed_issues:
+            return
+
+        issue_total = len(listed_issues)
+        if self.max_workers == 1:
+            for cnt, listed_issue in enumerate(listed_issues, 1):
+                msg('(%s/%s) %s - %s' % (cnt, issue_total, listed_issue['id'],
+                                         listed_issue['subject']))
+                self.save_single_issue(listed_issue)
+            return
+
+        batch_size = issue_total
+        if self.use_list_includes:
+            batch_size = self.detail_batch_size
+
+        cnt = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for idx in range(0, issue_total, batch_size):
+                batch = listed_issues[idx:idx + batch_size]
+                futures = dict((executor.submit(self.retrieve_issue, x), x)
+                               for x in batch)
+                for future in as_completed(futures):
+                    listed_issue = futures[future]
+                    cnt += 1
+                    msg('(%s/%s) %s - %s' % (cnt, issue_total,
+                                             listed_issue['id'],
+                                             listed_issue['subject']))
+                    # let it blow up if the retrieval failed
+                    self.write_single_issue(listed_issue, future.result())
+
+    def retrieve_issue(self, listed_issue):
+        """
+        Retrieve the full JSON for an issue from the issue list
+
+        :param listed_issue: issue dict from the issue list
+        :returns: json string (or bytes, with raw_json) with issue
+            information
+        """
+        if self.use_list_includes:
+            return self.get_listed_issue(listed_issue)
+
+        if self.raw_json:
+            return self.get_raw_single_issue(listed_issue['id'])
+
+        # FIX: Expensive adjustment -- to pull out full relation and
+        # journal info
+        return self.get_single_issue(listed_issue['id'])
 
     def pad_issue_id(self, issue_id):
         if issue_id is None:
@@ -204,23 +576,54 @@ class RedmineIssueDownloader:
 
     def save_single_issue(self, single_issue):
         """
-        Write a single issue object to a file using JSON format
+        Write a single issue to a file using JSON format
 
-        :param single_issue: Issue object
+        :param single_issue: Issue object or issue dict from the issue list
         """
         if single_issue is None:
             msgx('ERROR. download_single_issue. The "single_issue" is None')
 
-        # FIX: Expensive adjustment -- to pull out full relation and
-        # journal info
-        json_str = self.get_single_issue(single_issue.id)
+        if not type(single_issue) is dict:
+            single_issue = single_issue._attributes
+
+        json_str = self.retrieve_issue(single_issue)
         # another call to redmine
 
+        self.write_single_issue(single_issue, json_str)
+
+    def write_single_issue(self, listed_issue, json_str):
+        """
+        Write the JSON for a single issue to "(padded issue id).json" and
+        append it to the manifest.
+
+        The file is written to a temporary name and then renamed, so an
+        interrupted download never leaves a partial issue file.
+
+        :param listed_issue: issue dict from the issue list
+        :param json_str: json string or bytes with issue information
+        """
+        content = json_str
+        if not type(content) is bytes:
+            content = content.encode('utf-8')
+
         fullpath = join(self.issue_dirname,
-                        self.pad_issue_id(single_issue.id) + '.json')
-        open(fullpath, 'w').write(json_str)
+                        self.pad_issue_id(listed_issue['id']) + '.json')
+        tmp_fullpath = fullpath + '.tmp'
+        fh = open(tmp_fullpath, 'wb')
+        fh.write(content)
+        fh.close()
+        os.replace(tmp_fullpath, fullpath)
         msg('Ticket retrieved: %s' % fullpath)
 
+        manifest_entry = dict(id=listed_issue['id'],
+                              subject=listed_issue.get('subject', None),
+                              updated_on=listed_issue.get('updated_on', None),
+                              size=len(content),
+                              sha256=hashlib.sha256(content).hexdigest())
+        fh = open(self.manifest_fname, 'a')
+        fh.write(json.dumps(manifest_entry) + '\n')
+        fh.close()
+
     def process_files(self, issues_dirname=None):
         if issues_dirname is None:
             issues_dirname = self.issue_dirname
@@ -266,26 +669,99 @@ class RedmineIssueDownloader:
         :returns: json string with issue information
         """
         # test using .issue.get
-        issue = self.redmine_conn.issue.get(
-            issue_id, include='children,attachments,journals,watchers,'
-                              'relations')
+        issue = self.redmine_conn.issue.get(issue_id,
+                                            include=self.ISSUE_INCLUDES)
         json_str = json.dumps(issue._attributes, indent=4)
         msg('Issue retrieved: %s' % issue_id)
         return json_str
 
+    def get_listed_issue(self, listed_issue):
+        """
+        Complete an issue returned by the list endpoint (retrieved with
+        LIST_INCLUDES) with the DETAIL_INCLUDES it cannot return
+
+        :param listed_issue: issue dict from the issue list
+        :returns: json string with issue information
+        """
+        issue_attributes = dict(listed_issue)
+
+        detail_issue = self.redmine_conn.issue.get(
+            listed_issue['id'], include=self.DETAIL_INCLUDES)
+        for include_name in self.DETAIL_INCLUDES.split(','):
+            if include_name in detail_issue._attributes:
+                issue_attributes[include_name] = \
+                    detail_issue._attributes[include_name]
+
+        json_str = self.format_issue_json(issue_attributes)
+        msg('Issue retrieved: %s' % listed_issue['id'])
+        return json_str
+
+    def format_issue_json(self, issue_attributes):
+        if self.raw_json:
+            return json.dumps(issue_attributes, separators=(',', ':'))
+        return json.dumps(issue_attributes, indent=4)
+
+    def get_raw_single_issue(self, issue_id):
+        """
+        Download a single issue via the regular api, not python redmine
+        package, keeping the JSON as sent by the server
+
+        :param issue_id: int of issue id in redmine
+        :returns: bytes with the issue JSON
+        """
+        url = urljoin(self.redmine_server, 'issues/%s.json' % issue_id)
+        r = http_transport.get(url,
+                               params=dict(include=self.ISSUE_INCLUDES),
+                               auth=self.get_api_auth())
+        if not r.status_code == 200:
+            msgt('Error!')
+            msg(r.text)
+            raise Exception("Request for issue failed! Status code: "
+                            "%s\nUrl: %s" % (r.status_code, url))
+
+        msg('Issue retrieved: %s' % issue_id)
+        return self.unwrap_raw_issue(r.content)
+
+    def unwrap_raw_issue(self, content):
+        """
+        Strip the {"issue": ...} envelope from the body of
+        "/issues/{id}.json" in a single slice, falling back to decoding
+        the JSON if the body is formatted differently
+
+        :param content: bytes of the response body
+        :returns: bytes with the issue JSON
+        """
+        content = content.strip()
+        if content.startswith(self.RAW_ISSUE_PREFIX) and \
+                content.endswith(b'}'):
+            return content[len(self.RAW_ISSUE_PREFIX):-1]
+
+        issue_attributes = json.loads(content.decode('utf-8'))['issue']
+        return json.dumps(issue_attributes,
+                          separators=(',', ':')).encode('utf-8')
+
 
 if __name__ == '__main__':
     from settings.base import REDMINE_SERVER, REDMINE_PROJECT_ID, \
-        REDMINE_API_KEY, REDMINE_ISSUES_DIRECTORY, REDMINE_ISSUES_STATUS
+        REDMINE_API_KEY, REDMINE_ISSUES_DIRECTORY, REDMINE_ISSUES_STATUS, \
+        REDMINE_DOWNLOAD_MAX_WORKERS, REDMINE_SYNC_STATE_FILE, \
+        REDMINE_DOWNLOAD_RAW_JSON
     # rn = RedmineIssueDownloader(REDMINE_SERVER, REDMINE_API_KEY, 'dvn',
     # REDMINE_ISSUES_DIRECTORY)
     # Only import some specific tickets
     # kwargs = dict(specific_tickets_to_download=[1371, 1399, 1843, 2214,
     # 2215, 2216, 3362, 3387, 3397, 3400, 3232, 3271, 3305, 3426, 3425, 3313,
     # 3208])
+    # Only import the Bug tracker tickets created in the first half of 2014
+    # kwargs = dict(issue_filters={'tracker_id': 1,
+    #                              'created_on': '><2014-01-01|2014-06-30'})
     rn = RedmineIssueDownloader(REDMINE_SERVER, REDMINE_API_KEY,
                                 REDMINE_PROJECT_ID, REDMINE_ISSUES_DIRECTORY,
-                                issue_status=REDMINE_ISSUES_STATUS)
+                                issue_status=REDMINE_ISSUES_STATUS,
+                                max_workers=REDMINE_DOWNLOAD_MAX_WORKERS,
+                                sync_state_file=REDMINE_SYNC_STATE_FILE,
+                                raw_json=REDMINE_DOWNLOAD_RAW_JSON,
+                                resume='--resume' in sys.argv)
     rn.download_tickets2()
 
     msg(rn.get_issue_count())
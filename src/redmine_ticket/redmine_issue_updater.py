@@ -23,6 +23,7 @@ try:
         GITHUB_TARGET_USERNAME, get_gethub_issue_url
 
     from utils.msg_util import *
+    from utils import http_transport
     from redmine_ticket.redmine_issue_downloader import RedmineIssueDownloader
 except Exception as e:
     raise
@@ -85,7 +86,8 @@ class RedmineIssueUpdater:
 
     def connect_to_redmine(self):
         self.redmine_conn = \
-            Redmine(self.redmine_server, key=self.redmine_api_key)
+            Redmine(self.redmine_server, key=self.redmine_api_key,
+                    requests={'timeout': http_transport.get_timeout()})
         self.redmine_project = \
             self.redmine_conn.project.get(self.project_name_or_identifier)
         msg('Connected to server [%s] project [%s]' %
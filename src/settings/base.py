@@ -1,3 +1,5 @@
+import os
+
 import settings.local as config
 
 #
@@ -18,20 +20,98 @@ GITHUB_LOGIN = config.GITHUB_LOGIN
 GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN = \
     config.GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN
 
+# (optional) more GitHub accounts--e.g. bots with write access to the
+# repository--as a list of (login, personal access token).  Comments,
+# closes and related-ticket updates are spread across these accounts and
+# the one above, by rate limit left.  Issues are always created with
+# GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN
+GITHUB_TOKEN_POOL = getattr(config, 'GITHUB_TOKEN_POOL', [])
+
 GITHUB_TARGET_REPOSITORY = config.GITHUB_TARGET_REPOSITORY
 GITHUB_TARGET_USERNAME = config.GITHUB_TARGET_USERNAME
 
 USE_IMPORT_API = config.USE_IMPORT_API
 
+# API used to create the GitHub issues:
+#   'rest' = REST API (v3), USE_IMPORT_API applies
+#   'graphql' = GraphQL API (v4).  Up to GITHUB_GRAPHQL_BATCH_SIZE mutations
+#       (create issue, add comment, close issue) are sent per request
+GITHUB_API_BACKEND = getattr(config, 'GITHUB_API_BACKEND', 'rest')
+GITHUB_GRAPHQL_BATCH_SIZE = getattr(config, 'GITHUB_GRAPHQL_BATCH_SIZE', 10)
+
+# With USE_IMPORT_API (and the 'rest' backend): number of issue imports
+# pending at once, and seconds an import may stay pending before it is
+# reported as failed.  With GITHUB_IMPORT_MAX_IN_FLIGHT over 1, imports
+# are faster but the GitHub issues may not follow the redmine issue order
+GITHUB_IMPORT_MAX_IN_FLIGHT = \
+    getattr(config, 'GITHUB_IMPORT_MAX_IN_FLIGHT', 1)
+GITHUB_IMPORT_DEADLINE = getattr(config, 'GITHUB_IMPORT_DEADLINE', 600)
+
+# With the REST API (no USE_IMPORT_API, 'rest' backend): issues are created
+# one at a time, in redmine order, while GITHUB_FINISH_MAX_WORKERS threads
+# add the comments and close the issues already created.  Each queue
+# between the stages holds up to GITHUB_PIPELINE_QUEUE_SIZE issues
+GITHUB_FINISH_MAX_WORKERS = getattr(config, 'GITHUB_FINISH_MAX_WORKERS', 4)
+GITHUB_PIPELINE_QUEUE_SIZE = getattr(config, 'GITHUB_PIPELINE_QUEUE_SIZE', 20)
+
 #
 #  Working files directory
 #
 WORKING_FILES_DIRECTORY = config.WORKING_FILES_DIRECTORY
 REDMINE_ISSUES_DIRECTORY = config.REDMINE_ISSUES_DIRECTORY
 
+# Directory where redmine attachments are mirrored, stored by content hash
+REDMINE_ATTACHMENTS_DIRECTORY = getattr(
+    config, 'REDMINE_ATTACHMENTS_DIRECTORY',
+    os.path.join(WORKING_FILES_DIRECTORY, 'redmine_attachments'))
+
+# (optional) directory for the GitHub payloads compiled from the redmine
+# issues before the migration.  None = render each issue as it is sent
+GITHUB_PAYLOAD_DIRECTORY = getattr(config, 'GITHUB_PAYLOAD_DIRECTORY', None)
+
+# File recording the GitHub comment made from each redmine journal, used to
+# rewrite note references ("#123-4", "#123#note-4") without API calls
+GITHUB_COMMENT_INDEX_FILE = getattr(
+    config, 'GITHUB_COMMENT_INDEX_FILE',
+    os.path.join(WORKING_FILES_DIRECTORY, 'github_comment_index.jsonl'))
+
+# Merge redmine journals without notes (status, priority, ... changes) into
+# one "change history" comment:
+#   None = one comment per journal
+#   'consecutive' = one comment per run of consecutive journals
+#   'all' = one comment per issue
+GITHUB_JOURNAL_COALESCE = getattr(config, 'GITHUB_JOURNAL_COALESCE', None)
+
+# If True, journal details that change nothing are left out, and journals
+# left empty are not migrated
+GITHUB_DROP_NOOP_DETAILS = getattr(config, 'GITHUB_DROP_NOOP_DETAILS', False)
+
+# Description changes, and journal detail values longer than
+# GITHUB_DETAIL_INLINE_MAX_CHARS, are shown as a unified diff.  If the diff
+# is longer than GITHUB_DETAIL_DIFF_MAX_CHARS only a summary line is shown
+GITHUB_DETAIL_INLINE_MAX_CHARS = \
+    getattr(config, 'GITHUB_DETAIL_INLINE_MAX_CHARS', 200)
+GITHUB_DETAIL_DIFF_MAX_CHARS = \
+    getattr(config, 'GITHUB_DETAIL_DIFF_MAX_CHARS', 4000)
+
+# Related tickets pass (MigrationManager.migrate_related_tickets)
+#   - number of github issues updated concurrently
+#   - (optional) file recording each update, so unchanged issues are
+#     skipped on the next pass.  None = update every issue
+GITHUB_RELATED_MAX_WORKERS = getattr(config, 'GITHUB_RELATED_MAX_WORKERS', 4)
+GITHUB_RELATED_STATE_FILE = getattr(
+    config, 'GITHUB_RELATED_STATE_FILE',
+    os.path.join(WORKING_FILES_DIRECTORY, 'related_issues_state.jsonl'))
+
 # JSON file mapping { redmine issue # : github issue # }
 REDMINE_TO_GITHUB_MAP_FILE = config.REDMINE_TO_GITHUB_MAP_FILE
 
+# SQLite ledger of the migration: the github issue and phase of each
+# redmine issue.  REDMINE_TO_GITHUB_MAP_FILE is exported from it
+GITHUB_MIGRATION_LEDGER_FILE = getattr(
+    config, 'GITHUB_MIGRATION_LEDGER_FILE',
+    os.path.join(WORKING_FILES_DIRECTORY, 'migration_ledger.sqlite3'))
+
 # (optional) csv file mapping Redmine users to github users.
 # Manually created.  Doesn't check for name collisions
 #   example, see settings/sample_user_map.csv
@@ -57,6 +137,43 @@ REDMINE_CF_MAP = config.REDMINE_CF_MAP
 REDMINE_TRACKER_MAP = config.REDMINE_TRACKER_MAP
 REDMINE_ISSUES_STATUS = config.REDMINE_ISSUES_STATUS
 
+# Number of redmine issues retrieved concurrently by the downloader.
+# Optional in settings/local.py
+REDMINE_DOWNLOAD_MAX_WORKERS = \
+    getattr(config, 'REDMINE_DOWNLOAD_MAX_WORKERS', 4)
+
+# (optional) JSON file holding the "updated_on" high-water mark of the last
+# download.  If set, the downloader only retrieves issues updated since the
+# last run and adds them to (REDMINE_ISSUES_DIRECTORY)/corpus
+REDMINE_SYNC_STATE_FILE = getattr(config, 'REDMINE_SYNC_STATE_FILE', None)
+
+# If True, the issue JSON sent by redmine is written as is (compact) instead
+# of being re-serialized with indentation
+REDMINE_DOWNLOAD_RAW_JSON = getattr(config, 'REDMINE_DOWNLOAD_RAW_JSON', False)
+
+# Used by the asyncio downloader (redmine_ticket/redmine_async_downloader.py)
+#   - maximum number of requests in flight
+#   - seconds allowed to connect, and between two reads of a response
+#   - (optional) cap on requests started per second.  None = no cap
+REDMINE_ASYNC_CONCURRENCY = getattr(config, 'REDMINE_ASYNC_CONCURRENCY', 10)
+REDMINE_REQUEST_TIMEOUT = getattr(config, 'REDMINE_REQUEST_TIMEOUT', 60)
+REDMINE_REQUESTS_PER_SECOND = \
+    getattr(config, 'REDMINE_REQUESTS_PER_SECOND', None)
+
+#
+#  HTTP transport shared by every module (utils/http_transport.py)
+#   - seconds to wait for a connection and for each read of a response
+#   - connections kept alive per host
+#
+HTTP_CONNECT_TIMEOUT = getattr(config, 'HTTP_CONNECT_TIMEOUT', 10)
+HTTP_READ_TIMEOUT = getattr(config, 'HTTP_READ_TIMEOUT', 120)
+HTTP_POOL_SIZE = getattr(config, 'HTTP_POOL_SIZE', 10)
+
+# POST/PATCH/PUT/DELETE requests to the GitHub API are spread out to stay
+# under GitHub's secondary rate limit for content creation.  None = no cap
+GITHUB_CONTENT_REQUESTS_PER_MINUTE = \
+    getattr(config, 'GITHUB_CONTENT_REQUESTS_PER_MINUTE', 80)
+
 
 def get_gethub_issue_url(issue_id=None):
     """
@@ -79,4 +196,5 @@ def get_github_auth():
 def get_github_golden_auth():
     return dict(login=GITHUB_LOGIN,
                 password=GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN,
-                repo=GITHUB_TARGET_REPOSITORY, user=GITHUB_TARGET_USERNAME)
+                repo=GITHUB_TARGET_REPOSITORY, user=GITHUB_TARGET_USERNAME,
+                token_pool=GITHUB_TOKEN_POOL)
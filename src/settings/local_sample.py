@@ -20,19 +20,70 @@ GITHUB_SERVER = 'https://api.github.com'
 GITHUB_LOGIN = 'github username'
 GITHUB_PASSWORD_OR_PERSONAL_ACCESS_TOKEN = getpass.getpass('Enter github pw:')
 
+# (optional) more accounts for comments, closes and related-ticket
+# updates: [('bot-login', 'personal access token'), ...]
+GITHUB_TOKEN_POOL = []
+
 GITHUB_TARGET_REPOSITORY = 'test-issue-migrate'
 GITHUB_TARGET_USERNAME = 'target-repo-github-username'
 
 USE_IMPORT_API = False
 
+# 'rest' or 'graphql'.  With 'graphql', issues, comments and closes are
+# sent as batches of aliased mutations (USE_IMPORT_API doesn't apply)
+GITHUB_API_BACKEND = 'rest'
+GITHUB_GRAPHQL_BATCH_SIZE = 10
+
+# USE_IMPORT_API: imports pending at once (1 = keep the redmine issue order)
+# and seconds an import may stay pending
+GITHUB_IMPORT_MAX_IN_FLIGHT = 1
+GITHUB_IMPORT_DEADLINE = 600
+
+# REST API: issues are created in redmine order while this many threads add
+# the comments and close them.  Issues held between the stages
+GITHUB_FINISH_MAX_WORKERS = 4
+GITHUB_PIPELINE_QUEUE_SIZE = 20
+
 WORKING_FILES_DIRECTORY = join(PROJECT_ROOT, 'working_files')
 REDMINE_ISSUES_DIRECTORY = join(WORKING_FILES_DIRECTORY, 'redmine_issues')
+REDMINE_ATTACHMENTS_DIRECTORY = join(WORKING_FILES_DIRECTORY,
+                                     'redmine_attachments')
 SETTINGS_DIRECTORY = join(PROJECT_ROOT, 'src', 'settings')
 
 # JSON file mapping { redmine issue # : github issue # }
 REDMINE_TO_GITHUB_MAP_FILE = join(WORKING_FILES_DIRECTORY,
                                   'redmine2github_issue_map.json')
 
+# SQLite ledger of the migration: the github issue and phase of each
+# redmine issue.  REDMINE_TO_GITHUB_MAP_FILE is exported from it
+GITHUB_MIGRATION_LEDGER_FILE = join(WORKING_FILES_DIRECTORY,
+                                    'migration_ledger.sqlite3')
+
+# (optional) compile the GitHub payloads here, in a process pool, before
+# the migration.  None = render each issue as it is sent
+GITHUB_PAYLOAD_DIRECTORY = join(WORKING_FILES_DIRECTORY, 'github_payloads')
+
+# GitHub comment made from each redmine journal, recorded as comments are
+# created.  Used to rewrite note references without API calls
+GITHUB_COMMENT_INDEX_FILE = join(WORKING_FILES_DIRECTORY,
+                                 'github_comment_index.jsonl')
+
+# Merge journals without notes into one "change history" comment:
+# None, 'consecutive' or 'all'.  Optionally leave out no-op changes
+GITHUB_JOURNAL_COALESCE = None
+GITHUB_DROP_NOOP_DETAILS = False
+
+# Long journal detail values (e.g. description changes) are shown as a diff,
+# or as a summary line if the diff is over GITHUB_DETAIL_DIFF_MAX_CHARS
+GITHUB_DETAIL_INLINE_MAX_CHARS = 200
+GITHUB_DETAIL_DIFF_MAX_CHARS = 4000
+
+# Related tickets pass: github issues updated concurrently and the file
+# recording each update, so unchanged issues are skipped on the next pass
+GITHUB_RELATED_MAX_WORKERS = 4
+GITHUB_RELATED_STATE_FILE = join(WORKING_FILES_DIRECTORY,
+                                 'related_issues_state.jsonl')
+
 # (optional) csv file mapping Redmine users to github users.
 # Manually created.  Doesn't check for name collisions
 # example, see settings/sample_user_map.csv
@@ -59,6 +110,34 @@ REDMINE_CF_MAP = join(SETTINGS_DIRECTORY, 'cf_map.csv')
 REDMINE_TRACKER_MAP = join(SETTINGS_DIRECTORY, 'tracker_map.csv')
 REDMINE_ISSUES_STATUS = '*'  # values 'open', 'closed', '*'
 
+# Number of redmine issues retrieved concurrently by the downloader
+REDMINE_DOWNLOAD_MAX_WORKERS = 4
+
+# (optional) JSON file with the "updated_on" high-water mark of the last
+# download.  If set, only issues updated since then are downloaded and added
+# to (REDMINE_ISSUES_DIRECTORY)/corpus
+# REDMINE_SYNC_STATE_FILE = join(WORKING_FILES_DIRECTORY,
+#                                'redmine_sync_state.json')
+REDMINE_SYNC_STATE_FILE = None
+
+# Write the issue JSON as sent by redmine (compact), skipping python-redmine
+REDMINE_DOWNLOAD_RAW_JSON = False
+
+# HTTP transport: connect/read timeouts in seconds and connections per host
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 120
+HTTP_POOL_SIZE = 10
+
+# Cap on GitHub POST/PATCH/PUT/DELETE requests per minute, to stay under the
+# secondary rate limit for content creation.  None = no cap
+GITHUB_CONTENT_REQUESTS_PER_MINUTE = 80
+
+# asyncio downloader: requests in flight, seconds to connect or between reads
+# and an optional cap on requests per second (None = no cap)
+REDMINE_ASYNC_CONCURRENCY = 10
+REDMINE_REQUEST_TIMEOUT = 60
+REDMINE_REQUESTS_PER_SECOND = None
+
 
 def get_github_auth():
     return dict(
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from github_issues.comment_index import CommentIndex
+
+
+class CommentIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index_fname = os.path.join(self.tmp_dir, 'comments.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_add_comments_in_journal_order(self):
+        comment_index = CommentIndex(self.index_fname)
+        comment_index.add_comments(
+            12, [{'id': 1, 'html_url': 'u1'}, None,
+                 {'id': 3, 'html_url': 'u3'}])
+
+        comment_index = CommentIndex(self.index_fname)
+        self.assertTrue(comment_index.has_issue(12))
+        self.assertEqual(comment_index.get_comment_url(12, 1), 'u1')
+        self.assertIsNone(comment_index.get_comment_url(12, 2))
+        self.assertEqual(comment_index.get_comment_url('12', '3'), 'u3')
+
+    def test_issue_without_comments(self):
+        comment_index = CommentIndex(self.index_fname)
+        self.assertFalse(comment_index.has_issue(12))
+        comment_index.add_comments(12, [])
+        self.assertTrue(comment_index.has_issue(12))
+
+        # still indexed after a reload
+        comment_index = CommentIndex(self.index_fname)
+        self.assertTrue(comment_index.has_issue(12))
+        self.assertIsNone(comment_index.get_comment_url(12, 1))
+
+    def test_cut_line_is_skipped(self):
+        comment_index = CommentIndex(self.index_fname)
+        comment_index.add_comment(12, 1, 5, 'u5')
+        fh = open(self.index_fname, 'a')
+        fh.write('{"redmine_issue": 13, "jour')
+        fh.close()
+
+        comment_index = CommentIndex(self.index_fname)
+        self.assertEqual(comment_index.get_comment_url(12, 1), 'u5')
+        self.assertFalse(comment_index.has_issue(13))
+
+    def test_in_memory(self):
+        comment_index = CommentIndex(None)
+        comment_index.add_comment(12, 1, 5, 'u5')
+        comment_index.add_issue(13)
+        self.assertTrue(comment_index.has_issue(13))
+        self.assertEqual(comment_index.get_comment_url(12, 1), 'u5')
+
+    def test_comments_by_layout(self):
+        comment_index = CommentIndex(self.index_fname)
+        comment_index.add_layout(12, [[1], [2, 3], [5]])
+
+        comment_index = CommentIndex(self.index_fname)
+        self.assertFalse(comment_index.has_issue(12))
+        # the last comment was added after the migration
+        comment_index.add_comments(
+            12, [{'id': 1, 'html_url': 'u1'}, {'id': 2, 'html_url': 'u2'},
+                 {'id': 3, 'html_url': 'u3'}, {'id': 4, 'html_url': 'u4'}],
+            comment_index.get_layout(12))
+        self.assertEqual(comment_index.get_comment_url(12, 3), 'u2')
+        self.assertEqual(comment_index.get_comment_url(12, 5), 'u3')
+        self.assertIsNone(comment_index.get_comment_url(12, 4))
+
+    def test_missing_comments_are_not_indexed(self):
+        comment_index = CommentIndex(self.index_fname)
+        comment_index.add_comments(12, [{'id': 1, 'html_url': 'u1'}],
+                                   [[1], [2, 3]])
+        self.assertTrue(comment_index.has_issue(12))
+        self.assertIsNone(comment_index.get_comment_url(12, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
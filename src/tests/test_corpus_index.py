@@ -0,0 +1,95 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from github_issues.corpus_index import CorpusIndex
+
+
+class CorpusIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.write_issue(1, 'New', 'Bug', '2023-05-01T00:00:00Z', 0)
+        self.write_issue(2, 'Closed', 'Feature', '2024-02-01T00:00:00Z', 3)
+        self.write_issue(3, 'In Progress', 'Bug', '2024-03-15T00:00:00Z', 1)
+
+        self.corpus_index = self.get_corpus_index()
+        self.corpus_index.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_corpus_index(self):
+        return CorpusIndex(self.tmp_dir, closed_statuses=['Closed'])
+
+    def write_issue(self, issue_id, status, tracker, updated_on, journal_cnt):
+        fh = open(os.path.join(self.tmp_dir, '%05d.json' % issue_id), 'w')
+        fh.write(json.dumps({'id': issue_id, 'status': {'name': status},
+                             'tracker': {'name': tracker},
+                             'updated_on': updated_on,
+                             'journals': [{}] * journal_cnt}))
+        fh.close()
+
+    def test_select_all(self):
+        self.assertEqual(self.corpus_index.select(),
+                         ['00001.json', '00002.json', '00003.json'])
+
+    def test_select(self):
+        select = self.corpus_index.select
+        self.assertEqual(select('status=open'), ['00001.json', '00003.json'])
+        self.assertEqual(select('status=closed'), ['00002.json'])
+        self.assertEqual(select('status="in progress"'), ['00003.json'])
+        self.assertEqual(select('tracker=bug,feature status!=new'),
+                         ['00002.json', '00003.json'])
+        self.assertEqual(select('updated>=2024-02 journals>0'),
+                         ['00002.json', '00003.json'])
+        self.assertEqual(select('id>1 id<=2'), ['00002.json'])
+        self.assertEqual(select('id=1,3'), ['00001.json', '00003.json'])
+
+    def test_parse_filter(self):
+        self.assertEqual(self.corpus_index.parse_filter('tracker=Bug,UI'),
+                         [('tracker', str, '=', ['bug', 'ui'])])
+        self.assertEqual(self.corpus_index.parse_filter('journals>=2'),
+                         [('journals', int, '>=', [2])])
+
+    def test_invalid_filters(self):
+        for expression in ['status', 'color=red', 'tracker>Bug',
+                           'journals>many', 'status="open']:
+            self.assertRaises(ValueError, self.corpus_index.select,
+                              expression)
+
+    def test_refresh_reads_changed_files(self):
+        self.write_issue(3, 'Closed', 'Bug', '2024-04-01T00:00:00Z', 2)
+        os.utime(os.path.join(self.tmp_dir, '00003.json'), (1, 1))
+        os.remove(os.path.join(self.tmp_dir, '00001.json'))
+
+        # loaded from the saved index
+        corpus_index = self.get_corpus_index()
+        self.assertEqual(len(corpus_index.entries), 3)
+        corpus_index.refresh()
+        self.assertEqual(corpus_index.select('status=closed'),
+                         ['00002.json', '00003.json'])
+        self.assertEqual(corpus_index.get_fnames(),
+                         ['00002.json', '00003.json'])
+
+    def test_same_day_dates(self):
+        # issue 2 was updated on 2024-02-01
+        select = self.corpus_index.select
+        self.assertEqual(select('updated>2024-02-01'), ['00003.json'])
+        self.assertEqual(select('updated>=2024-02-01'),
+                         ['00002.json', '00003.json'])
+        self.assertEqual(select('updated<2024-02-01'), ['00001.json'])
+        self.assertEqual(select('updated<=2024-02-01'),
+                         ['00001.json', '00002.json'])
+        self.assertEqual(select('updated=2024-02-01'), ['00002.json'])
+        self.assertEqual(select('updated=2023,2024-03'),
+                         ['00001.json', '00003.json'])
+        self.assertEqual(select('updated!=2024'), ['00001.json'])
+        self.assertEqual(select('updated<=2024-02'),
+                         ['00001.json', '00002.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
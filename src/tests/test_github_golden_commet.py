@@ -0,0 +1,98 @@
+import json
+import unittest
+from unittest import mock
+
+from github_issues.github_golden_commet import GitHubIssueHelper
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self.data
+
+
+class FakeIssueMaker:
+
+    def process_journals(self, journals, attachments):
+        return []
+
+
+class GitHubIssueHelperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.helper = GitHubIssueHelper(FakeIssueMaker(), user='user',
+                                        repo='repo', password='token')
+        self.posts = []
+
+    def fake_post(self, responses):
+        def post(url, data=None, **kwargs):
+            self.posts.append((url, json.loads(data), kwargs))
+            return responses.pop(0)
+        return post
+
+    def test_issue_created_with_labels(self):
+        responses = [FakeResponse(201, {
+            'url': 'https://api.github.com/repos/user/repo/issues/5',
+            'comments_url': 'https://api.github.com/repos/user/repo/'
+                            'issues/5/comments'})]
+        with mock.patch('utils.http_transport.post',
+                        self.fake_post(responses)):
+            issue = self.helper.create({'title': 't', 'body': 'b'}, [], [],
+                                       labels=['bug', 'ui'])
+
+        self.assertEqual(issue.id, 5)
+        # a single request, labels included
+        self.assertEqual(len(self.posts), 1)
+        self.assertEqual(self.posts[0][1]['labels'], ['bug', 'ui'])
+
+    def test_add_comments_reports_failures(self):
+        comments = [{'body': 'one', 'journals': [1]},
+                    {'body': 'two', 'journals': [2]}]
+        comments_url = 'https://api.github.com/repos/user/repo/issues/5/' \
+                       'comments'
+        responses = [FakeResponse(201, {'id': 1}), FakeResponse(201, {})]
+        with mock.patch('utils.http_transport.post',
+                        self.fake_post(responses)):
+            self.assertTrue(self.helper.add_comments(comments_url, comments))
+
+        responses = [FakeResponse(201, {}), FakeResponse(502, {})]
+        with mock.patch('utils.http_transport.post',
+                        self.fake_post(responses)):
+            self.assertFalse(self.helper.add_comments(comments_url,
+                                                      comments))
+        # the journal #'s are not sent
+        self.assertEqual(self.posts[0][1], {'body': 'one'})
+
+    def test_token_pool(self):
+        helper = GitHubIssueHelper(FakeIssueMaker(), user='user',
+                                   repo='repo', password='token',
+                                   token_pool=[['bot', 'bot-token']])
+        self.assertEqual(len(helper.token_pool), 2)
+
+        calls = []
+
+        def fake_request(url, data=None, auth=None, **kwargs):
+            calls.append(auth)
+            return FakeResponse(201, {'number': 5, 'id': 5,
+                                      'html_url': 'x'})
+
+        with mock.patch.object(helper.token_pool, 'get_auth',
+                               lambda: ('bot', 'bot-token')), \
+                mock.patch('utils.http_transport.post', fake_request), \
+                mock.patch('utils.http_transport.patch', fake_request):
+            helper.open_issue({'title': 't'})
+            helper.create_comment(5, 'a comment')
+            helper.update_issue(5, {'state': 'closed'})
+
+        # issues are created with the primary account
+        self.assertEqual(calls, [('user', 'token'), ('bot', 'bot-token'),
+                                 ('bot', 'bot-token')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import unittest
+from unittest import mock
+
+from github_issues.github_graphql import GitHubGraphQLHelper
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self.data
+
+
+class GitHubGraphQLHelperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.helper = GitHubGraphQLHelper(user='user', repo='repo',
+                                          password='token', batch_size=2)
+        self.posts = []
+
+    def fake_post(self, url, **kwargs):
+        self.posts.append((url, kwargs))
+        if url == GitHubGraphQLHelper.GRAPHQL_URL:
+            query = json.loads(kwargs['data'])['query']
+            return FakeResponse(200, {'data': dict(
+                ('m%d' % idx, {'ok': True})
+                for idx in range(query.count('(input:')))})
+        return FakeResponse(201, {'node_id': 'L_new'})
+
+    def test_mutations_take_content_tokens(self):
+        mutations = [('addComment', 'AddCommentInput', {'body': 'x'},
+                      '{ clientMutationId }')] * 3
+        with mock.patch('utils.http_transport.post', self.fake_post):
+            results = self.helper.run_mutations(mutations)
+
+        self.assertEqual(results, [{'ok': True}] * 3)
+        self.assertEqual([x[1]['content_cost'] for x in self.posts], [2, 1])
+        for url, kwargs in self.posts:
+            self.assertEqual(kwargs['governor_auth'], ('user', 'token'))
+
+    def test_query_takes_no_content_token(self):
+        with mock.patch('utils.http_transport.post', self.fake_post):
+            self.helper.run_query('query { viewer { id } }')
+        self.assertEqual(self.posts[0][1]['content_cost'], 0)
+
+    def test_missing_label_is_created(self):
+        self.helper.label_ids = {'bug': 'L_bug'}
+        with mock.patch('utils.http_transport.post', self.fake_post):
+            label_ids = self.helper.get_label_ids(['bug', 'new label'])
+            # created once
+            self.helper.get_label_ids(['new label'])
+
+        self.assertEqual(label_ids, ['L_bug', 'L_new'])
+        self.assertEqual(len(self.posts), 1)
+        url, kwargs = self.posts[0]
+        self.assertEqual(url, 'https://api.github.com/repos/user/repo/labels')
+        self.assertEqual(json.loads(kwargs['data'])['name'], 'new label')
+
+
+if __name__ == '__main__':
+    unittest.main()
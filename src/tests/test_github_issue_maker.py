@@ -0,0 +1,167 @@
+import json
+import unittest
+from unittest import mock
+
+from github_issues.github_issue_maker import GithubIssueMaker
+
+
+def get_journal(notes='', details=None):
+    return {'notes': notes, 'user': {'name': 'Someone'},
+            'created_on': '2014-07-02T00:00:00Z', 'details': details or []}
+
+
+def get_detail(name, old_value, new_value, prop='attr'):
+    return {'property': prop, 'name': name, 'old_value': old_value,
+            'new_value': new_value}
+
+
+class GithubIssueMakerTest(unittest.TestCase):
+
+    def get_issue_maker(self, **kwargs):
+        kwargs.setdefault('journal_coalesce', None)
+        kwargs.setdefault('drop_noop_details', False)
+        # no redmine property maps
+        with mock.patch.object(GithubIssueMaker, 'read_csv_kvmap',
+                               return_value={}):
+            return GithubIssueMaker(update_map_labels=False,
+                                    comment_index_filename=None, **kwargs)
+
+    def get_journals(self):
+        status_change = [get_detail('status_id', '1', '2')]
+        return [get_journal('first note'),
+                get_journal(details=status_change),
+                get_journal(details=status_change),
+                get_journal('second note'),
+                get_journal(details=status_change)]
+
+    def test_no_coalescing(self):
+        comments = self.get_issue_maker().process_journals(
+            self.get_journals(), [])
+        self.assertEqual([x['journals'] for x in comments],
+                         [[1], [2], [3], [4], [5]])
+        self.assertEqual(comments[0]['created_at'], '2014-07-02T00:00:00Z')
+
+    def test_coalesce_consecutive(self):
+        comments = self.get_issue_maker(
+            journal_coalesce='consecutive').process_journals(
+                self.get_journals(), [])
+        self.assertEqual([x['journals'] for x in comments],
+                         [[1], [2, 3], [4], [5]])
+        self.assertIn('Change history', comments[1]['body'])
+        self.assertIn('first note', comments[0]['body'])
+
+    def test_coalesce_all(self):
+        comments = self.get_issue_maker(
+            journal_coalesce='all').process_journals(self.get_journals(), [])
+        self.assertEqual([x['journals'] for x in comments],
+                         [[1], [2, 3, 5], [4]])
+
+    def test_drop_noop_details(self):
+        journals = [get_journal(details=[get_detail('status_id', '1', '1')]),
+                    get_journal(details=[get_detail('status_id', '', None),
+                                         get_detail('status_id', '1', '2')])]
+        gm = self.get_issue_maker(drop_noop_details=True)
+        comments = gm.process_journals(journals, [])
+        self.assertEqual([x['journals'] for x in comments], [[2]])
+        self.assertEqual(len(gm.process_journal(journals[1], {})['details']),
+                         1)
+
+    def test_description_change_is_a_diff(self):
+        gm = self.get_issue_maker()
+        note_dict = gm.process_journal(get_journal(details=[
+            get_detail('description', 'one\ntwo', 'one\n```three')]), {})
+        detail = note_dict['details'][0]
+        self.assertEqual(detail['new_value'],
+                         '(1 line(s) added, 1 line(s) removed)')
+        self.assertIn('+```three', detail['diff'])
+        # longer than the backticks in the diff
+        self.assertEqual(detail['diff_fence'], '````')
+
+    def test_long_value_is_a_diff(self):
+        gm = self.get_issue_maker()
+        self.assertFalse(gm.is_long_text_detail('attr', 'subject', 'a', 'b'))
+        with mock.patch('github_issues.github_issue_maker.'
+                        'GITHUB_DETAIL_INLINE_MAX_CHARS', 3):
+            self.assertTrue(gm.is_long_text_detail('cf', '2', 'abcd', None))
+
+    def test_long_diff_is_summarized(self):
+        gm = self.get_issue_maker()
+        with mock.patch('github_issues.github_issue_maker.'
+                        'GITHUB_DETAIL_DIFF_MAX_CHARS', 10):
+            text_change = gm.format_text_change('one', 'two\nthree\nfour')
+        self.assertEqual(text_change['new_value'],
+                         '(3 line(s) added, 1 line(s) removed)')
+        self.assertIsNone(text_change['diff'])
+
+    def get_comment_conn(self, gm):
+        conn = mock.MagicMock()
+        conn.issues.list_comments.return_value = [
+            {'id': 1, 'html_url': 'u1'}, {'id': 2, 'html_url': 'u2'}]
+        gm.get_github_conn = mock.MagicMock(return_value=conn)
+        return conn
+
+    def test_comment_url_by_position(self):
+        gm = self.get_issue_maker()
+        self.get_comment_conn(gm)
+        self.assertEqual(gm.get_comment_url('12', 34, '2'), 'u2')
+        # a missing comment links to the redmine note
+        self.assertTrue(gm.get_comment_url('12', 34, '3').endswith(
+            'issues/12#note-3'))
+
+    def test_comment_url_by_layout(self):
+        gm = self.get_issue_maker(journal_coalesce='all')
+        conn = self.get_comment_conn(gm)
+        gm.record_comment_layout(
+            {'redmine_issue_num': 12,
+             'comments': [{'body': 'a', 'journals': [1]},
+                          {'body': 'b', 'journals': [2, 3]}]})
+        self.assertEqual(gm.get_comment_url('12', 34, '3'), 'u2')
+        self.assertEqual(conn.issues.list_comments.call_count, 1)
+
+    def test_no_positional_comment_url_when_coalescing(self):
+        gm = self.get_issue_maker(journal_coalesce='consecutive')
+        conn = self.get_comment_conn(gm)
+        self.assertTrue(gm.get_comment_url('12', 34, '2').endswith(
+            'issues/12#note-2'))
+        self.assertFalse(conn.issues.list_comments.called)
+
+    def update_with_related(self, gm, last_update):
+        # 'rU' can't be opened by python 3.11
+        json_str = json.dumps({'id': 10})
+        with mock.patch('github_issues.github_issue_maker.open',
+                        mock.mock_open(read_data=json_str), create=True), \
+                mock.patch('os.path.isfile', return_value=True):
+            return gm.update_github_issue_with_related(
+                '00010.json', {'10': 20, '1': 2, '2': 3, '3': 4},
+                last_update)
+
+    def test_related_update_again(self):
+        gm = self.get_issue_maker()
+        conn = mock.MagicMock()
+        gm.get_github_conn = mock.MagicMock(return_value=conn)
+        conn.issues.get_issue.return_value = {'body': 'See #1',
+                                              'comments': 1}
+        conn.issues.list_comments.return_value = [{'id': 7,
+                                                   'body': 'Fixed by #2'}]
+        conn.issues.update_comment.return_value = True
+        conn.issues.update_issue.return_value = False
+
+        result = self.update_with_related(gm, None)
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(result['originals'],
+                         {'body': 'See #1', 'comments': {'7': 'Fixed by #2'}})
+        conn.issues.update_comment.assert_called_once_with(7, 'Fixed by #3')
+
+        # tried again: the comment is not rewritten a second time
+        conn.issues.list_comments.return_value = [{'id': 7,
+                                                   'body': 'Fixed by #3'}]
+        conn.issues.update_issue.return_value = True
+        result = self.update_with_related(gm, result)
+        self.assertEqual(result['status'], 'updated')
+        self.assertNotIn('originals', result)
+        self.assertEqual(conn.issues.update_comment.call_count, 1)
+        conn.issues.update_issue.assert_called_with(20, {'body': 'See #2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest import mock
+
+from settings.base import GITHUB_SERVER
+from utils import http_transport
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.headers = {}
+        self.text = ''
+
+
+class FakeSession:
+
+    def __init__(self, responses=None):
+        self.calls = []
+        self.responses = responses or []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeResponse()
+
+
+class HttpTransportTest(unittest.TestCase):
+
+    def test_session_per_host(self):
+        session = http_transport.get_session('https://redmine.example.org/a')
+        self.assertIs(
+            http_transport.get_session('https://redmine.example.org/b'),
+            session)
+        self.assertIsNot(
+            http_transport.get_session('https://other.example.org/a'),
+            session)
+
+    def test_default_timeout(self):
+        session = FakeSession()
+        with mock.patch.object(http_transport, 'get_session',
+                               lambda url: session):
+            http_transport.get('https://redmine.example.org/issues.json')
+            http_transport.get('https://redmine.example.org/issues.json',
+                               timeout=5)
+        self.assertEqual(session.calls[0][2]['timeout'],
+                         http_transport.get_timeout())
+        self.assertEqual(session.calls[1][2]['timeout'], 5)
+
+    def test_governor_per_account(self):
+        self.assertIsNone(
+            http_transport.get_governor('https://redmine.example.org/'))
+
+        governor = http_transport.get_governor(GITHUB_SERVER, ('a', 't1'))
+        self.assertIs(
+            http_transport.get_governor(GITHUB_SERVER, ['a', 't1']),
+            governor)
+        self.assertIsNot(
+            http_transport.get_governor(GITHUB_SERVER, ('b', 't2')),
+            governor)
+
+    def test_rate_limited_request_is_retried(self):
+        rate_limited = FakeResponse(429)
+        rate_limited.headers = {'Retry-After': '0'}
+        session = FakeSession([rate_limited, FakeResponse(201)])
+        with mock.patch.object(http_transport, 'get_session',
+                               lambda url: session):
+            response = http_transport.post(GITHUB_SERVER + '/x',
+                                           auth=('retry', 'token'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(session.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
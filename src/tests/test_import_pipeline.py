@@ -0,0 +1,109 @@
+import json
+import unittest
+from unittest import mock
+
+from github_issues.import_pipeline import IssueImportPipeline
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, data=None, text=None):
+        self.status_code = status_code
+        self.data = data
+        self.text = text if text is not None else json.dumps(data)
+        self.links = {}
+
+    def json(self):
+        return self.data
+
+
+def get_payload(redmine_issue_num, **issue):
+    issue.setdefault('title', 'Issue %s' % redmine_issue_num)
+    return {'redmine_issue_num': redmine_issue_num, 'issue': issue,
+            'comments': [{'body': 'a comment', 'journals': [1]}]}
+
+
+class IssueImportPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pipeline = IssueImportPipeline(user='user', repo='repo',
+                                            password='token')
+        self.posted = []
+
+    def test_defaults(self):
+        self.assertEqual(self.pipeline.max_in_flight, 1)
+
+    def test_import_data(self):
+        import_data = self.pipeline.get_import_data(get_payload(1))
+        self.assertEqual(import_data['comments'], [{'body': 'a comment'}])
+
+    def fake_post(self, responses):
+        def post(url, data=None, **kwargs):
+            self.posted.append(json.loads(data))
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return post
+
+    def test_submit(self):
+        responses = [FakeResponse(202, {'id': 7, 'created_at': 'now'})]
+        with mock.patch('utils.http_transport.post',
+                        self.fake_post(responses)):
+            self.assertIsNone(self.pipeline.submit(get_payload(1)))
+        self.assertEqual(list(self.pipeline.pending), [7])
+
+    def test_submit_again_without_assignee(self):
+        responses = [FakeResponse(422, text='{"message": "Validation '
+                                            'Failed"}'),
+                     FakeResponse(202, {'id': 7, 'created_at': 'now'})]
+        payload = get_payload(1, assignee='someone')
+        with mock.patch('utils.http_transport.post',
+                        self.fake_post(responses)):
+            self.assertIsNone(self.pipeline.submit(payload))
+        self.assertIn('assignee', self.posted[0]['issue'])
+        self.assertNotIn('assignee', self.posted[1]['issue'])
+        # the payload itself is unchanged
+        self.assertEqual(payload['issue']['assignee'], 'someone')
+
+    def test_submit_fails(self):
+        responses = [FakeResponse(422, text='Validation Failed')]
+        with mock.patch('utils.http_transport.post',
+                        self.fake_post(responses)):
+            payload, issue_number, errors = \
+                self.pipeline.submit(get_payload(1))
+        self.assertIsNone(issue_number)
+        self.assertEqual(errors, ['Validation Failed'])
+        self.assertEqual(len(self.posted), 1)
+
+    def test_transport_error_keeps_pending(self):
+        self.pipeline.max_in_flight = 2
+        post_responses = [FakeResponse(202, {'id': 7, 'created_at': 'now'}),
+                          IOError('connection reset')]
+        get_responses = [FakeResponse(200, [{'id': 7, 'status': 'imported',
+                                             'issue_url': 'x/issues/35'}])]
+        with mock.patch('utils.http_transport.post',
+                        self.fake_post(post_responses)), \
+                mock.patch('utils.http_transport.get',
+                           lambda *args, **kwargs: get_responses.pop(0)), \
+                mock.patch('time.sleep'):
+            results = list(self.pipeline.run([get_payload(1),
+                                              get_payload(2)]))
+
+        self.assertEqual([(x[0]['redmine_issue_num'], x[1]) for x in
+                          results], [(2, None), (1, 35)])
+        self.assertEqual(results[0][2], ['connection reset'])
+
+    def test_poll_deadline(self):
+        self.pipeline.pending[7] = dict(payload=get_payload(1),
+                                        created_at='now', deadline=0)
+        with mock.patch('utils.http_transport.get',
+                        lambda *args, **kwargs: FakeResponse(200, [])):
+            results = self.pipeline.poll()
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0][1])
+        self.assertEqual(self.pipeline.pending, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from github_issues.migration_ledger import MigrationLedger
+
+
+class MigrationLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ledger = MigrationLedger(os.path.join(self.tmp_dir,
+                                                   'ledger.sqlite3'))
+
+    def tearDown(self):
+        self.ledger.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_phase_only_moves_forward(self):
+        self.ledger.record(1, MigrationLedger.PHASE_CREATED, github_number=10)
+        self.ledger.record(1, MigrationLedger.PHASE_CLOSED)
+        self.ledger.record(1, MigrationLedger.PHASE_COMMENTED)
+        self.assertEqual(self.ledger.get_entry(1)['phase'],
+                         MigrationLedger.PHASE_CLOSED)
+
+        self.ledger.record(1, MigrationLedger.PHASE_RELATED)
+        self.assertEqual(self.ledger.get_entry(1)['phase'],
+                         MigrationLedger.PHASE_RELATED)
+
+    def test_earlier_phase_still_updates_fields(self):
+        self.ledger.record(1, MigrationLedger.PHASE_CLOSED)
+        self.ledger.record(1, MigrationLedger.PHASE_CREATED,
+                           github_number=10, payload_sha='abc')
+        entry = self.ledger.get_entry(1)
+        self.assertEqual(entry['phase'], MigrationLedger.PHASE_CLOSED)
+        self.assertEqual(entry['github_number'], 10)
+        self.assertEqual(entry['payload_sha'], 'abc')
+
+    def test_none_keeps_recorded_values(self):
+        self.ledger.record(1, MigrationLedger.PHASE_SUBMITTED,
+                           github_id=55, payload_sha='abc')
+        self.ledger.record(1, MigrationLedger.PHASE_CREATED,
+                           github_number=10)
+        entry = self.ledger.get_entry(1)
+        self.assertEqual(entry['github_id'], '55')
+        self.assertEqual(entry['github_number'], 10)
+        self.assertEqual(entry['payload_sha'], 'abc')
+
+    def test_unknown_phase(self):
+        self.assertRaises(ValueError, self.ledger.record, 1, 'sent')
+
+    def test_get_entries(self):
+        self.ledger.record(2, MigrationLedger.PHASE_CREATED)
+        self.ledger.record(1, MigrationLedger.PHASE_CREATED)
+        self.ledger.record(3, MigrationLedger.PHASE_CLOSED)
+        self.assertEqual([x['redmine_issue'] for x in
+                          self.ledger.get_entries(
+                              MigrationLedger.PHASE_CREATED)], [1, 2])
+        self.assertEqual(len(self.ledger.get_entries()), 3)
+
+    def test_map_file_round_trip(self):
+        map_fname = os.path.join(self.tmp_dir, 'map.json')
+        fh = open(map_fname, 'w')
+        fh.write(json.dumps({'1': 10, '2': 20}))
+        fh.close()
+
+        self.assertTrue(self.ledger.is_empty())
+        self.ledger.import_map_file(map_fname)
+        self.assertFalse(self.ledger.is_empty())
+        self.ledger.record(3, MigrationLedger.PHASE_SUBMITTED)
+
+        self.assertEqual(self.ledger.get_entry(1)['phase'],
+                         MigrationLedger.PHASE_LEGACY)
+        # a migrated issue isn't moved back by the staged path
+        self.ledger.record(1, MigrationLedger.PHASE_COMMENTED)
+        self.assertEqual(self.ledger.get_entry(1)['phase'],
+                         MigrationLedger.PHASE_LEGACY)
+
+        out_fname = os.path.join(self.tmp_dir, 'out.json')
+        self.ledger.export_map_file(out_fname)
+        fh = open(out_fname, 'r')
+        self.assertEqual(json.loads(fh.read()), {'1': 10, '2': 20})
+        fh.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from github_issues import migration_manager
+from github_issues.migration_manager import MigrationManager
+from github_issues.migration_ledger import MigrationLedger
+
+
+class FakeGithubIssueMaker:
+
+    def __init__(self, found=None, comments_added=True):
+        self.found = found or {}
+        self.comments_added = comments_added
+        self.since = 'not called'
+        self.closed = []
+        self.opened = []
+        self.failing = []
+
+    def find_migrated_issues(self, redmine_issue_nums, since=None):
+        self.since = since
+        return dict((k, v) for k, v in self.found.items()
+                    if k in redmine_issue_nums)
+
+    def get_unposted_comments(self, payload):
+        return [{'body': 'a comment', 'journals': [1]}]
+
+    def add_comments(self, issue_num, comments, redmine_issue_num=None):
+        return self.comments_added
+
+    def close_github_issue(self, issue_num):
+        self.closed.append(issue_num)
+        return True
+
+    def get_github_conn(self):
+        pass
+
+    def get_comment_index(self):
+        pass
+
+    def open_github_issue(self, payload):
+        self.opened.append(payload['redmine_issue_num'])
+        if payload['redmine_issue_num'] in self.failing:
+            return None
+        return 100 + payload['redmine_issue_num']
+
+    def make_github_issues_from_payloads(self, payloads):
+        return [self.open_github_issue(x) for x in payloads]
+
+
+class FakePayloadCompiler:
+
+    def load_payload(self, json_fname):
+        redmine_issue_num = int(json_fname.replace('.json', ''))
+        return {'redmine_issue_num': redmine_issue_num,
+                'closed': redmine_issue_num % 2 == 0}
+
+
+class MigrationManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.json_dir = os.path.join(self.tmp_dir, 'issues')
+        os.makedirs(self.json_dir)
+        for redmine_issue_num in [1, 2, 3, 4]:
+            fh = open(os.path.join(self.json_dir,
+                                   '%05d.json' % redmine_issue_num), 'w')
+            fh.write(json.dumps({'id': redmine_issue_num,
+                                 'status': {'name': 'New'}}))
+            fh.close()
+
+        self.mm = MigrationManager(
+            self.json_dir, os.path.join(self.tmp_dir, 'map.json'),
+            ledger_file=os.path.join(self.tmp_dir, 'ledger.sqlite3'),
+            corpus_index_file=os.path.join(self.tmp_dir, 'index.json'),
+            related_state_file=os.path.join(self.tmp_dir, 'related.jsonl'))
+        self.ledger = self.mm.get_ledger()
+
+    def tearDown(self):
+        self.ledger.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_fnames_to_send(self):
+        self.ledger.record(1, MigrationLedger.PHASE_SUBMITTED)
+        self.ledger.record(2, MigrationLedger.PHASE_CREATED)
+        self.ledger.record(3, MigrationLedger.PHASE_LEGACY)
+        self.assertEqual(self.mm.get_fnames_to_send([]),
+                         ['00001.json', '00004.json'])
+        self.assertEqual(self.mm.get_fnames_to_send([4]), ['00001.json'])
+        self.assertEqual(
+            self.mm.get_fnames_to_send(
+                [], [None, MigrationLedger.PHASE_SUBMITTED,
+                     MigrationLedger.PHASE_CREATED,
+                     MigrationLedger.PHASE_COMMENTED]),
+            ['00001.json', '00002.json', '00004.json'])
+
+    def test_reconcile_submitted(self):
+        self.ledger.record(1, MigrationLedger.PHASE_SUBMITTED)
+        self.ledger.record(2, MigrationLedger.PHASE_SUBMITTED)
+        gm = FakeGithubIssueMaker(found={1: 10})
+        with mock.patch.object(migration_manager, 'USE_IMPORT_API', False):
+            self.assertEqual(self.mm.reconcile_submitted(gm), [])
+        self.assertIsNotNone(gm.since)
+        self.assertEqual(self.ledger.get_entry(1)['phase'],
+                         MigrationLedger.PHASE_CREATED)
+        self.assertEqual(self.ledger.get_entry(1)['github_number'], 10)
+        self.assertEqual(self.ledger.get_entry(2)['phase'],
+                         MigrationLedger.PHASE_SUBMITTED)
+
+    def test_reconcile_submitted_imports(self):
+        self.ledger.record(1, MigrationLedger.PHASE_SUBMITTED)
+        gm = FakeGithubIssueMaker()
+        with mock.patch.object(migration_manager, 'USE_IMPORT_API', True), \
+                mock.patch.object(migration_manager, 'GITHUB_API_BACKEND',
+                                  'rest'):
+            # may still be pending
+            self.assertEqual(self.mm.reconcile_submitted(gm), [1])
+        # imported issues keep their redmine dates
+        self.assertIsNone(gm.since)
+
+    def test_finish_issue(self):
+        payload = {'redmine_issue_num': 1, 'closed': True}
+        self.ledger.record(1, MigrationLedger.PHASE_CREATED)
+        gm = FakeGithubIssueMaker(comments_added=False)
+        self.assertFalse(self.mm.finish_issue(gm, payload, 10,
+                                              MigrationLedger.PHASE_CREATED))
+        # left open, to be sent again
+        self.assertEqual(self.ledger.get_entry(1)['phase'],
+                         MigrationLedger.PHASE_CREATED)
+        self.assertEqual(gm.closed, [])
+        self.assertFalse(self.mm.is_issue_finished(self.ledger, 1, True))
+        self.assertEqual(
+            self.mm.get_fnames_to_send(
+                [], [None, MigrationLedger.PHASE_SUBMITTED,
+                     MigrationLedger.PHASE_CREATED,
+                     MigrationLedger.PHASE_COMMENTED])[0], '00001.json')
+
+        gm.comments_added = True
+        self.assertTrue(self.mm.finish_issue(gm, payload, 10,
+                                             MigrationLedger.PHASE_CREATED))
+        self.assertEqual(self.ledger.get_entry(1)['phase'],
+                         MigrationLedger.PHASE_CLOSED)
+        self.assertEqual(gm.closed, [10])
+
+        payload = {'redmine_issue_num': 2, 'closed': False}
+        self.ledger.record(2, MigrationLedger.PHASE_CREATED)
+        self.assertTrue(self.mm.finish_issue(gm, payload, 20,
+                                             MigrationLedger.PHASE_CREATED))
+        self.assertEqual(self.ledger.get_entry(2)['phase'],
+                         MigrationLedger.PHASE_COMMENTED)
+
+    def test_is_issue_finished(self):
+        self.assertFalse(self.mm.is_issue_finished(self.ledger, 1, False))
+        self.ledger.record(1, MigrationLedger.PHASE_CREATED)
+        self.assertFalse(self.mm.is_issue_finished(self.ledger, 1, False))
+        self.ledger.record(1, MigrationLedger.PHASE_COMMENTED)
+        self.assertTrue(self.mm.is_issue_finished(self.ledger, 1, False))
+        self.assertFalse(self.mm.is_issue_finished(self.ledger, 1, True))
+        self.ledger.record(1, MigrationLedger.PHASE_CLOSED)
+        self.assertTrue(self.mm.is_issue_finished(self.ledger, 1, True))
+        self.ledger.record(2, MigrationLedger.PHASE_LEGACY)
+        self.assertTrue(self.mm.is_issue_finished(self.ledger, 2, True))
+
+    def test_load_related_state(self):
+        fh = open(self.mm.related_state_file, 'w')
+        fh.write(json.dumps({'redmine_issue': 1, 'input_sha': 'a',
+                             'originals': {'body': 'x'}}) + '\n')
+        fh.write(json.dumps({'redmine_issue': 1, 'input_sha': 'b'}) + '\n')
+        fh.write('{"redmine_issue": 2, "inp')
+        fh.close()
+        # the originals of the first update are kept
+        self.assertEqual(self.mm.load_related_state(),
+                         {1: {'redmine_issue': 1, 'input_sha': 'b',
+                              'originals': {'body': 'x'}}})
+
+    def test_migrate_issues_staged(self):
+        # created by an interrupted run: only finished
+        self.ledger.record(2, MigrationLedger.PHASE_CREATED,
+                           github_number=102)
+        gm = FakeGithubIssueMaker()
+        gm.failing = [3]
+        self.mm.finish_max_workers = 2
+        self.mm.pipeline_queue_size = 1
+        self.mm.migrate_issues_staged(
+            gm, FakePayloadCompiler(),
+            ['00001.json', '00002.json', '00003.json', '00004.json'])
+
+        # created in redmine order
+        self.assertEqual(gm.opened, [1, 3, 4])
+        self.assertEqual(sorted(gm.closed), [102, 104])
+        phases = dict((x['redmine_issue'], x['phase']) for x in
+                      self.ledger.get_entries())
+        self.assertEqual(phases, {1: MigrationLedger.PHASE_COMMENTED,
+                                  2: MigrationLedger.PHASE_CLOSED,
+                                  3: MigrationLedger.PHASE_SUBMITTED,
+                                  4: MigrationLedger.PHASE_CLOSED})
+
+        fh = open(self.mm.redmine2github_map_file, 'r')
+        self.assertEqual(json.loads(fh.read()),
+                         {'1': 101, '2': 102, '4': 104})
+        fh.close()
+
+    def test_migrate_issues_in_batches(self):
+        # its comments failed in an interrupted run: only finished
+        self.ledger.record(1, MigrationLedger.PHASE_CREATED,
+                           github_number=101)
+        gm = FakeGithubIssueMaker()
+        gm.failing = [3]
+        with mock.patch.object(migration_manager,
+                               'GITHUB_GRAPHQL_BATCH_SIZE', 2):
+            self.mm.migrate_issues_in_batches(
+                gm, FakePayloadCompiler(),
+                ['00001.json', '00002.json', '00003.json', '00004.json'])
+
+        self.assertEqual(gm.opened, [2, 3, 4])
+        self.assertEqual(gm.closed, [102, 104])
+        phases = dict((x['redmine_issue'], x['phase']) for x in
+                      self.ledger.get_entries())
+        self.assertEqual(phases, {1: MigrationLedger.PHASE_COMMENTED,
+                                  2: MigrationLedger.PHASE_CLOSED,
+                                  3: MigrationLedger.PHASE_SUBMITTED,
+                                  4: MigrationLedger.PHASE_CLOSED})
+
+
+if __name__ == '__main__':
+    unittest.main()
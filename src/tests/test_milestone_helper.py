@@ -0,0 +1,68 @@
+import json
+import unittest
+from unittest import mock
+
+from github_issues.milestone_helper import MilestoneHelper
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, data, next_url=None):
+        self.status_code = status_code
+        self.data = data
+        self.text = json.dumps(data)
+        self.links = {}
+        if next_url:
+            self.links['next'] = {'url': next_url}
+
+    def json(self):
+        return self.data
+
+
+class MilestoneHelperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.helper = MilestoneHelper()
+        self.gets = []
+        self.posts = []
+
+    def fake_get(self, url, **kwargs):
+        self.gets.append(url)
+        if url == MilestoneHelper.MILESTONES_URL:
+            return FakeResponse(200, [{'title': '4.0', 'number': 1}],
+                                next_url='page2')
+        return FakeResponse(200, [{'title': '4.1', 'number': 2}])
+
+    def fake_post(self, url, **kwargs):
+        self.posts.append(json.loads(kwargs['data']))
+        return FakeResponse(201, {'title': 'New', 'number': 3})
+
+    def test_milestones_are_listed_once(self):
+        with mock.patch('utils.http_transport.get', self.fake_get):
+            self.assertEqual(self.helper.get_mile_stone_number('4.0'), 1)
+            self.assertEqual(self.helper.get_mile_stone_number('4.1'), 2)
+            self.assertIsNone(self.helper.get_mile_stone_number('5.0'))
+        self.assertEqual(self.gets, [MilestoneHelper.MILESTONES_URL,
+                                     'page2'])
+
+    def test_missing_milestone_is_created(self):
+        with mock.patch('utils.http_transport.get', self.fake_get), \
+                mock.patch('utils.http_transport.post', self.fake_post):
+            self.assertEqual(
+                self.helper.get_create_milestone_number('New'), 3)
+            self.assertEqual(
+                self.helper.get_create_milestone_number('New'), 3)
+            self.assertEqual(
+                self.helper.get_create_milestone_number('4.1'), 2)
+        self.assertEqual(self.posts, [{'title': 'New'}])
+        self.assertEqual(len(self.gets), 2)
+
+    def test_milestone_from_redmine_version(self):
+        with mock.patch('utils.http_transport.get', self.fake_get):
+            self.assertEqual(self.helper.get_create_milestone(
+                {'fixed_version': {'id': 96, 'name': '4.1'}}), 2)
+            self.assertIsNone(self.helper.get_create_milestone({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from github_issues import payload_compiler
+from github_issues.payload_compiler import PayloadCompiler
+
+
+class PayloadCompilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.json_dir = os.path.join(self.tmp_dir, 'issues')
+        os.makedirs(self.json_dir)
+        self.payload_dir = os.path.join(self.tmp_dir, 'payloads')
+        self.label_map_fname = os.path.join(self.tmp_dir, 'labels.csv')
+        self.write(self.label_map_fname, 'redmine_type,redmine_name\n')
+
+        self.write(os.path.join(self.json_dir, '00001.json'), '{}')
+        self.compiler = self.get_compiler()
+        self.write(self.compiler.get_payload_fname('00001.json'), '{}')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, fname, content):
+        fh = open(fname, 'w')
+        fh.write(content)
+        fh.close()
+
+    def get_compiler(self, **kwargs):
+        return PayloadCompiler(self.json_dir, self.payload_dir,
+                               label_mapping_filename=self.label_map_fname,
+                               **kwargs)
+
+    def test_same_settings_keep_payloads(self):
+        self.assertTrue(self.get_compiler().is_payload_current('00001.json'))
+
+    def test_changed_map_file_clears_payloads(self):
+        self.write(self.label_map_fname, 'redmine_type,redmine_name\nx,y\n')
+        self.assertFalse(
+            self.get_compiler().is_payload_current('00001.json'))
+
+    def test_changed_flag_clears_payloads(self):
+        self.assertFalse(self.get_compiler(
+            include_comments=False).is_payload_current('00001.json'))
+
+    def test_changed_setting_clears_payloads(self):
+        with mock.patch.object(payload_compiler, 'GITHUB_JOURNAL_COALESCE',
+                               not payload_compiler.GITHUB_JOURNAL_COALESCE):
+            compiler = self.get_compiler()
+        self.assertFalse(compiler.is_payload_current('00001.json'))
+
+    def test_other_version_clears_payloads(self):
+        self.write(self.compiler.version_fname,
+                   json.dumps({'version': 1}))
+        self.assertFalse(
+            self.get_compiler().is_payload_current('00001.json'))
+
+    def test_changed_property_map_clears_payloads(self):
+        status_map_fname = os.path.join(self.tmp_dir, 'status.csv')
+        self.write(status_map_fname, 'id,name\n1,New\n')
+        with mock.patch.object(payload_compiler, 'REDMINE_STATUS_MAP',
+                               status_map_fname):
+            compiler = self.get_compiler()
+            self.write(compiler.get_payload_fname('00001.json'), '{}')
+            self.assertTrue(
+                self.get_compiler().is_payload_current('00001.json'))
+
+            self.write(status_map_fname, 'id,name\n1,Open\n')
+            self.assertFalse(
+                self.get_compiler().is_payload_current('00001.json'))
+
+    def test_changed_template_clears_payloads(self):
+        template_dir = os.path.join(self.tmp_dir, 'templates')
+        shutil.copytree(PayloadCompiler.TEMPLATE_DIRECTORY, template_dir)
+        with mock.patch.object(PayloadCompiler, 'TEMPLATE_DIRECTORY',
+                               template_dir):
+            compiler = self.get_compiler()
+            self.write(compiler.get_payload_fname('00001.json'), '{}')
+
+            self.write(os.path.join(template_dir, 'comment.md'), 'changed')
+            self.assertFalse(
+                self.get_compiler().is_payload_current('00001.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import time
+import unittest
+from email.utils import formatdate
+
+from utils.rate_governor import RateLimitGovernor
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None, text=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+
+class RateLimitGovernorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.governor = RateLimitGovernor(None)
+
+    def test_get_retry_after(self):
+        self.assertEqual(self.governor.get_retry_after('30'), 30)
+        self.assertAlmostEqual(
+            self.governor.get_retry_after(
+                formatdate(time.time() + 120, usegmt=True)), 120, delta=2)
+        self.assertEqual(self.governor.get_retry_after(
+            formatdate(time.time() - 120, usegmt=True)), 0)
+        self.assertEqual(self.governor.get_retry_after('soon'),
+                         RateLimitGovernor.DEFAULT_RETRY_AFTER)
+
+    def test_retry_after_date(self):
+        response = FakeResponse(
+            429, {'Retry-After': formatdate(time.time() + 120,
+                                            usegmt=True)})
+        self.assertTrue(self.governor.after_response(response))
+        self.assertAlmostEqual(self.governor.blocked_until,
+                               time.time() + 120, delta=2)
+        self.assertEqual(self.governor.get_remaining(), 0)
+
+    def test_primary_limit(self):
+        response = FakeResponse(200, {'X-RateLimit-Remaining': '42',
+                                      'X-RateLimit-Reset':
+                                          '%d' % (time.time() + 600)})
+        self.assertFalse(self.governor.after_response(response))
+        self.assertEqual(self.governor.get_remaining(), 42)
+
+        response = FakeResponse(200, {'X-RateLimit-Remaining': '0',
+                                      'X-RateLimit-Reset':
+                                          '%d' % (time.time() - 1)})
+        self.governor.after_response(response)
+        # reset since
+        self.assertIsNone(self.governor.get_remaining())
+
+    def test_other_403(self):
+        response = FakeResponse(403, text='Resource not accessible')
+        self.assertFalse(self.governor.after_response(response))
+        self.assertEqual(self.governor.blocked_until, 0)
+
+    def test_secondary_limit_without_retry_after(self):
+        response = FakeResponse(403, text='You have exceeded a secondary '
+                                          'rate limit')
+        self.assertTrue(self.governor.after_response(response))
+        self.assertAlmostEqual(
+            self.governor.blocked_until,
+            time.time() + RateLimitGovernor.DEFAULT_RETRY_AFTER, delta=2)
+
+    def test_content_tokens(self):
+        governor = RateLimitGovernor(60, content_burst=2)
+        self.assertEqual(governor.take_content_token(), 0)
+        self.assertEqual(governor.take_content_token(), 0)
+        self.assertAlmostEqual(governor.take_content_token(), 1, delta=0.1)
+
+    def test_content_cost(self):
+        governor = RateLimitGovernor(60, content_burst=2)
+        self.assertAlmostEqual(governor.take_content_token(5), 3, delta=0.1)
+
+        governor = RateLimitGovernor(60, content_burst=1)
+        # a GraphQL query
+        governor.before_request('POST', content_cost=0)
+        self.assertEqual(governor.take_content_token(), 0)
+
+    def test_graphql_limit_not_recorded(self):
+        response = FakeResponse(200, {'X-RateLimit-Resource': 'graphql',
+                                      'X-RateLimit-Remaining': '0',
+                                      'X-RateLimit-Reset':
+                                          '%d' % (time.time() + 600)})
+        self.governor.after_response(response)
+        self.assertIsNone(self.governor.get_remaining())
+
+
+if __name__ == '__main__':
+    unittest.main()
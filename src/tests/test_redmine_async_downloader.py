@@ -0,0 +1,43 @@
+import asyncio
+import unittest
+
+try:
+    from redmine_ticket.redmine_async_downloader import RequestRateLimiter
+except ImportError as e:
+    RequestRateLimiter = None
+    IMPORT_ERROR = e
+
+
+@unittest.skipIf(RequestRateLimiter is None,
+                 'aiohttp/python-redmine not installed')
+class RequestRateLimiterTest(unittest.TestCase):
+
+    def test_max_in_flight(self):
+        in_flight = []
+        max_seen = []
+
+        async def request(limiter):
+            async with limiter:
+                in_flight.append(1)
+                max_seen.append(len(in_flight))
+                await asyncio.sleep(0.01)
+                in_flight.pop()
+
+        async def run():
+            limiter = RequestRateLimiter(max_in_flight=3)
+            await asyncio.gather(*[request(limiter) for x in range(20)])
+
+        asyncio.run(run())
+        self.assertEqual(max(max_seen), 3)
+
+    def test_no_limits(self):
+        async def run():
+            limiter = RequestRateLimiter()
+            async with limiter:
+                return True
+
+        self.assertTrue(asyncio.run(run()))
+
+
+if __name__ == '__main__':
+    unittest.main()
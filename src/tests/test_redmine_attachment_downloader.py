@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from redmine_ticket.redmine_attachment_downloader import \
+    RedmineAttachmentDownloader
+
+
+class FakeResponse:
+
+    def __init__(self, content):
+        self.status_code = 200
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+    def close(self):
+        pass
+
+
+class RedmineAttachmentDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.issues_dir = os.path.join(self.tmp_dir, 'issues')
+        os.makedirs(self.issues_dir)
+        self.attachments_dir = os.path.join(self.tmp_dir, 'attachments')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_issue(self, issue_id, attachments):
+        fh = open(os.path.join(self.issues_dir, '%05d.json' % issue_id), 'w')
+        fh.write(json.dumps({'id': issue_id, 'attachments': attachments}))
+        fh.close()
+
+    def get_downloader(self):
+        return RedmineAttachmentDownloader('key', self.issues_dir,
+                                           self.attachments_dir,
+                                           max_workers=4)
+
+    def test_get_attachments(self):
+        self.write_issue(1, [{'id': 7, 'content_url': 'http://x/7'},
+                             {'id': 3, 'content_url': 'http://x/3'}])
+        self.write_issue(2, [{'id': 5, 'content_url': None},
+                             {'id': 3, 'content_url': 'http://x/3'}])
+        rad = self.get_downloader()
+        self.assertEqual([x['id'] for x in rad.get_attachments()], [3, 7])
+
+    def test_load_manifest_skips_cut_line(self):
+        rad = self.get_downloader()
+        fh = open(rad.manifest_fname, 'w')
+        fh.write(json.dumps({'id': 1, 'path': 'sha256/ab/ab1'}) + '\n')
+        fh.write('{"id": 2, "pa')
+        fh.close()
+        self.assertEqual(rad.load_manifest(), {1: 'sha256/ab/ab1'})
+
+    def test_identical_files_stored_once(self):
+        rad = self.get_downloader()
+        contents = {'http://x/1': b'same', 'http://x/2': b'same',
+                    'http://x/3': b'other'}
+
+        def fake_get(url, **kwargs):
+            return FakeResponse(contents[url])
+
+        attachments = [{'id': x, 'content_url': 'http://x/%s' % x}
+                       for x in [1, 2, 3]]
+        with mock.patch('utils.http_transport.get', fake_get):
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                results = list(executor.map(rad.download_attachment,
+                                            attachments))
+
+        self.assertEqual(results[0], results[1])
+        self.assertNotEqual(results[0], results[2])
+        for store_path, sha256 in results:
+            self.assertTrue(store_path.startswith(
+                os.path.join('sha256', sha256[:2])))
+            self.assertTrue(os.path.isfile(
+                os.path.join(self.attachments_dir, store_path)))
+        self.assertEqual(os.listdir(rad.partial_dirname), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
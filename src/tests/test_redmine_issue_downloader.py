@@ -0,0 +1,196 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from redmine_ticket.redmine_issue_downloader import \
+        RedmineIssueDownloader
+except ImportError:
+    # python-redmine is not installed
+    RedmineIssueDownloader = None
+
+
+def get_listed_issue(issue_id, updated_on='2014-07-02T00:00:00Z'):
+    return {'id': issue_id, 'subject': 'Issue %s' % issue_id,
+            'updated_on': updated_on}
+
+
+@unittest.skipIf(RedmineIssueDownloader is None,
+                 'python-redmine is not installed')
+class RedmineIssueDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_downloader(self, **kwargs):
+        class OfflineDownloader(RedmineIssueDownloader):
+            def connect_to_redmine(self):
+                pass
+        return OfflineDownloader('https://redmine.example.org/', 'key',
+                                 'project', self.tmp_dir, **kwargs)
+
+    def read_issue(self, rn, issue_id):
+        fh = open(os.path.join(rn.issue_dirname,
+                               rn.pad_issue_id(issue_id) + '.json'), 'r')
+        issue = json.loads(fh.read())
+        fh.close()
+        return issue
+
+    def test_save_issues_concurrently(self):
+        rn = self.get_downloader(max_workers=4)
+        thread_names = set()
+
+        def retrieve_issue(listed_issue):
+            thread_names.add(threading.current_thread().name)
+            return json.dumps(listed_issue)
+
+        rn.retrieve_issue = retrieve_issue
+        rn.save_issues([get_listed_issue(x) for x in range(1, 21)])
+
+        for issue_id in range(1, 21):
+            self.assertEqual(self.read_issue(rn, issue_id)['id'], issue_id)
+        self.assertNotIn(threading.current_thread().name, thread_names)
+        self.assertEqual(len(rn.load_manifest()), 20)
+
+    def test_invalid_max_workers(self):
+        self.assertRaises(SystemExit, self.get_downloader, max_workers=0)
+
+    def test_list_includes(self):
+        rn = self.get_downloader(use_list_includes=True)
+        params_sent = []
+
+        def get_issues_json(params):
+            params_sent.append(params)
+            return {'total_count': 1, 'issues': [get_listed_issue(1)]}
+
+        rn.get_issues_json = get_issues_json
+        rn.get_issue_page(0)
+        self.assertEqual(params_sent[0]['include'],
+                         RedmineIssueDownloader.LIST_INCLUDES)
+
+        class FakeIssue:
+            _attributes = {'id': 1, 'subject': 'other', 'journals': [{}],
+                           'children': []}
+
+        class FakeIssueManager:
+            def get(self, issue_id, include=None):
+                self.include = include
+                return FakeIssue()
+
+        class FakeRedmine:
+            issue = FakeIssueManager()
+
+        rn.redmine_conn = FakeRedmine()
+        listed_issue = dict(get_listed_issue(1), relations=[])
+        issue = json.loads(rn.get_listed_issue(listed_issue))
+        self.assertEqual(rn.redmine_conn.issue.include,
+                         RedmineIssueDownloader.DETAIL_INCLUDES)
+        # the listed fields are kept, the details are added
+        self.assertEqual(issue['subject'], 'Issue 1')
+        self.assertEqual(issue['relations'], [])
+        self.assertEqual(issue['journals'], [{}])
+
+    def test_sync_state(self):
+        sync_state_file = os.path.join(self.tmp_dir, 'sync_state.json')
+        rn = self.get_downloader(sync_state_file=sync_state_file)
+        self.assertNotIn('updated_on', rn.get_issue_filter_params())
+
+        rn.write_single_issue(get_listed_issue(1), '{"id": 1}')
+        rn.write_single_issue(get_listed_issue(2), '{"id": 2}')
+        rn.finish_download(
+            {'00001': 'Issue 1', '00002': 'Issue 2'},
+            [get_listed_issue(1, '2014-07-01T00:00:00Z'),
+             get_listed_issue(2, '2014-07-02T00:00:00Z')])
+        self.assertTrue(os.path.isfile(
+            os.path.join(rn.corpus_dirname, '00002.json')))
+
+        # the next run only asks for the issues updated since
+        rn = self.get_downloader(sync_state_file=sync_state_file)
+        self.assertEqual(rn.get_issue_filter_params()['updated_on'],
+                         '>=2014-07-02T00:00:00Z')
+
+    def test_enumerate_issues(self):
+        rn = self.get_downloader(max_workers=3)
+        rn.RECORD_RETRIEVAL_SIZE = 2
+        offsets = []
+
+        def get_issue_page(offset, issue_ids=None):
+            offsets.append(offset)
+            # an issue moved to the next page while it was retrieved
+            return [get_listed_issue(x) for x in
+                    range(offset + 1, min(offset + 4, 6))]
+
+        rn.get_issue_count = lambda: 5
+        rn.get_issue_page = get_issue_page
+        listed_issues = rn.enumerate_issues()
+
+        self.assertEqual(sorted(offsets), [0, 2, 4])
+        self.assertEqual([x['id'] for x in listed_issues], [1, 2, 3, 4, 5])
+
+    def test_resume(self):
+        rn = self.get_downloader()
+        rn.write_single_issue(get_listed_issue(1), '{"id": 1}')
+        rn.write_single_issue(get_listed_issue(2), '{"id": 2}')
+        fh = open(rn.manifest_fname, 'a')
+        fh.write('{"id": 3, "upd')
+        fh.close()
+
+        rn = self.get_downloader(resume=True)
+        self.assertEqual(sorted(rn.load_manifest()), [1, 2])
+        remaining = rn.skip_saved_issues(
+            [get_listed_issue(1),
+             get_listed_issue(2, '2014-07-03T00:00:00Z'),
+             get_listed_issue(3)])
+        self.assertEqual([x['id'] for x in remaining], [2, 3])
+
+    def test_resume_latest_directory(self):
+        for dirname in ['2014-0701', '2014-0702', '2014-0703']:
+            os.makedirs(os.path.join(self.tmp_dir, dirname))
+        for dirname in ['2014-0701', '2014-0702']:
+            fh = open(os.path.join(self.tmp_dir, dirname,
+                                   RedmineIssueDownloader.MANIFEST_FNAME),
+                      'w')
+            fh.close()
+
+        rn = self.get_downloader(resume=True)
+        self.assertEqual(rn.issue_dirname,
+                         os.path.join(self.tmp_dir, '2014-0702'))
+
+    def test_specific_tickets(self):
+        rn = self.get_downloader(
+            specific_tickets_to_download=[5, 3, 250, 3, 1])
+        rn.RECORD_RETRIEVAL_SIZE = 2
+        self.assertEqual(rn.get_specific_issue_id_chunks(),
+                         ['1,3', '5,250'])
+
+        # the server ignores an unknown "issue_id" filter
+        rn.get_issue_page = lambda offset, issue_ids: \
+            [get_listed_issue(x) for x in [1, 2, 3, 5, 250]]
+        self.assertEqual([x['id'] for x in rn.enumerate_issues()],
+                         [1, 3, 5, 250])
+
+    def test_unwrap_raw_issue(self):
+        rn = self.get_downloader(raw_json=True)
+        self.assertEqual(rn.unwrap_raw_issue(b'{"issue":{"id":1}}\n'),
+                         b'{"id":1}')
+
+        # formatted differently: decoded
+        content = rn.unwrap_raw_issue(b'{ "issue": {"id": 1} }')
+        self.assertEqual(json.loads(content), {'id': 1})
+
+    def test_raw_issue_written_as_is(self):
+        rn = self.get_downloader(raw_json=True)
+        rn.write_single_issue(get_listed_issue(1), b'{"id":1,"x":"\\u00e9"}')
+        fh = open(os.path.join(rn.issue_dirname, '00001.json'), 'rb')
+        self.assertEqual(fh.read(), b'{"id":1,"x":"\\u00e9"}')
+        fh.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from github_issues.reference_rewriter import ReferenceRewriter
+
+
+class ReferenceRewriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.issue_map = {'12': 1, '123': 2, '4160': 35}
+        self.lookups = []
+
+        def comment_url_lookup(redmine_issue_num, github_issue_num,
+                               journal_num):
+            self.lookups.append((redmine_issue_num, github_issue_num,
+                                 journal_num))
+            if journal_num == '4':
+                return 'https://github.com/o/r/issues/2#issuecomment-9'
+            return None
+
+        self.rewriter = ReferenceRewriter(self.issue_map, comment_url_lookup)
+
+    def test_issue_references(self):
+        self.assertEqual(self.rewriter.rewrite('See #12 and #123.'),
+                         ('See #1 and #2.', True))
+
+    def test_longer_number_is_not_rewritten_in_part(self):
+        self.assertEqual(self.rewriter.rewrite('#1234 #12a'),
+                         ('#1234 #12a', False))
+
+    def test_unknown_issue_is_kept(self):
+        self.assertEqual(self.rewriter.rewrite('#99'), ('#99', False))
+
+    def test_html_entity_is_kept(self):
+        self.assertEqual(self.rewriter.rewrite('&#123; x#12'),
+                         ('&#123; x#12', False))
+
+    def test_note_references(self):
+        url = 'https://github.com/o/r/issues/2#issuecomment-9'
+        self.assertEqual(self.rewriter.rewrite('#123-4, #123#note-4'),
+                         ('%s, %s' % (url, url), True))
+        self.assertEqual(self.lookups, [('123', 2, '4'), ('123', 2, '4')])
+
+    def test_note_without_comment_keeps_suffix(self):
+        self.assertEqual(self.rewriter.rewrite('#123-5 #123#note-5'),
+                         ('#2-5 #2#note-5', True))
+
+    def test_note_without_lookup(self):
+        rewriter = ReferenceRewriter(self.issue_map)
+        self.assertEqual(rewriter.rewrite('#4160-1'), ('#35-1', True))
+
+    def test_commit_references(self):
+        self.assertEqual(
+            self.rewriter.rewrite('commit:abc1234 commit:my-repo|abcdef12'),
+            ('abc1234 abcdef12', True))
+
+    def test_empty(self):
+        self.assertEqual(self.rewriter.rewrite(None), (None, False))
+        self.assertEqual(self.rewriter.rewrite(''), ('', False))
+
+    def test_rewrite_bodies(self):
+        self.assertEqual(self.rewriter.rewrite_bodies(
+            {10: 'see #12', 11: 'nothing here', 12: None}), {10: 'see #1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
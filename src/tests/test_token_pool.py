@@ -0,0 +1,57 @@
+import time
+import unittest
+
+from settings.base import GITHUB_SERVER
+from utils import http_transport
+from utils.token_pool import TokenPool
+
+
+class FakeResponse:
+
+    def __init__(self, remaining):
+        self.status_code = 200
+        self.headers = {'X-RateLimit-Remaining': '%s' % remaining,
+                        'X-RateLimit-Reset': '%d' % (time.time() + 600)}
+        self.text = ''
+
+
+class TokenPoolTest(unittest.TestCase):
+
+    def set_remaining(self, auth, remaining):
+        http_transport.get_governor(GITHUB_SERVER, auth).after_response(
+            FakeResponse(remaining))
+
+    def test_empty_pool(self):
+        self.assertRaises(ValueError, TokenPool, [])
+
+    def test_single_token(self):
+        pool = TokenPool([('a', 'single')])
+        self.assertEqual(len(pool), 1)
+        self.assertEqual(pool.get_auth(), ('a', 'single'))
+
+    def test_most_calls_left(self):
+        auths = [('a', 'most-1'), ('b', 'most-2'), ('c', 'most-3')]
+        self.set_remaining(auths[0], 10)
+        self.set_remaining(auths[1], 4000)
+        self.set_remaining(auths[2], 500)
+        pool = TokenPool(auths)
+        self.assertEqual([pool.get_auth() for x in range(3)],
+                         [auths[1]] * 3)
+
+    def test_unknown_is_taken_first(self):
+        auths = [('a', 'unknown-1'), ('b', 'unknown-2')]
+        self.set_remaining(auths[0], 4000)
+        pool = TokenPool(auths)
+        self.assertEqual(pool.get_auth(), auths[1])
+
+    def test_ties_go_round_robin(self):
+        auths = [('a', 'tie-1'), ('b', 'tie-2')]
+        for auth in auths:
+            self.set_remaining(auth, 100)
+        pool = TokenPool(auths)
+        self.assertEqual([pool.get_auth() for x in range(4)],
+                         [auths[0], auths[1], auths[0], auths[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Shared HTTP transport used by every module that talks to Redmine or GitHub.
+
+- One requests.Session per host, so connections are kept alive and reused
+- A connection pool of HTTP_POOL_SIZE per host, enough for the worker pools
+- (connect, read) timeouts on every call, so a hung socket raises
+  requests.exceptions.Timeout instead of stalling the migration
+- Calls to the GitHub API go through a RateLimitGovernor
+  (utils/rate_governor.py), one per account, which waits and retries on
+  rate limits
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from urlparse import urlparse
+except Exception as e:
+    from urllib.parse import urlparse        # python 3.x
+
+try:
+    from settings.base import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, \
+        HTTP_POOL_SIZE, GITHUB_SERVER, GITHUB_CONTENT_REQUESTS_PER_MINUTE
+    from utils.rate_governor import RateLimitGovernor
+except Exception as e:
+    raise
+
+_sessions = {}      # { scheme://host : requests.Session }
+_sessions_lock = threading.Lock()
+
+_governors = {}     # { (scheme://host, auth) : RateLimitGovernor }
+
+
+def get_timeout():
+    """
+    :returns: tuple of (connect timeout, read timeout) in seconds
+    """
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+def get_host_key(url):
+    parsed_url = urlparse(url)
+    return '%s://%s' % (parsed_url.scheme, parsed_url.netloc)
+
+
+def get_governor(url, auth=None):
+    """
+    :param auth: optional, the auth of the call.  Each GitHub account has
+        its own rate limit
+    :returns: the RateLimitGovernor shared by all calls to the GitHub API
+        with the same auth, or None for other hosts
+    """
+    host_key = get_host_key(url)
+    if not host_key == get_host_key(GITHUB_SERVER):
+        return None
+
+    if isinstance(auth, list):
+        auth = tuple(auth)
+    governor_key = (host_key, auth)
+
+    with _sessions_lock:
+        governor = _governors.get(governor_key, None)
+        if governor is None:
+            governor = RateLimitGovernor(GITHUB_CONTENT_REQUESTS_PER_MINUTE)
+            _governors[governor_key] = governor
+
+    return governor
+
+
+def get_session(url):
+    """
+    :returns: the requests.Session shared by all calls to the host of url
+    """
+    host_key = get_host_key(url)
+
+    with _sessions_lock:
+        session = _sessions.get(host_key, None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1,
+                                  pool_maxsize=HTTP_POOL_SIZE)
+            session.mount(host_key, adapter)
+            session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+            _sessions[host_key] = session
+
+    return session
+
+
+def request(method, url, **kwargs):
+    """
+    Same arguments as requests.request.  A timeout of get_timeout() is
+    used unless one is passed.  Optional:
+
+    :param governor_auth: the account of the call, for a call made without
+        "auth"--e.g. with an Authorization header.  Default is "auth"
+    :param content_cost: number of content creation tokens taken by a
+        POST/PATCH/PUT/DELETE.  Default is 1
+    """
+    kwargs.setdefault('timeout', get_timeout())
+    governor_auth = kwargs.pop('governor_auth', kwargs.get('auth', None))
+    content_cost = kwargs.pop('content_cost', 1)
+
+    governor = get_governor(url, governor_auth)
+    if governor is None:
+        return get_session(url).request(method, url, **kwargs)
+
+    for try_num in range(1, governor.MAX_TRIES + 1):
+        governor.before_request(method, content_cost)
+        response = get_session(url).request(method, url, **kwargs)
+        if not governor.after_response(response):
+            break
+    return response
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
@@ -0,0 +1,172 @@
+"""
+Rate-limit governor for the GitHub API, used by utils/http_transport.py
+
+- Primary limit: tracks X-RateLimit-Remaining/Reset and waits for the
+  reset once the remaining calls are used up
+- Secondary limits: on a 403/429 with Retry-After--or with no calls
+  remaining--every request waits out the cool-down and the request is
+  retried
+- Content creation: POST/PATCH/PUT/DELETE requests take a token from a
+  token bucket, refilled at GITHUB_CONTENT_REQUESTS_PER_MINUTE
+
+Requests are otherwise sent as fast as they come: no fixed sleeps.
+"""
+import time
+import threading
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+try:
+    from utils.msg_util import *
+except Exception as e:
+    raise
+
+
+class RateLimitGovernor:
+
+    CONTENT_METHODS = ['POST', 'PATCH', 'PUT', 'DELETE']
+
+    # Seconds to wait after a secondary rate limit without a usable
+    # Retry-After
+    DEFAULT_RETRY_AFTER = 60
+
+    # Tries for a request that keeps hitting a rate limit
+    MAX_TRIES = 5
+
+    def __init__(self, content_requests_per_minute, content_burst=None):
+        """
+        :param content_requests_per_minute: refill rate of the content
+            creation token bucket.  None = no bucket
+        :param content_burst: optional, size of the token bucket.  Default
+            is content_requests_per_minute / 4
+        """
+        self.content_rate = None
+        self.content_burst = 1
+        if content_requests_per_minute:
+            self.content_rate = content_requests_per_minute / 60.0
+            self.content_burst = content_burst or \
+                max(1, content_requests_per_minute // 4)
+        self.content_tokens = float(self.content_burst)
+        self.content_checked = time.monotonic()
+
+        self.remaining = None       # X-RateLimit-Remaining
+        self.reset_at = None        # X-RateLimit-Reset, epoch seconds
+        self.blocked_until = 0      # time.time() of the end of a cool-down
+
+        self.lock = threading.Lock()
+
+    def take_content_token(self, cost=1):
+        """
+        :param cost: number of tokens to take, e.g. the mutations of a
+            GraphQL request
+        :returns: seconds to wait for the content creation tokens, which
+            are taken
+        """
+        now = time.monotonic()
+        self.content_tokens = min(
+            self.content_burst,
+            self.content_tokens + (now - self.content_checked) *
+            self.content_rate)
+        self.content_checked = now
+
+        self.content_tokens -= cost
+        if self.content_tokens >= 0:
+            return 0
+        return -self.content_tokens / self.content_rate
+
+    def get_remaining(self):
+        """
+        :returns: calls left before a wait: X-RateLimit-Remaining, 0
+            during a cool-down, or None if unknown
+        """
+        with self.lock:
+            now = time.time()
+            if self.blocked_until > now:
+                return 0
+            if self.reset_at is not None and self.reset_at <= now:
+                return None     # the limit was reset since
+            return self.remaining
+
+    def before_request(self, method, content_cost=1):
+        """
+        Wait until the request may be sent
+
+        :param content_cost: content creation tokens taken by a
+            POST/PATCH/PUT/DELETE.  0 for one that creates nothing, e.g. a
+            GraphQL query
+        """
+        with self.lock:
+            wait_until = self.blocked_until
+            if self.remaining is not None and self.remaining <= 0 and \
+                    self.reset_at is not None:
+                wait_until = max(wait_until, self.reset_at)
+
+            wait = max(0, wait_until - time.time())
+            if self.content_rate and content_cost > 0 and \
+                    method.upper() in self.CONTENT_METHODS:
+                wait = max(wait, self.take_content_token(content_cost))
+
+        if wait > 0:
+            if wait > 5:
+                msg('Rate limit: wait %.0f seconds' % wait)
+            time.sleep(wait)
+
+    def get_retry_after(self, retry_after):
+        """
+        :param retry_after: Retry-After header: seconds, or an HTTP-date
+        :returns: seconds to wait.  DEFAULT_RETRY_AFTER if the header
+            can't be read
+        """
+        try:
+            return max(0, int(retry_after))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            msg('Unreadable Retry-After: %s' % retry_after)
+            return self.DEFAULT_RETRY_AFTER
+        if retry_at.tzinfo is None:
+            # "-0000": UTC
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0, retry_at.timestamp() - time.time())
+
+    def after_response(self, response):
+        """
+        Record the rate limit headers of a response
+
+        :returns: True if the request hit a rate limit and should be retried
+        """
+        headers = response.headers
+        retry_after = headers.get('Retry-After', None)
+
+        # The GraphQL API has its own limit, in points
+        is_core = headers.get('X-RateLimit-Resource', 'core') == 'core'
+
+        with self.lock:
+            if is_core and \
+                    headers.get('X-RateLimit-Remaining', None) is not None:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+            if is_core and \
+                    headers.get('X-RateLimit-Reset', None) is not None:
+                self.reset_at = int(headers['X-RateLimit-Reset'])
+
+            if response.status_code not in [403, 429]:
+                return False
+
+            if retry_after is not None:
+                cooldown = self.get_retry_after(retry_after)
+            elif self.remaining == 0 and self.reset_at is not None:
+                cooldown = max(0, self.reset_at - time.time())
+            elif 'rate limit' in response.text.lower():
+                cooldown = self.DEFAULT_RETRY_AFTER
+            else:
+                return False    # a 403 for another reason
+
+            self.blocked_until = max(self.blocked_until,
+                                     time.time() + cooldown)
+
+        msg('Rate limit hit (%s): wait %s seconds and retry' %
+            (response.status_code, int(cooldown)))
+        return True
@@ -0,0 +1,64 @@
+"""
+Pool of GitHub credentials, used by github_issues/github_golden_commet.py
+
+Each GitHub account has its own rate limit.  With the tokens of several
+accounts--e.g. bot accounts with write access to the repository--the
+calls made for comments, closes and related-ticket updates are spread
+across them, each call going to the token with the most calls left.
+"""
+import threading
+
+try:
+    from settings.base import GITHUB_SERVER
+    from utils import http_transport
+except Exception as e:
+    raise
+
+
+class TokenPool:
+
+    def __init__(self, auths, url=GITHUB_SERVER):
+        """
+        :param auths: list of (login, token) tuples.  The first one is the
+            primary account
+        :param url: the GitHub API url, to find the RateLimitGovernor of
+            each token
+        """
+        if not auths:
+            raise ValueError('The token pool is empty')
+
+        self.auths = list(auths)
+        self.url = url
+
+        self.next_idx = 0   # ties go round robin
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.auths)
+
+    def get_auth(self):
+        """
+        :returns: the (login, token) tuple with the most calls left.  A
+            token whose calls left are unknown--not used yet, or its limit
+            was reset since--is taken first
+        """
+        if len(self.auths) == 1:
+            return self.auths[0]
+
+        with self.lock:
+            start_idx = self.next_idx
+            self.next_idx = (self.next_idx + 1) % len(self.auths)
+
+        best_auth = None
+        best_remaining = -1
+        for offset in range(len(self.auths)):
+            auth = self.auths[(start_idx + offset) % len(self.auths)]
+            remaining = http_transport.get_governor(self.url,
+                                                    auth).get_remaining()
+            if remaining is None:
+                return auth
+            if remaining > best_remaining:
+                best_auth = auth
+                best_remaining = remaining
+
+        return best_auth